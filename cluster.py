@@ -0,0 +1,96 @@
+# Frame clustering for Sakura Poselib
+#
+# Picks a small set of representative frames (medoids) from sampled motion, so that every frame
+# is within a tolerance of its representative. Everything is vectorized over frames with numpy.
+#
+# This module must not depend on bpy/mathutils.
+
+from typing import Tuple
+
+import numpy as np
+
+
+# Squared distances between rows of x (n, d) and rows of centers (k, d)
+def _sq_distances(x: np.ndarray, centers: np.ndarray, x_sq: np.ndarray) -> np.ndarray:
+	d = x_sq[:, None] - 2.0 * (x @ centers.T) + (centers * centers).sum(axis=1)[None, :]
+	return np.maximum(d, 0.0, out=d)
+
+
+def quaternion_features(rotations: np.ndarray) -> np.ndarray:
+	'''
+		Flip quaternions (..., 4) WXYZ to the w >= 0 hemisphere, so that q and -q get the same features.
+	'''
+	return np.where(rotations[..., :1] < 0.0, -rotations, rotations)
+
+
+def select_representatives(features: np.ndarray, tolerance: float, max_count: int = 0, iterations: int = 10) -> Tuple[np.ndarray, np.ndarray, float]:
+	'''
+		Cluster frames and pick a representative frame per cluster.
+		Farthest point seeding adds clusters until all frames are within the tolerance (or max_count is reached),
+		k-means refines the clusters and the member nearest to each centroid becomes the representative.
+		Frames which end up out of the tolerance after refinement get their own cluster.
+		Parameters:
+			features: (frame count, feature count) array
+			tolerance: maximum euclidean distance between a frame and its representative
+			max_count: maximum number of representatives (0 = unlimited)
+		Returns:
+			(representative frame indices in frame order, cluster label of each frame (index into representatives), max distance)
+	'''
+	x = np.asarray(features, dtype=np.float64)
+	n = len(x)
+	if n == 0:
+		return np.zeros(0, np.intp), np.zeros(0, np.intp), 0.0
+
+	# constant features don't affect distances
+	x = x[:, np.ptp(x, axis=0) > 0.0]
+	x_sq = (x * x).sum(axis=1)
+	tol_sq = tolerance * tolerance
+	max_count = max_count if max_count > 0 else n
+
+	# farthest point seeding
+	seeds = [0]
+	min_sq = _sq_distances(x, x[:1], x_sq)[:, 0]
+	while len(seeds) < max_count:
+		far = int(min_sq.argmax())
+		if min_sq[far] <= tol_sq:
+			break
+		seeds.append(far)
+		np.minimum(min_sq, _sq_distances(x, x[far:far + 1], x_sq)[:, 0], out=min_sq)
+
+	# k-means refinement
+	centers = x[seeds]
+	k = len(centers)
+	labels = _sq_distances(x, centers, x_sq).argmin(axis=1)
+	for _ in range(iterations):
+		counts = np.bincount(labels, minlength=k)
+		sums = np.zeros_like(centers)
+		np.add.at(sums, labels, x)
+		keep = counts > 0
+		centers = sums[keep] / counts[keep][:, None]
+		k = len(centers)
+		new_labels = _sq_distances(x, centers, x_sq).argmin(axis=1)
+		if np.array_equal(new_labels, labels):
+			break
+		labels = new_labels
+
+	# medoids: members nearest to their centroid
+	sq = ((x - centers[labels]) ** 2).sum(axis=1)
+	order = np.lexsort((sq, labels))
+	first = np.ones(n, bool)
+	first[1:] = labels[order][1:] != labels[order][:-1]
+	medoids = order[first]
+
+	# make sure every frame is within the tolerance of a medoid
+	min_sq = _sq_distances(x, x[medoids], x_sq).min(axis=1)
+	medoids = list(medoids)
+	while len(medoids) < max_count:
+		far = int(min_sq.argmax())
+		if min_sq[far] <= tol_sq:
+			break
+		medoids.append(far)
+		np.minimum(min_sq, _sq_distances(x, x[far:far + 1], x_sq)[:, 0], out=min_sq)
+
+	medoids = np.sort(np.array(medoids, np.intp))
+	sq = _sq_distances(x, x[medoids], x_sq)
+	labels = sq.argmin(axis=1)
+	return medoids, labels, float(np.sqrt(sq[np.arange(n), labels].max()))
@@ -3,46 +3,66 @@
 
 import bpy
 from bpy.app.handlers import persistent
+from . import spl, mmd, search, utils
 from .spl import get_poselib, ensure_proxy_obj
 
 # Msgbus handlers
+_rename_flush_pending = False
+
 def on_bone_rename( *args ):
     #print( 'on_bone_rename', args )
 
-    # find renamed bones and update bone name backup
-    for arm in [o for o in bpy.data.objects if o.pose]:
+    # A single gesture (symmetrize, batch rename, etc.) sends many notifications.
+    # Defer the work to a timer so all of them are handled in one pass.
+    mmd.clear_bone_name_resolvers()
+    utils.clear_rest_matrices()
+
+    global _rename_flush_pending
+    if _rename_flush_pending:
+        return
+    _rename_flush_pending = True
+    bpy.app.timers.register(flush_bone_renames, first_interval=0.0)
+    return
+
+
+# Find renamed bones and propagate them to the pose data
+def flush_bone_renames():
+    global _rename_flush_pending
+    _rename_flush_pending = False
+
+    # group poselib owners by armature data, only those actually have books
+    owners = {} # {armature data: [PoselibData]}
+    for obj in [o for o in bpy.data.objects if o.pose]:
         # skip if armature is library or override (prohibited to edit)
-        if arm.data.library or arm.data.override_library:
+        if obj.data.library or obj.data.override_library:
             continue
 
-        plp = get_poselib(arm)
-        if plp is None:
+        plp = get_poselib(obj)
+        if plp is None or len(plp.books) == 0:
             continue
+        owners.setdefault(obj.data, []).append(plp)
 
-        for bone in arm.data.bones:
-            old_name = bone.get('spl_bone_name_backup', None)
-            if old_name is None: # may be a new bone
-                bone['spl_bone_name_backup'] = bone.name
-                continue
-
-            if bone.name != old_name:
-                # update bone name in all poses
-                for book in plp.books:
-                    for pose in book.poses:
-                        for bone_data in pose.bones:
-                            if bone_data.name == old_name:
-                                bone_data.name = bone.name
-                                break
-                # update bone name backup
-                bone['spl_bone_name_backup'] = bone.name
+    for arm, plps in owners.items():
+        renames = spl.diff_bone_name_snapshot(arm)
+        if not renames:
+            continue
 
-    return
+        # update bone names in all poses referencing them
+        for plp in plps:
+            plp.rename_bones(renames)
+
+    return None # run once
+
+
+def on_object_parent_change( *args ):
+    mmd.clear_model_roots()
 
 
 # Msgbus
 msg_handlers = [
     ( (bpy.types.Bone, 'name'), on_bone_rename ), # track bone renames
     ( (bpy.types.PoseBone, 'name'), on_bone_rename ), # track bone renames
+    ( (bpy.types.Object, 'parent'), on_object_parent_change ), # invalidate memoized mmd model roots
 ]
 
 owner=object()
@@ -66,6 +86,10 @@ def timed_handler_every_second():
         if plp is None:
             continue
 
+        # track bone renames of armatures which have books
+        if len(plp.books) and not (arm.data.library or arm.data.override_library):
+            spl.ensure_bone_name_snapshot(arm.data)
+
         plp.ensure_actions()
 
 
@@ -74,17 +98,35 @@ def timed_handler_every_second():
 
 
 
+# Drop cached data and rebuild bone name snapshots on the next tick
+def clear_caches():
+    spl.clear_bone_name_index()
+    spl.clear_bone_name_snapshots()
+    mmd.clear_bone_name_resolvers()
+    mmd.clear_model_roots()
+    utils.clear_rest_matrices()
+    search.clear()
+    if not bpy.app.timers.is_registered(rebuild_bone_name_snapshots):
+        bpy.app.timers.register(rebuild_bone_name_snapshots, first_interval=0.0)
+
+def rebuild_bone_name_snapshots():
+    for obj in [o for o in bpy.data.objects if o.pose]:
+        if obj.data.library or obj.data.override_library:
+            continue
+
+        plp = get_poselib(obj)
+        if plp is None or len(plp.books) == 0:
+            continue
+        spl.ensure_bone_name_snapshot(obj.data)
+
+    return None # run once
+
+
 # On Load handler
 @persistent
 def on_load(dummy):
-    # create bone name backup
-    for arm in bpy.data.armatures:
-        # skip if armature is library or override (prohibited to edit)
-        if arm.library or arm.override_library:
-            continue
-
-        for bone in arm.bones:
-            bone['spl_bone_name_backup'] = bone.name
+    # pose data has been replaced, drop cached data
+    clear_caches()
 
     # re-register handlers
     if not bpy.app.timers.is_registered(timed_handler_every_second):
@@ -100,10 +142,20 @@ def on_load(dummy):
     return
 
 
+# On Undo/Redo handler
+@persistent
+def on_undo_redo(dummy):
+    # pose data and bone names may have been restored, drop cached data
+    clear_caches()
+
+
 # Register addon
 def register():
     bpy.app.timers.register(timed_handler_every_second)
+    bpy.app.timers.register(rebuild_bone_name_snapshots, first_interval=0.0)
     bpy.app.handlers.load_post.append(on_load)
+    bpy.app.handlers.undo_post.append(on_undo_redo)
+    bpy.app.handlers.redo_post.append(on_undo_redo)
     register_msgbus()
 
 
@@ -111,6 +163,11 @@ def register():
 def unregister():
     if bpy.app.timers.is_registered(timed_handler_every_second):
         bpy.app.timers.unregister(timed_handler_every_second)
+    for timer in (flush_bone_renames, rebuild_bone_name_snapshots):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
     bpy.app.handlers.load_post.remove(on_load)
+    bpy.app.handlers.undo_post.remove(on_undo_redo)
+    bpy.app.handlers.redo_post.remove(on_undo_redo)
     unregister_msgbus()
 
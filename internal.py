@@ -1,12 +1,15 @@
 # Description: Internal functions for Sakura Poselib
 
+import array
 import bpy
+import contextlib
+import io
 import math
 import os
 
-from mathutils import Vector, Quaternion, Euler, Matrix
+from mathutils import Vector, Quaternion, Euler
 
-from . import mmd, utils
+from . import mmd, utils, spl_formats
 from . import spl
 
 
@@ -18,57 +21,50 @@ def extract_pose_library_data( armature: bpy.types.Object ):
 		print("No pose library found.")
 		return None
 
-	poses = []
+	markers = pose_library.pose_markers
+	poses = [(marker.name, {}) for marker in markers]
 
-	for marker in pose_library.pose_markers:
-		pose_data = {}
+	# frame -> pose data of markers at the frame (several markers can share a frame)
+	frame_poses = {}
+	for marker, (_, pose_data) in zip(markers, poses):
+		frame_poses.setdefault(marker.frame, []).append(pose_data)
 
-		# Gather keyframes at marker.frame
-		keyframes = {} # data_path : value
+	channel_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'rotation_axis_angle': 4, 'scale': 3}
 
-		for fc in pose_library.fcurves:
-			try:
-				if not fc.data_path.startswith("pose.bones"):
-					continue
-			except UnicodeDecodeError: # in case of invalid datapath or something
-				continue # just skip
-
-			for kf in fc.keyframe_points:
-				if kf.co[0] == marker.frame:
-					keyframes[fc.data_path + str(fc.array_index)] = kf.co[1]
-
-		#print(marker.name, marker.frame)
-		#for key, value in keyframes.items():
-		#	print(key, value)
-
-		# Iterate through keyframes to gather transform data for each bone
-		for data_path, value in keyframes.items():
-			bone_name = data_path.split('"')[1]
-
-			# create new entry if not exist
-			if not bone_name in pose_data:
-				pose_data[bone_name] = {
-					'location' : [0,0,0],
-					'rotation_quaternion' :[1, 0, 0, 0],
-					'rotation_euler': [0,0,0],
-					'rotation_axis_angle': [0,0,0,0],
-					'scale' : [1, 1, 1],
-				}
-
-			# Write value
-			transforms = pose_data[bone_name]
-			if "location" in data_path:
-				transforms['location'][int(data_path[-1])] = value
-			elif "rotation_quaternion" in data_path:
-				transforms['rotation_quaternion'][int(data_path[-1])] = value
-			elif "rotation_euler" in data_path:
-				transforms['rotation_euler'][int(data_path[-1])] = value
-			elif "rotation_axis_angle" in data_path:
-				transforms['rotation_axis_angle'][int(data_path[-1])] = value
-			elif "scale" in data_path:
-				transforms['scale'][int(data_path[-1])] = value
-
-		poses.append((marker.name,pose_data))
+	# single pass over F-Curves, keyframes are read in bulk and matched to markers by frame
+	for fc in pose_library.fcurves:
+		try:
+			data_path = fc.data_path
+			if not data_path.startswith("pose.bones"):
+				continue
+		except UnicodeDecodeError: # in case of invalid datapath or something
+			continue # just skip
+
+		bone_name = data_path.split('"')[1]
+		channel = data_path.rsplit('.', 1)[-1]
+		index = fc.array_index
+		if index >= channel_sizes.get(channel, 0):
+			continue
+
+		keyframe_points = fc.keyframe_points
+		co = [0.0] * (len(keyframe_points) * 2)
+		keyframe_points.foreach_get('co', co)
+
+		for frame, value in zip(co[0::2], co[1::2]):
+			for pose_data in frame_poses.get(frame, ()):
+				# create new entry if not exist
+				transforms = pose_data.get(bone_name)
+				if transforms is None:
+					transforms = pose_data[bone_name] = {
+						'location' : [0,0,0],
+						'rotation_quaternion' :[1, 0, 0, 0],
+						'rotation_euler': [0,0,0],
+						'rotation_axis_angle': [0,0,0,0],
+						'scale' : [1, 1, 1],
+					}
+
+				# Write value
+				transforms[channel][index] = value
 
 	return poses
 
@@ -92,11 +88,11 @@ def convert_from_poselib( book: spl.PoseBook, remove_poselib = False ):
 		pose = book.poses.add()
 		pose.name = pose_name
 
+		names, locations, rotations, scales = [], [], [], []
 		for bone_name, transforms in pose_data.items():
-			bone = pose.bones.add()
-			bone.name = bone_name
-			bone.location = transforms['location']
-			bone.scale = transforms['scale']
+			names.append(bone_name)
+			locations.extend(transforms['location'])
+			scales.extend(transforms['scale'])
 
 			# store rotation as Quaternion
 			euler = Euler(transforms['rotation_euler']).to_quaternion()
@@ -106,9 +102,11 @@ def convert_from_poselib( book: spl.PoseBook, remove_poselib = False ):
 			angle_euler = math.acos( min(abs( ident.dot(euler) ), 1.0) )
 			angle_quat = math.acos( min(abs( ident.dot(quat) ), 1.0) )
 			if angle_euler > angle_quat:
-				bone.rotation = euler
+				rotations.extend(euler)
 			else:
-				bone.rotation = quat
+				rotations.extend(quat)
+
+		pose.set_bones(names, locations, rotations, scales)
 
 	book.name = poselib.name if poselib.name else armature.name if armature.name else "PoseBook_from_PoseLib"
 
@@ -129,41 +127,54 @@ def convert_to_poselib( book: spl.PoseBook ):
 	poselib = bpy.data.actions.new( basename + "_pose_library" )
 	armature.pose_library = poselib
 
-	# Iterate through poses
-	for pose in book.poses:
-		# Add new marker
+	# (data path, PoseData bone property, size, identity)
+	channels = (
+		('location', 'location', 3, (0.0, 0.0, 0.0)),
+		('rotation_quaternion', 'rotation', 4, (1.0, 0.0, 0.0, 0.0)),
+		('scale', 'scale', 3, (1.0, 1.0, 1.0)),
+	)
+	poses = book.poses
+	frames = list(range(1, len(poses) + 1))
+
+	# Gather values of all poses first: {(bone name, channel index): [values per pose]}
+	# Channels a bone never moves (identity in every pose) are skipped
+	keys = {}
+	moved = set()
+	for pose_index, (frame, pose) in enumerate(zip(frames, poses)):
+		# Add new marker, a frame per pose
 		marker = poselib.pose_markers.new( pose.name )
-
-		# Iterate through bones
-		for bone in pose.bones:
-			# Set keyframes
-			bone_path = 'pose.bones["' + bone.name + '"]'
-
-			# Location
-			poselib.fcurves.new( bone_path + ".location", index=0 )
-			poselib.fcurves.new( bone_path + ".location", index=1 )
-			poselib.fcurves.new( bone_path + ".location", index=2 )
-			poselib.fcurves[-3].keyframe_points.insert( marker.frame, bone.location[0] )
-			poselib.fcurves[-2].keyframe_points.insert( marker.frame, bone.location[1] )
-			poselib.fcurves[-1].keyframe_points.insert( marker.frame, bone.location[2] )
-
-			# Rotation
-			poselib.fcurves.new( bone_path + ".rotation_quaternion", index=0 )
-			poselib.fcurves.new( bone_path + ".rotation_quaternion", index=1 )
-			poselib.fcurves.new( bone_path + ".rotation_quaternion", index=2 )
-			poselib.fcurves.new( bone_path + ".rotation_quaternion", index=3 )
-			poselib.fcurves[-4].keyframe_points.insert( marker.frame, bone.rotation[0] )
-			poselib.fcurves[-3].keyframe_points.insert( marker.frame, bone.rotation[1] )
-			poselib.fcurves[-2].keyframe_points.insert( marker.frame, bone.rotation[2] )
-			poselib.fcurves[-1].keyframe_points.insert( marker.frame, bone.rotation[3] )
-
-			# Scale
-			poselib.fcurves.new( bone_path + ".scale", index=0 )
-			poselib.fcurves.new( bone_path + ".scale", index=1 )
-			poselib.fcurves.new( bone_path + ".scale", index=2 )
-			poselib.fcurves[-3].keyframe_points.insert( marker.frame, bone.scale[0] )
-			poselib.fcurves[-2].keyframe_points.insert( marker.frame, bone.scale[1] )
-			poselib.fcurves[-1].keyframe_points.insert( marker.frame, bone.scale[2] )
+		marker.frame = frame
+
+		names = pose.bones.keys()
+		count = len(names)
+		for channel_index, (_, prop, size, identity) in enumerate(channels):
+			values = [0.0] * (count * size)
+			pose.bones.foreach_get(prop, values)
+			for i, name in enumerate(names):
+				value = values[i * size:(i + 1) * size]
+				key = (name, channel_index)
+				rows = keys.get(key)
+				if rows is None:
+					rows = keys[key] = [identity] * len(poses)
+				rows[pose_index] = value
+				if key not in moved and any(abs(v - ident) >= 1e-6 for v, ident in zip(value, identity)):
+					moved.add(key)
+
+	# An F-Curve per moved bone channel, filled in bulk. Poses without the bone are keyed with identity,
+	# otherwise they would get values interpolated from the neighboring poses
+	co = [0.0] * (len(frames) * 2)
+	co[0::2] = frames
+	for (name, channel_index), rows in keys.items():
+		if (name, channel_index) not in moved:
+			continue
+		data_path, _, size, _ = channels[channel_index]
+		bone_path = 'pose.bones["' + bpy.utils.escape_identifier(name) + '"]'
+		for index in range(size):
+			fcurve = poselib.fcurves.new( bone_path + "." + data_path, index=index )
+			co[1::2] = [row[index] for row in rows]
+			fcurve.keyframe_points.add(len(frames))
+			fcurve.keyframe_points.foreach_set('co', co)
+			fcurve.update()
 
 	return
 
@@ -185,21 +196,28 @@ def load_poses_from_mmdtools( book: spl.PoseBook ):
 	for morph in bone_morphs:
 		pose: spl.PoseData = book.poses.add()
 		pose.name = morph.name
-		for bone_name, rotation, location in morph.data:
-			bd = pose.bones.add()
-			bd.name = bone_name
-			bd.location = location
-			bd.rotation = rotation
+
+		count = len(morph.data)
+		locations, rotations = [0.0] * (count * 3), [0.0] * (count * 4)
+		morph.data.foreach_get('location', locations)
+		morph.data.foreach_get('rotation', rotations)
+		pose.set_bones(morph.data.keys(), locations, rotations)
 
 	return
 
 
 # Convert to MMD Tools' Bone Morph
-def convert_poses_to_mmdtools( book: spl.PoseBook, use_alt_pose_names=False, clear_exsisting=False ):
+def convert_poses_to_mmdtools( book: spl.PoseBook, use_alt_pose_names=False, clear_exsisting=False, only_changed=False ) -> tuple:
+	'''
+		Parameters:
+			only_changed: rewrite only morphs whose data differs from the pose
+		Returns:
+			(number of morphs written, number of morphs skipped as unchanged)
+	'''
 	armature = book.id_data
 	root = mmd.get_model_root( armature )
 	if not root:
-		return
+		return 0, 0
 	
 	poses = book.poses
 	bone_morphs = root.mmd_root.bone_morphs
@@ -207,34 +225,69 @@ def convert_poses_to_mmdtools( book: spl.PoseBook, use_alt_pose_names=False, cle
 	if clear_exsisting:
 		bone_morphs.clear()
 
+	# create bone ids for mmd_tools in a single pass, max( bone_id within armature ) + 1 for each bone without one
+	used_bones = {bone.name for pose in poses for bone in pose.bones}
+	pbones = armature.pose.bones
+	next_id = max( (b.mmd_bone.bone_id for b in pbones), default=-1 ) + 1
+	bone_ids = {}
+	for pbone in pbones:
+		if pbone.name not in used_bones:
+			continue
+		if pbone.mmd_bone.bone_id < 0:
+			pbone.mmd_bone.bone_id = next_id
+			next_id += 1
+		bone_ids[pbone.name] = pbone.mmd_bone.bone_id
+
+	written, skipped = 0, 0
 	for pose in poses:
 		pose_name = pose.name_alt if use_alt_pose_names and pose.name_alt else pose.name
 
+		names = pose.bones.keys()
+		count = len(names)
+		ids = [bone_ids.get(name, -1) for name in names]
+		locations, rotations = [0.0] * (count * 3), [0.0] * (count * 4)
+		pose.bones.foreach_get('location', locations)
+		pose.bones.foreach_get('rotation', rotations)
+
 		# find by name
 		morph = bone_morphs.get( pose_name )
 		if not morph:
 			morph = bone_morphs.add()
 			morph.name = pose_name
 			morph.category = pose.category if pose.category in ('EYEBROW', 'EYE', 'MOUTH') else 'OTHER'
+		elif only_changed and _bone_morph_equals(morph.data, names, ids, locations, rotations):
+			skipped += 1
+			continue
 
-		# clear bone data
-		morph.data.clear()
-		for bone in pose.bones:
-			md = morph.data.add()
-			md.name = bone.name
-			pbone = armature.pose.bones.get( bone.name )
-			if pbone:
-				bone_id = pbone.mmd_bone.bone_id
-				if bone_id < 0:
-					# create bone id for mmd_tools
-					# bone id is max( bone_id within armature ) + 1
-					bone_id = max( [b.mmd_bone.bone_id for b in armature.pose.bones] ) + 1
-					pbone.mmd_bone.bone_id = bone_id
-
-				md.bone_id = pbone.mmd_bone.bone_id # finally we have bone_id
-			md.location = bone.location
-			md.rotation = bone.rotation
-	return
+		# replace bone data in bulk
+		data = morph.data
+		data.clear()
+		for _ in range(count):
+			data.add()
+		for md, name in zip(data, names):
+			md.name = name
+		data.foreach_set('bone_id', ids)
+		data.foreach_set('location', locations)
+		data.foreach_set('rotation', rotations)
+		written += 1
+
+	return written, skipped
+
+
+# Check if the bone morph data already holds the content. Values are compared as stored (float32)
+def _bone_morph_equals( data, names, ids, locations, rotations ) -> bool:
+	if data.keys() != names:
+		return False
+	count = len(names)
+	stored_ids, stored_locations, stored_rotations = [0] * count, [0.0] * (count * 3), [0.0] * (count * 4)
+	data.foreach_get('bone_id', stored_ids)
+	data.foreach_get('location', stored_locations)
+	data.foreach_get('rotation', stored_rotations)
+	return (
+		stored_ids == ids
+		and stored_locations == array.array('f', locations).tolist()
+		and stored_rotations == array.array('f', rotations).tolist()
+	)
 
 
 # Helper: Guess pose category from pose name
@@ -259,9 +312,8 @@ def guess_pose_category( pose_name ):
 
 
 # Json format
-import json
 # Save PoseBook into a file (JSON)
-def save_book_to_json( book: spl.PoseBook, filepath, use_armature_space=False ):
+def save_book_to_json( book: spl.PoseBook, filepath, use_armature_space=False, precision=None, compact=False, omit_identity=False, compression='NONE' ):
 	'''
 		Parameters:
 			book: PoseBook
@@ -269,13 +321,34 @@ def save_book_to_json( book: spl.PoseBook, filepath, use_armature_space=False ):
 			use_armature_space: bool
 				True: Save bone location and rotation in armature space (if possible)
 				False: Save bone location and rotation in bone local space
+			precision: int, number of decimal places of transforms (None: full precision)
+			compact: bool, no indentation (one pose per line)
+			omit_identity: bool, omit zero location, identity rotation and unit scale
+			compression: 'NONE', 'GZIP' or 'XZ'
 	'''
 
-	poses = book.poses
+	# Save to file
+	with spl_formats.open_text(filepath, 'w', compression) as f:
+		spl_formats.write_json_poses(f, _iter_json_pose_data(book, use_armature_space), precision, compact, omit_identity)
 
-	# Convert to JSON
-	data = []
-	for pose in poses:
+	return
+
+
+# Save PoseBook into a directory (manifest + one JSON file per pose), rewriting only changed poses
+def save_book_to_json_dir( book: spl.PoseBook, dirpath, use_armature_space=False, precision=None, omit_identity=False ):
+	'''
+		Parameters: same as save_book_to_json
+		Returns:
+			(number of poses, number of pose files written, number of pose files removed)
+	'''
+	return spl_formats.write_json_pose_dir(dirpath, _iter_json_pose_data(book, use_armature_space), precision, omit_identity)
+
+
+# Convert poses to JSON dicts, one pose at a time
+def _iter_json_pose_data( book: spl.PoseBook, use_armature_space ):
+	arm = book.get_armature()
+	rest = utils.get_rest_matrices(arm) if use_armature_space else None
+	for pose in book.poses:
 		pose_data = {
 			'name' : pose.name,
 			'name_alt' : pose.name_alt,
@@ -290,8 +363,8 @@ def save_book_to_json( book: spl.PoseBook, filepath, use_armature_space=False ):
 			sca = Vector(bone_data.scale)
 
 			if use_armature_space:
-				pbone = book.get_armature().pose.bones.get(name)
-				loc, rot, sca = utils.to_armature_space( loc, rot, sca, pbone )
+				pbone = arm.pose.bones.get(name)
+				loc, rot, sca = utils.to_armature_space( loc, rot, sca, pbone, rest=rest )
 
 			bd = {
 				'name' : name,
@@ -300,282 +373,474 @@ def save_book_to_json( book: spl.PoseBook, filepath, use_armature_space=False ):
 				'scale' : sca[:],
 			}
 			pose_data['bones'].append(bd)
-		data.append(pose_data)
-	
-	# Save to file
-	with open(filepath, 'w') as f:
-		json.dump(data, f, indent=2)
-	
-	return
+		yield pose_data
 
 
-# Load PoseBook from a file (JSON)
-def load_book_from_json( book: spl.PoseBook, filepath ) -> list[str]:
+# Load PoseBook from a file (JSON, optionally gzip/xz compressed)
+def load_book_from_json( book: spl.PoseBook, filepath, pose_names=None, categories=None, bone_names=None, errors=None ) -> list[str]:
 	'''
 		Parameters:
 			book: PoseBook
 			filepath: str
+			pose_names: load only poses with these names (None: all)
+			categories: load only poses in these categories (None: all)
+			bone_names: load only these bones, Blender or MMD names (None: all)
+			errors: list, malformed entries (spl_formats.EntryError) are appended to it and skipped
+		Compressed files (gzip, xz) are detected automatically.
+		A PoseBook directory (see save_book_to_json_dir) is loaded by passing its manifest.json or the directory.
 		Returns:
 			list of bone names that are not found in the armature
 	'''
-	bones_not_found = {}
-	poses = book.poses
-	poses.clear()
+	book.poses.clear()
 
-	arm = book.get_armature()
+	resolver = mmd.get_bone_name_resolver(book.get_armature())
+
+	bone_filter = None
+	if bone_names is not None:
+		bone_names = set(bone_names)
+		bone_filter = lambda name: name in bone_names or resolver.resolve_name(name) in bone_names
+
+	if errors is None:
+		errors = []
+
+	if os.path.basename(filepath) == spl_formats.MANIFEST_NAME:
+		filepath = os.path.dirname(filepath)
+
+	# Load from file, one pose at a time
+	with contextlib.ExitStack() as stack:
+		if os.path.isdir(filepath):
+			pose_iter = spl_formats.read_json_pose_dir(filepath, pose_names, categories, bone_filter, errors)
+		else:
+			f = stack.enter_context(spl_formats.open_text(filepath))
+			pose_iter = spl_formats.read_json_poses(f, pose_names, categories, bone_filter, errors)
+
+		bones_not_found = add_poses_from_json_data(book, pose_iter)
+
+	for error in errors:
+		print(f'Warning: {filepath}: {error}')
+
+	# remove path and extension from filename
+	book.name = os.path.splitext( os.path.basename(os.path.normpath(filepath)) )[0]
+	return bones_not_found
 
-	# Load from file
-	with open(filepath, 'r') as f:
-		data = json.load(f)
 
-	# Convert from JSON
-	for pose_data in data:
+# Add poses decoded from JSON (see spl_formats.read_json_poses) to the book
+def add_poses_from_json_data( book: spl.PoseBook, pose_data_iter ) -> list[str]:
+	'''
+		Returns:
+			list of bone names that are not found in the armature
+	'''
+	bones_not_found = {}
+	poses = book.poses
+	resolver = mmd.get_bone_name_resolver(book.get_armature())
+	rest = utils.get_rest_matrices(book.get_armature())
+
+	for pose_data in pose_data_iter:
 		pose = poses.add()
 		pose.name = pose_data.get('name')
-		pose.name_alt = pose_data.get('name_alt')
-		pose.category = pose_data.get('category', 'NONE')
-		# if pose.category == 'NONE' and auto_set_category: # Guess
+		pose.name_alt = pose_data.get('name_alt') or ''
+		pose.category = spl_formats.pose_category(pose_data) # missing or unknown: OTHER
+		# if pose.category == 'OTHER' and auto_set_category: # Guess
 		# 	pose.category = guess_pose_category( pose.name )
-		
+
 		space = pose_data.get('space', 'LOCAL')
 
+		names, locations, rotations, scales = [], [], [], []
 		for bone_data in pose_data.get('bones'):
 			name = bone_data.get('name')
-			loc = Vector( bone_data.get('location') )
-			rot = Quaternion( bone_data.get('rotation') )
-			sca = Vector( bone_data.get('scale', (1.0, 1.0, 1.0))  )
+			loc = Vector( bone_data['location'] )
+			rot = Quaternion( bone_data['rotation'] )
+			sca = Vector( bone_data['scale'] )
 
-			pbone = arm.pose.bones.get(name)
+			pbone = resolver.resolve(name)
 			if pbone is None:
 				bones_not_found[name] = True
+			else:
+				name = pbone.name
 
 			if space == 'ARMATURE':
 				if pbone is None:
 					continue
-				loc, rot, sca = utils.to_armature_space( loc, rot, sca, pbone, invert=True )
+				loc, rot, sca = utils.to_armature_space( loc, rot, sca, pbone, invert=True, rest=rest )
 
-			bd = pose.bones.add()
-			bd.name = name
-			bd.location = loc
-			bd.rotation = rot
-			bd.scale = sca
+			names.append(name)
+			locations.extend(loc)
+			rotations.extend(rot)
+			scales.extend(sca)
+
+		pose.set_bones(names, locations, rotations, scales)
 
-	# remove path and extension from filename
-	book.name = os.path.splitext( os.path.basename(filepath) )[0]
 	return [name for name in bones_not_found.keys()]
 
 
-# CSV format
-import csv
+# Binary format (.splb)
+import numpy as np
+from . import splb
 
-_POSE_CATEGORIES = [
-	'NONE', 'EYEBROW', 'EYE', 'MOUTH', 'OTHER'
-]
+# Save PoseBook into a file (SPLB)
+def save_book_to_splb( book: spl.PoseBook, filepath, use_armature_space=False ):
+	'''
+		Parameters:
+			book: PoseBook
+			filepath: str
+			use_armature_space: bool, same as save_book_to_json
+	'''
+	arm = book.get_armature()
+	space = 'ARMATURE' if use_armature_space else 'LOCAL'
+	rest = utils.get_rest_matrices(arm) if use_armature_space else None
+
+	def iter_poses():
+		for pose in book.poses:
+			bones = pose.bones
+			count = len(bones)
+			names = [bone_data.name for bone_data in bones]
+			locations = np.empty(count * 3, dtype=np.float32)
+			rotations = np.empty(count * 4, dtype=np.float32)
+			scales = np.empty(count * 3, dtype=np.float32)
+			bones.foreach_get('location', locations)
+			bones.foreach_get('rotation', rotations)
+			bones.foreach_get('scale', scales)
 
+			if use_armature_space:
+				for i, name in enumerate(names):
+					pbone = arm.pose.bones.get(name)
+					loc, rot, sca = utils.to_armature_space( Vector(locations[i*3:i*3+3]), Quaternion(rotations[i*4:i*4+4]), Vector(scales[i*3:i*3+3]), pbone, rest=rest )
+					locations[i*3:i*3+3] = loc
+					rotations[i*4:i*4+4] = rot
+					scales[i*3:i*3+3] = sca
 
-# Save PoseBook into a file (CSV)
-def save_book_to_csv( book: spl.PoseBook, filename, scale=12.5, use_mmd_bone_names=True, use_alt_names=False ):
+			yield splb.SplbPose(pose.name, pose.name_alt, pose.category, space, names, locations, rotations, scales)
+
+	splb.write_splb(filepath, iter_poses())
+	return
+
+
+# Load PoseBook from a file (SPLB)
+def load_book_from_splb( book: spl.PoseBook, data: splb.SplbFile ) -> list[str]:
+	'''
+		Parameters:
+			book: PoseBook
+			data: opened SplbFile (validated when opened, so reading it can't fail halfway)
+		Returns:
+			list of bone names that are not found in the armature
+	'''
 	poses = book.poses
+	poses.clear()
+
 	arm = book.get_armature()
-	scale = scale * arm.matrix_world.to_scale()[0] # consider armature scale, only uniform scale is supported, using scale.x here
+	resolver = mmd.get_bone_name_resolver(arm)
+	rest = utils.get_rest_matrices(arm)
+	resolved = {} # {name in file: PoseBone or None}, names repeat over poses
 
-	converters = {b: mmd.BoneConverter(b, scale, invert=True) for b in arm.pose.bones}
+	for entry in data:
+		pose = poses.add()
+		pose.name = entry.name
+		pose.name_alt = entry.name_alt
+		pose.category = entry.category
 
-	with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-		# write header
-		header = ';PmxMorph,モーフ名,モーフ名(英),パネル(0:無効/1:眉(左下)/2:目(左上)/3:口(右上)/4:その他(右下)),モーフ種類(0:グループモーフ/1:頂点モーフ/2:ボーンモーフ/3:UV(Tex)モーフ/4:追加UV1モーフ/5:追加UV2モーフ/6:追加UV3モーフ/7:追加UV4モーフ/8:材質モーフ/9:フリップモーフ/10:インパルスモーフ)\n'
-		csvfile.write(header)
+		pbones = []
+		for name in entry.bone_names:
+			if name not in resolved:
+				resolved[name] = resolver.resolve(name)
+			pbones.append(resolved[name])
 
-		# write data
-		for pose in poses:
-			pose_name = pose.name_alt if use_alt_names and pose.name_alt else pose.name
-			pose_name_alt = pose.name if use_alt_names and pose.name_alt else pose.name
-			# Write a pose header
-			# format: f"PmxMorph,{pose.name_j},{pose.name_e},{category_index},2(BoneMorph)"
-			if pose.category not in _POSE_CATEGORIES:
-				category_index = 4
-			else:
-				category_index = _POSE_CATEGORIES.index(pose.category)
-			pose_header = f'PmxMorph,"{pose_name}","{pose_name_alt}",{category_index},2\n'
-			csvfile.write(pose_header)
+		names = [name if pbone is None else pbone.name for name, pbone in zip(entry.bone_names, pbones)]
 
-			# Write a bone list header
-			# format: f";PmxBoneMorph,親モーフ名,オフセットIndex,ボーン名,移動量_x,移動量_y,移動量_z,回転量_x[deg],回転量_y[deg],回転量_z[deg]"
-			bone_header = f';PmxBoneMorph,親モーフ名,オフセットIndex,ボーン名,移動量_x,移動量_y,移動量_z,回転量_x[deg],回転量_y[deg],回転量_z[deg]\n'
-			csvfile.write(bone_header)
+		if entry.space != 'ARMATURE':
+			# channels are views of the file, written as is
+			pose.set_bones(names, entry.locations, entry.rotations, entry.scales)
+			continue
 
-			# Write bone data
-			for index, bone in enumerate(pose.bones):
-				# Write a bone data
-				# format: f"PmxBoneMorph,{pose.name},index,{bone.name},{loc.x},{loc.y},{loc.z},{rot.x},{rot.y},{rot.z}"
+		locations, rotations, scales = [], [], []
+		for i, pbone in enumerate(pbones):
+			if pbone is None:
+				continue
+			loc, rot, sca = utils.to_armature_space( Vector(entry.locations[i*3:i*3+3]), Quaternion(entry.rotations[i*4:i*4+4]), Vector(entry.scales[i*3:i*3+3]), pbone, invert=True, rest=rest )
+			locations.extend(loc)
+			rotations.extend(rot)
+			scales.extend(sca)
+		pose.set_bones([name for name, pbone in zip(names, pbones) if pbone], locations, rotations, scales)
 
-				pbone = arm.pose.bones.get(bone.name)
-				if pbone is None:
-					print(f'Warning: Bone "{bone.name}" in pose "{pose.name}" not found in "{arm.name}", skipping...')
-					continue
+	book.name = os.path.splitext( os.path.basename(data.filepath) )[0]
+	return [name for name, pbone in resolved.items() if pbone is None]
 
-				if use_mmd_bone_names:
-					bone_name_j, _ = mmd.get_mmd_bone_name_j_e(pbone)
-				else:
-					bone_name_j = pbone.name
 
-				# Convet using mmd_tools' BoneConverter
-				converter = converters[pbone]
-				loc = converter.convert_location(bone.location)
-				rot = converter.convert_rotation(bone.rotation)
-				rot.x, rot.y, rot.z = utils.quat_to_euler_mmd(rot, degrees=True)
+# CSV format
 
-				# # convert to armature space
-				# loc, rot, _  = utils.to_armature_space( bone.location, bone.rotation, bone.scale, pbone )
-				# loc = loc * scale * arm.scale[0] # convert to MMD unit considering armature scale
-				# rot = utils.quaternion_to_degrees( rot )
+_POSE_CATEGORIES = [
+	'NONE', 'EYEBROW', 'EYE', 'MOUTH', 'OTHER'
+]
 
-				# # Swap YZ axis for MMD
-				# loc = utils.swap_axis( loc, (0, 2, 1) )
-				# rot = utils.swap_axis( rot, (0, 2, 1) )
 
-				bone_data = f'PmxBoneMorph,"{pose_name}",{index},"{bone_name_j}",{loc.x:.5g},{loc.y:.5g},{loc.z:.5g},{rot.x:.5g},{rot.y:.5g},{rot.z:.5g}\n'
-				csvfile.write(bone_data)
+# Save PoseBook into a file (CSV)
+def save_book_to_csv( book: spl.PoseBook, filename, scale=12.5, use_mmd_bone_names=True, use_alt_names=False ) -> bool:
+	'''
+		Returns:
+			True if the file was written, False if the existing file had the same content
+	'''
+	return save_books_to_csv([book], filename, scale, use_mmd_bone_names, use_alt_names)
 
-		# Comment
-		csvfile.write("\n;This file is generated by Sakura Poselib addon for Blender.\n")
-	# end of with open()
 
-	return
+# Save poses of multiple PoseBooks into a single file (CSV), e.g. the full morph set of a model
+def save_books_to_csv( books, filename, scale=12.5, use_mmd_bone_names=True, use_alt_names=False, categories=None ) -> bool:
+	'''
+		Parameters:
+			books: list of PoseBook (of the same armature)
+			categories: export only poses in these categories (None: all)
+		Returns:
+			True if the file was written, False if the existing file had the same content
+	'''
+	if not books:
+		return False
 
+	poses = [pose for book in books for pose in book.poses if categories is None or pose.category in categories]
+	morphs = poses_to_csv_morphs(books[0].get_armature(), poses, scale, use_mmd_bone_names, use_alt_names)
 
-# Load PoseBook from a file (CSV)
-def load_book_from_csv( book: spl.PoseBook, filename, scale=0.08 ):
-	poses = book.poses
-	arm = book.get_armature()
-	scale = scale / arm.scale[0] # consider armature scale
-	converters = {b: mmd.BoneConverter(b, scale) for b in arm.pose.bones}
+	if len(books) > 1: # morph names must be unique in a model
+		for morph, name in zip(morphs, spl.make_unique_names([morph.name for morph in morphs])):
+			morph.name = name
 
-	# Format:
-	# line starts with ';' is comment. just discard.
+	# build in memory and write only if changed, so unchanged exports keep the file untouched
+	with io.StringIO(newline='') as csvfile:
+		spl_formats.write_csv_morphs(csvfile, morphs)
+		return spl_formats.write_text_if_changed(filename, csvfile.getvalue(), newline='')
 
-	# Line starts with PMXMorh is a pose header
-	#   PmxMorph,"{pose_name}","eng_name(discard)",category_index,4(BoneMorph) 
 
-	# Line starts with PmxBoneMorph is a bone data
-	#   PmxBoneMorph,"{pose_name(which is this bone transform is belongs to)}",index(within the pose, sequential),"{bone_name}",loc_x,loc_y,loc_z,rot_x,rot_y,rot_z
+# Convert poses to CSV bone morphs (MMD unit and degrees), ready for spl_formats.write_csv_morphs
+def book_to_csv_morphs( book: spl.PoseBook, scale=12.5, use_mmd_bone_names=True, use_alt_names=False ) -> list:
+	return poses_to_csv_morphs(book.get_armature(), book.poses, scale, use_mmd_bone_names, use_alt_names)
 
-	# loc is in MMD unit (1/12.5 of Blender unit)
-	# rot is in degree (not radian)
 
-	with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
-		reader = csv.reader(csvfile, delimiter=',', quotechar='"')
+def poses_to_csv_morphs( arm: bpy.types.Object, poses, scale=12.5, use_mmd_bone_names=True, use_alt_names=False ) -> list:
+	scale = scale * arm.matrix_world.to_scale()[0] # consider armature scale, only uniform scale is supported, using scale.x here
+	rest = utils.get_rest_matrices(arm)
 
-		for row in reader:
-			if len(row) < 1:
+	# per bone caches, built only for bones used by the poses
+	bone_cache = {} # {bone name: (converter, name in CSV) or None if not found}
+	def get_bone(name):
+		pbone = arm.pose.bones.get(name)
+		if pbone is None:
+			return None
+		if use_mmd_bone_names:
+			bone_name_j, _ = mmd.get_mmd_bone_name_j_e(pbone)
+		else:
+			bone_name_j = pbone.name
+		return mmd.BoneConverter(pbone, scale, invert=True, rest=rest), bone_name_j
+
+	morphs = []
+	for pose in poses:
+		pose_name = pose.name_alt if use_alt_names and pose.name_alt else pose.name
+		pose_name_alt = pose.name if use_alt_names and pose.name_alt else pose.name
+		if pose.category not in _POSE_CATEGORIES:
+			category_index = 4
+		else:
+			category_index = _POSE_CATEGORIES.index(pose.category)
+		morph = spl_formats.CsvMorph(pose_name, pose_name_alt, category_index)
+
+		for index, bone in enumerate(pose.bones):
+			name = bone.name
+			if name not in bone_cache:
+				bone_cache[name] = get_bone(name)
+			cached = bone_cache[name]
+			if cached is None:
+				print(f'Warning: Bone "{name}" in pose "{pose.name}" not found in "{arm.name}", skipping...')
 				continue
 
-			#print(f"row: {row}")
-			# if the line is comment, discard
-			if row[0].startswith(';'):
-				continue
+			# Convet using mmd_tools' BoneConverter
+			converter, bone_name_j = cached
+			loc = converter.convert_location(bone.location)
+			rot = converter.convert_rotation(bone.rotation)
+			rot = utils.quat_to_euler_mmd(rot, degrees=True)
 
-			def _add_pose(name, cat_index):
-				pose = poses.get(name)
-				if not pose:
-					pose = poses.add()
-					pose.name = name
-				else: # warn if the pose is already exists
-					print(f'Pose "{name}" is already exists. Overwrite it.')
-
-				pose.category = _POSE_CATEGORIES[cat_index] if cat_index < len(_POSE_CATEGORIES) and cat_index >= 0 else 'OTHER'
-				# if pose.category == 0:
-				# 	pose.category = guess_pose_category(pose.name)
-				return pose
-
-			# if the line is PMXMorph header, create a new pose
-			if row[0].startswith('PmxMorph'):
-				pose_name = row[1].strip('"')
-				pose_name_e = row[2].strip('"')
-				cat_index = int(row[3])
-				pose = _add_pose(pose_name, cat_index)
-				pose.name_alt = pose_name_e
-				continue
+			morph.bones.append((index, bone_name_j, loc[:], tuple(rot)))
+		morphs.append(morph)
 
-			# if the line is PmxBoneMorph, add a bone data to the pose indicated by the pose name
-			if row[0].startswith('PmxBoneMorph'):
-				pose_name = row[1].strip('"')
-				index = int(row[2]) # TODO: use this to sort bones within pose (currently, it is not used)
-				pose = poses.get(pose_name)
+	return morphs
 
-				if not pose: # warn if the pose is not found
-					pose = _add_pose(pose_name, -1)
-					print(f'Pose "{pose_name}" is not found. Creating a new pose.')
 
-				bone_name = row[3].strip('"')
-				loc = Vector( (float(row[4]), float(row[5]), float(row[6])) ) 
-				rot = Vector( (float(row[7]), float(row[8]), float(row[9])) )
+# Load PoseBook from a file (CSV)
+def load_book_from_csv( book: spl.PoseBook, filename, scale=0.08 ) -> dict:
+	'''
+		Returns:
+			{bone name: number of rows skipped} for bones not found in the armature
+	'''
+	errors = []
+	morphs = spl_formats.read_csv_morphs(filename, errors)
+	for error in errors:
+		print(f'Warning: {filename}: {error}')
 
-				# convert to blender unit
-				pbone = mmd.get_pose_bone_by_mmd_name(arm, bone_name)
-				if pbone is None:
-					print(f'Warning: Bone "{bone_name}" not found in "{arm.name}", skippping...')
-					continue
+	bones_not_found = add_poses_from_csv_morphs(book, morphs, scale)
+	book.name = os.path.basename(filename)
+	return bones_not_found
 
-				# # Convert using mmd_tools' BoneConverter
-				converter = converters[pbone]
-				loc = converter.convert_location(loc)
-				rot = utils.euler_to_quat_mmd(rot, degrees=True) # convert to quaternion
-				rot = converter.convert_rotation(rot)
 
-				# Swap YZ axis for Blender
-				# loc = utils.swap_axis( loc, (0, 2, 1) ) # still in MMD unit
-				# rot = utils.swap_axis( rot, (0, 2, 1) )
+# Add poses from CSV bone morphs (see spl_formats.read_csv_morphs) to the book
+def add_poses_from_csv_morphs( book: spl.PoseBook, morphs, scale=0.08 ) -> dict:
+	'''
+		Returns:
+			{bone name: number of rows skipped} for bones not found in the armature
+	'''
+	poses = book.poses
+	arm = book.get_armature()
+	scale = scale / arm.scale[0] # consider armature scale
+	resolver = mmd.get_bone_name_resolver(arm)
+	rest = utils.get_rest_matrices(arm)
 
-				# # convert to Blender unit
-				# loc = loc * scale / arm.scale[0] # convert to Blender unit (1/12.5 of MMD unit)
-				# rot = utils.degrees_to_quaternion( rot )  # specify the order for conversion
-				# # convert to bone local space
-				# loc, rot, _ = utils.to_armature_space( loc, rot, Vector((1,1,1)), pbone, invert=True )
+	# loc is in MMD unit (1/12.5 of Blender unit)
+	# rot is in degree (not radian)
 
-				bone = pose.bones.add()
-				bone.name = pbone.name
-				bone.location = loc
-				bone.rotation = rot
-				bone.scale = Vector((1.0,1.0,1.0)) # Not in MMD
+	bone_cache = {} # {bone name in CSV: (Blender bone name, converter) or None}, resolved once per name
+	bones_not_found = {}
 
+	for morph in morphs:
+		morph: spl_formats.CsvMorph
+		pose = poses.get(morph.name)
+		if not pose:
+			pose = poses.add()
+			pose.name = morph.name
+		else: # warn if the pose is already exists
+			print(f'Pose "{morph.name}" is already exists. Overwrite it.')
+
+		cat_index = morph.category_index
+		pose.category = _POSE_CATEGORIES[cat_index] if cat_index < len(_POSE_CATEGORIES) and cat_index >= 0 else 'OTHER'
+		pose.name_alt = morph.name_alt
+
+		names, locations, rotations = [], [], []
+		for index, bone_name, loc, rot in morph.bones: # already sorted by index
+			if bone_name not in bone_cache:
+				pbone = resolver.resolve(bone_name)
+				bone_cache[bone_name] = None if pbone is None else (pbone.name, mmd.BoneConverter(pbone, scale, rest=rest))
+			cached = bone_cache[bone_name]
+			if cached is None:
+				bones_not_found[bone_name] = bones_not_found.get(bone_name, 0) + 1
 				continue
 
-		book.name = os.path.basename(filename)
+			# Convert using mmd_tools' BoneConverter
+			name, converter = cached
+			loc = converter.convert_location(Vector(loc))
+			rot = utils.euler_to_quat_mmd(Vector(rot), degrees=True) # convert to quaternion
+			rot = converter.convert_rotation(rot)
 
-	return
+			names.append(name)
+			locations.extend(loc)
+			rotations.extend(rot) # scale is not in MMD
+
+		pose.set_bones(names, locations, rotations)
+
+	if bones_not_found:
+		print(f'Warning: {len(bones_not_found)} bones not found in "{arm.name}", skipped rows: ' + ", ".join(f"{name} ({count})" for name, count in bones_not_found.items()))
+
+	return bones_not_found
 
 
 # Save a pose as VPD file
 def export_pose_as_vpd( pose:spl.PoseData, filepath, scale=12.5 ):
+	vpd = pose_to_vpd(pose, scale)
+	vpd.save(filepath=filepath)
+	return
+
+# Convert a pose to VPD data (MMD unit)
+def pose_to_vpd( pose:spl.PoseData, scale=12.5, bone_cache=None ) -> mmd.VpdFile:
+	'''
+		bone_cache: dict, pass the same dict to share converters and bone names over poses of the armature (same scale)
+	'''
 	arm = pose.get_armature()
+	if bone_cache is None:
+		bone_cache = {}
+	rest = utils.get_rest_matrices(arm)
 
 	vpd = mmd.VpdFile()
 
 	for bone in pose.bones:
 		bone: spl.BoneTransform
 
-		pbone = arm.pose.bones.get(bone.name)
-		if pbone is None:
-			print(f'Warning: Bone "{bone.name}" not found in "{arm.name}", skipping...')
+		name = bone.name
+		if name not in bone_cache:
+			pbone = arm.pose.bones.get(name)
+			bone_cache[name] = None if pbone is None else (mmd.BoneConverter(pbone, scale, invert=True, rest=rest), mmd.get_mmd_bone_name_j_e(pbone)[0])
+		cached = bone_cache[name]
+		if cached is None:
+			print(f'Warning: Bone "{name}" not found in "{arm.name}", skipping...')
 			continue
 
-		converter = mmd.BoneConverter(pbone, scale, invert=True)
+		converter, bone_name = cached
 		loc = converter.convert_location(bone.location)
 		rot = converter.convert_rotation(bone.rotation)
 		rot = [rot.x, rot.y, rot.z, rot.w]
 
-		bone_name = pbone.mmd_bone.name_j if pbone.mmd_bone.name_j else pbone.name
 		vpd.bones.append( mmd.VpdBone( bone_name, loc, rot ) )
 	
 	vpd.osm_name = arm.name
-	vpd.save(filepath=filepath)
-	return
+	return vpd
+
+
+VPD_NAME_TEMPLATE = "{pose}"
+
+# Check the file name template by formatting dummy values. Returns an error message, or None if valid
+def validate_vpd_name_template( name_template ) -> str:
+	try:
+		name_template.format(pose='pose', alt='alt', book='book', category='Other', index=0, armature='armature')
+	except (KeyError, ValueError, IndexError, AttributeError, TypeError) as e:
+		return f'{type(e).__name__}: {e}'
+	return None
+
+# Convert all poses of the book to VPD data. Returns [(filepath, VpdFile)]
+def book_to_vpds( book: spl.PoseBook, directory, scale=12.5, name_template=VPD_NAME_TEMPLATE, use_category_folders=False, include_morphs=False ) -> list:
+	'''
+		Parameters:
+			name_template: file name (without extension), with {pose}, {alt}, {book}, {category}, {index}, {armature}
+			use_category_folders: put files into a subfolder per category
+			include_morphs: add Morph blocks with the current values of the other poses (nonzero only)
+		Raises:
+			KeyError, ValueError, IndexError, AttributeError, TypeError: invalid name template (check it with validate_vpd_name_template() first)
+	'''
+	arm = book.get_armature()
+	bone_cache = {} # shared by all poses
+	values = [(pose.name, pose.value) for pose in book.poses] if include_morphs else []
+
+	vpds = []
+	used = set()
+	for index, pose in enumerate(book.poses):
+		name = name_template.format(
+			pose=pose.name, alt=pose.name_alt or pose.name, book=book.name, category=pose.category.title(), index=index, armature=arm.name,
+		)
+		name = spl_formats.safe_file_name(name, 'pose')
+		folder = os.path.join(directory, pose.category.title()) if use_category_folders else directory
+
+		# avoid overwriting files of poses with the same name
+		filepath = os.path.join(folder, name + '.vpd')
+		counter = 1
+		while filepath.lower() in used:
+			filepath = os.path.join(folder, f'{name}.{counter:03}.vpd')
+			counter += 1
+		used.add(filepath.lower())
+
+		vpd = pose_to_vpd(pose, scale, bone_cache)
+		vpd.morphs = [mmd.VpdMorph(pose_name, value) for pose_name, value in values if value != 0.0 and pose_name != pose.name]
+		vpds.append((filepath, vpd))
+
+	return vpds
+
+
+# Save all poses of the book as VPD files (a file per pose). Returns number of files written
+def export_book_as_vpd( book: spl.PoseBook, directory, scale=12.5, name_template=VPD_NAME_TEMPLATE, use_category_folders=False, include_morphs=False ) -> int:
+	vpds = book_to_vpds(book, directory, scale, name_template, use_category_folders, include_morphs)
+	write_vpds(vpds)
+	return len(vpds)
+
+
+# Write VPD files in one batch, encoding everything before touching the disk
+def write_vpds( vpds ):
+	encoded = [(filepath, vpd.dumps().encode(vpd.ENCODING, errors="replace")) for filepath, vpd in vpds]
+	for folder in {os.path.dirname(filepath) for filepath, _ in encoded}:
+		os.makedirs(folder, exist_ok=True)
+	for filepath, data in encoded:
+		with open(filepath, 'wb') as f:
+			f.write(data)
+
 
 # Load a pose from VPD file
 def import_pose_from_vpd( pose:spl.PoseData, filepath, scale=12.5 ):
-	arm = pose.get_armature()
-
 	vpd = mmd.VpdFile()
 	try:
 		vpd.load(filepath=filepath)
@@ -583,17 +848,27 @@ def import_pose_from_vpd( pose:spl.PoseData, filepath, scale=12.5 ):
 		print(f'Error: Failed to load VPD file "{filepath}": {e}')
 		return None
 
-	pose.bones.clear()
+	set_pose_from_vpd(pose, vpd, scale)
+	pose.name = os.path.basename(filepath)
+	return pose
+
+
+# Set bones of the pose from a loaded VPD file
+def set_pose_from_vpd( pose:spl.PoseData, vpd:mmd.VpdFile, scale=12.5 ):
+	arm = pose.get_armature()
+	resolver = mmd.get_bone_name_resolver(arm)
+	rest = utils.get_rest_matrices(arm)
+	names, locations, rotations = [], [], []
 
 	for vpdbone in vpd.bones:
 		vpdbone: mmd.VpdBone
 
-		pbone = mmd.get_pose_bone_by_mmd_name(arm, vpdbone.bone_name)
+		pbone = resolver.resolve(vpdbone.bone_name)
 		if pbone is None:
 			print(f'Warning: Bone "{vpdbone.bone_name}" not found in "{arm.name}", skipping...')
 			continue
 
-		converter = mmd.BoneConverter(pbone, scale)
+		converter = mmd.BoneConverter(pbone, scale, rest=rest)
 		loc = Vector(vpdbone.location)
 		loc = converter.convert_location(loc)
 
@@ -601,17 +876,579 @@ def import_pose_from_vpd( pose:spl.PoseData, filepath, scale=12.5 ):
 		rot = Quaternion((rot[3], rot[0], rot[1], rot[2]))
 		rot = converter.convert_rotation(rot)
 
-		bd = pose.bones.add()
-		bd.name = pbone.name
-		bd.location = loc
-		bd.rotation = rot
-		bd.scale = Vector((1.0,1.0,1.0)) # Not in MMD
-	
-	pose.name = os.path.basename(filepath)
-	return pose
+		names.append(pbone.name)
+		locations.extend(loc)
+		rotations.extend(rot) # scale is not in MMD
+
+	pose.set_bones(names, locations, rotations)
+
+
+# Batch import
+#
+# Files are parsed in a process pool by spl_formats.parse_file() (no bpy), then committed to PoseBooks on the main thread.
+# Workers can't import this add-on package (its __init__ needs bpy), so each worker loads spl_formats from its file under
+# the same module name as here, with empty placeholders for the parent packages. Functions, results and exceptions are
+# then pickled by that name both ways, and nothing is registered in Blender's sys.modules.
+# The initializer is run through exec(), which is picklable by reference.
+
+_WORKER_INIT = '''
+import importlib.util, sys, types
+package = name.rpartition('.')[0]
+while package:
+	sys.modules.setdefault(package, types.ModuleType(package))
+	package = package.rpartition('.')[0]
+spec = importlib.util.spec_from_file_location(name, path)
+module = importlib.util.module_from_spec(spec)
+sys.modules[name] = module
+spec.loader.exec_module(module)
+'''
+
+def parse_files( filepaths, max_workers=None, progress=None ) -> dict:
+	'''
+		Parse files concurrently in worker processes (falls back to this process if the pool is not available).
+		Parameters:
+			filepaths: list of JSON/CSV/VPD file paths
+			progress: callable(done, total), called on the main thread
+		Returns:
+			{filepath: (kind, data, errors) or Exception}
+	'''
+	import concurrent.futures
+	import multiprocessing
+
+	results = {}
+	total = len(filepaths)
+
+	def parse_serial(paths):
+		for path in paths:
+			try:
+				results[path] = spl_formats.parse_file(path)
+			except Exception as e:
+				results[path] = e
+			if progress:
+				progress(len(results), total)
+
+	if total < 2:
+		parse_serial(filepaths)
+		return results
+
+	try:
+		executor = concurrent.futures.ProcessPoolExecutor(
+			max_workers=max_workers or min(total, os.cpu_count() or 1),
+			mp_context=multiprocessing.get_context('spawn'), # fork is unsafe in Blender
+			initializer=exec,
+			initargs=(_WORKER_INIT, {'name': spl_formats.__name__, 'path': spl_formats.__file__}),
+		)
+	except Exception as e:
+		print(f'Sakura Poselib: Process pool is not available ({e}), parsing files serially')
+		parse_serial(filepaths)
+		return results
+
+	try:
+		with executor:
+			futures = {executor.submit(spl_formats.parse_file, path): path for path in filepaths}
+			for future in concurrent.futures.as_completed(futures):
+				path = futures[future]
+				try:
+					results[path] = future.result()
+				except concurrent.futures.process.BrokenProcessPool:
+					raise
+				except Exception as e:
+					results[path] = e
+				if progress:
+					progress(len(results), total)
+	except concurrent.futures.process.BrokenProcessPool as e:
+		print(f'Sakura Poselib: Process pool failed ({e}), parsing remaining files serially')
+		parse_serial([path for path in filepaths if path not in results])
+
+	return results
+
+
+def import_files( spl_data: spl.PoselibData, filepaths, scale=0.08, progress=None ) -> tuple:
+	'''
+		Import JSON/CSV/VPD files into new PoseBooks.
+		Each JSON/CSV file becomes a book, VPD files become poses of a book per directory.
+		Returns:
+			(list of new books, {filepath: error message} of files not imported, {filepath: message} of files imported with skipped entries)
+	'''
+	filepaths = sorted(set(filepaths))
+	results = parse_files(filepaths, progress=progress)
+
+	books = []
+	failed = {}
+	partial = {}
+	vpd_books = {} # {directory: PoseBook}
+
+	for path in filepaths:
+		result = results.get(path)
+		if isinstance(result, Exception) or result is None:
+			failed[path] = f'{type(result).__name__}: {result}' if result else 'Not parsed'
+			continue
+
+		kind, data, errors = result
+		if errors:
+			partial[path] = f'{len(errors)} malformed entries skipped. First: {errors[0]}'
+
+		if kind == 'VPD':
+			directory = os.path.dirname(path)
+			book = vpd_books.get(directory)
+			if book is None:
+				book = vpd_books[directory] = spl_data.add_book(os.path.basename(directory) or 'VPD')
+				books.append(book)
+			pose = book.add_pose(os.path.basename(path)) # same name as import_pose_from_vpd()
+			set_pose_from_vpd(pose, data, scale)
+			continue
+
+		book = spl_data.add_book(os.path.splitext(os.path.basename(path))[0])
+		books.append(book)
+		if kind == 'JSON':
+			add_poses_from_json_data(book, data)
+		else:
+			add_poses_from_csv_morphs(book, data, scale)
+
+	return books, failed, partial
+
+
+# Export all books
+#
+# snapshot_book_export() reads the book on the main thread and returns a writer which doesn't touch bpy,
+# so the encoding and file writing can run in a thread pool while the UI stays responsive.
+
+EXPORT_FORMATS = ('JSON', 'CSV', 'VPD')
+
+def snapshot_book_export( book: spl.PoseBook, file_format, directory, scale=12.5, use_armature_space=False, use_mmd_bone_names=True, use_alt_names=False, used=None ):
+	'''
+		Parameters:
+			file_format: 'JSON', 'CSV' or 'VPD' (a folder per book, a file per pose)
+			used: set of lower case paths of the other books in the same export, updated.
+				Different book names can make the same file name, those get a numbered one instead
+		Returns:
+			(file or folder path, writer) writer is a callable without arguments, safe to call from other threads
+	'''
+	arm = book.get_armature()
+	base_name = spl_formats.safe_file_name(arm.name + "_posebook_" + book.name)
+
+	extension = {'JSON': '.json', 'CSV': '.csv'}.get(file_format, '')
+	if used is not None:
+		name, counter = base_name, 1
+		while os.path.join(directory, name + extension).lower() in used:
+			name = f'{base_name}.{counter:03}'
+			counter += 1
+		base_name = name
+		used.add(os.path.join(directory, base_name + extension).lower())
+
+	if file_format == 'JSON':
+		filepath = os.path.join(directory, base_name + '.json')
+		poses = list(_iter_json_pose_data(book, use_armature_space))
+		def write():
+			with spl_formats.open_text(filepath, 'w') as f:
+				spl_formats.write_json_poses(f, poses)
+		return filepath, write
+
+	if file_format == 'CSV':
+		filepath = os.path.join(directory, base_name + '.csv')
+		morphs = book_to_csv_morphs(book, scale, use_mmd_bone_names, use_alt_names)
+		def write():
+			with open(filepath, 'w', newline='', encoding='utf-8') as f:
+				spl_formats.write_csv_morphs(f, morphs)
+		return filepath, write
+
+	if file_format == 'VPD':
+		folder = os.path.join(directory, base_name)
+		vpds = book_to_vpds(book, folder, scale)
+		def write():
+			os.makedirs(folder, exist_ok=True)
+			write_vpds(vpds)
+		return folder, write
+
+	raise ValueError(f'Unsupported format: {file_format}')
+
+
+# VMD motion export
+from . import vmd
+
+VMD_SOURCES = ('INFLUENCE', 'EVALUATED')
+
+def export_vmd( spl_data: spl.PoselibData, filepath, frame_start, frame_end, scale=12.5, source='INFLUENCE', use_morphs=False, use_alt_names=False, progress=None ) -> tuple:
+	'''
+		Export pose animation as a VMD motion.
+		Parameters:
+			source:
+				'INFLUENCE': sample keyed pose influences and combine poses (same as update_combined_pose). Fast, no frame change
+				'EVALUATED': set each frame and read the evaluated bone transforms (includes everything driving the bones)
+			use_morphs: write influences of poses which exist as mmd_tools bone morphs as morph keys instead of bone keys (INFLUENCE only)
+			use_alt_names: morph names are alt pose names (same as Send to mmd_tools)
+			progress: callable(frame)
+		Returns:
+			(number of bone keys, number of morph keys)
+	'''
+	arm = spl_data.get_armature()
+	poses = [pose for book in spl_data.books for pose in book.poses]
+
+	rest = utils.get_rest_matrices(arm)
+	bone_cache = {} # {bone name: (converter, MMD name) or None}
+	def get_bone(name):
+		if name not in bone_cache:
+			pbone = arm.pose.bones.get(name)
+			bone_cache[name] = None if pbone is None else (mmd.BoneConverter(pbone, scale, invert=True, rest=rest), mmd.get_mmd_bone_name_j_e(pbone)[0])
+		return bone_cache[name]
+
+	# poses written as morph keys
+	morph_poses = []
+	if use_morphs and source == 'INFLUENCE':
+		root = mmd.get_model_root(arm)
+		# without a model root (or mmd_tools), no pose has a bone morph to drive
+		morph_names = {morph.name for morph in root.mmd_root.bone_morphs} if root else set()
+		for pose in poses:
+			name = pose.name_alt if use_alt_names and pose.name_alt else pose.name
+			if name in morph_names:
+				morph_poses.append((name, pose))
+	morph_pose_set = {pose.as_pointer() for _, pose in morph_poses}
+
+	bone_poses = [pose for pose in poses if pose.as_pointer() not in morph_pose_set]
+	bone_names = list(dict.fromkeys(bone.name for pose in bone_poses for bone in pose.bones if get_bone(bone.name)))
+
+	reducer = vmd.KeyReducer()
+	scene = bpy.context.scene
+	frame_current = scene.frame_current
+
+	with open(filepath, 'wb') as f, vmd.VmdWriter(f, arm.name) as writer:
+		def write_bone(name, frame, loc, rot):
+			converter, mmd_name = bone_cache[name]
+			loc = converter.convert_location(loc)
+			rot = converter.convert_rotation(rot)
+			for key_frame, values in reducer.feed(name, frame, (*loc, rot.x, rot.y, rot.z, rot.w)):
+				writer.add_bone_key(mmd_name, key_frame - frame_start, values[:3], values[3:])
+
+		if source == 'INFLUENCE':
+			get_influences = [(_get_influence_sampler(arm, pose), pose) for pose in bone_poses]
+			get_morph_influences = [(_get_influence_sampler(arm, pose), name) for name, pose in morph_poses]
+
+			# pose transforms, converted once
+			pose_bones = {} # {pose pointer: [(bone name, loc, euler)]}
+			for pose in bone_poses:
+				pose_bones[pose.as_pointer()] = [(b.name, Vector(b.location), Quaternion(b.rotation).to_euler()) for b in pose.bones if get_bone(b.name)]
+
+			for frame in range(frame_start, frame_end + 1):
+				accum = {name: [Vector((0, 0, 0)), Euler((0, 0, 0))] for name in bone_names}
+				for sample, pose in get_influences:
+					influence = sample(frame)
+					if influence == 0.0:
+						continue
+					for name, loc, euler in pose_bones[pose.as_pointer()]:
+						acc_loc, acc_rot = accum[name]
+						acc_loc += loc * influence
+						acc_rot.x += euler.x * influence
+						acc_rot.y += euler.y * influence
+						acc_rot.z += euler.z * influence
+
+				for name, (loc, rot) in accum.items():
+					write_bone(name, frame, loc, rot.to_quaternion())
+
+				for sample, name in get_morph_influences:
+					for key_frame, values in reducer.feed(('morph', name), frame, (sample(frame),)):
+						writer.add_morph_key(name, key_frame - frame_start, values[0])
+
+				if progress:
+					progress(frame)
+
+		else: # EVALUATED
+			try:
+				for frame in range(frame_start, frame_end + 1):
+					scene.frame_set(frame)
+					for name in bone_names:
+						pbone = arm.pose.bones[name]
+						matrix = arm.convert_space(pose_bone=pbone, matrix=pbone.matrix, from_space='POSE', to_space='LOCAL')
+						loc, rot, _ = matrix.decompose()
+						write_bone(name, frame, loc, rot)
+
+					if progress:
+						progress(frame)
+			finally:
+				scene.frame_set(frame_current)
+
+		return writer.bone_count, writer.morph_count
+
+
+# Returns a function(frame) -> influence of the pose, from the keyed custom property (animation mode) or the current value
+def _get_influence_sampler( arm: bpy.types.Object, pose: spl.PoseData ):
+	con_name = pose.get('constraint_name')
+	if con_name and con_name in arm.keys():
+		action = arm.animation_data.action if arm.animation_data else None
+		if action:
+			data_path = '["%s"]' % bpy.utils.escape_identifier(con_name)
+			fcurve = action.fcurves.find(data_path)
+			if fcurve:
+				return fcurve.evaluate
+		value = arm[con_name]
+	else:
+		value = pose.value
+	return lambda frame: value
+
+
+# Pose extraction from motion
+#
+# Frames of a VMD motion or an Action are sampled into arrays (frame, bone, channel) with numpy,
+# clustered by cluster.select_representatives() and each representative frame becomes a pose.
+from . import cluster
+
+# Returns a (frame count, bone count) sample set as (frames, bone names, locations (n, b, 3), rotations (n, b, 4 WXYZ), scales (n, b, 3))
+def sample_vmd_motion( arm: bpy.types.Object, motion: vmd.VmdMotion, scale=0.08 ) -> tuple:
+	resolver = mmd.get_bone_name_resolver(arm)
+	rest = utils.get_rest_matrices(arm)
+	mmd_matrices = rest.as_array(mmd=True)
 
+	keys = {} # {MMD bone name: [(frame, x, y, z, qx, qy, qz, qw)]}
+	for name, frame, loc, rot in motion.bone_keys:
+		keys.setdefault(name, []).append((frame, *loc, *rot))
 
+	last_frame = max((frame for _, frame, _, _ in motion.bone_keys), default=0)
+	frames = np.arange(last_frame + 1, dtype=np.float64)
+
+	bone_names, locations, rotations = [], [], []
+	bones_not_found = []
+	for mmd_name, rows in keys.items():
+		pbone = resolver.resolve(mmd_name)
+		if pbone is None:
+			bones_not_found.append(mmd_name)
+			continue
+		if pbone.name in bone_names:
+			continue
+
+		data = np.array(rows, dtype=np.float64)
+		data = data[np.argsort(data[:, 0], kind='stable')]
+
+		# same as BoneConverter.convert_location() / convert_rotation(), for all keys at once
+		mat = mmd_matrices[rest.index[pbone.name]]
+		loc = data[:, 1:4] @ mat.T * scale
+		rot = data[:, [7, 4, 5, 6]] # XYZW -> WXYZ
+		rot[:, 1:] = -(rot[:, 1:] @ mat.T)
+		rot /= np.linalg.norm(rot, axis=1, keepdims=True)
+
+		# keep neighboring keys on the same hemisphere before interpolating
+		signs = np.cumprod(np.where((rot[1:] * rot[:-1]).sum(axis=1) < 0.0, -1.0, 1.0))
+		rot[1:] *= signs[:, None]
+
+		# VMD bezier curves are not evaluated, keys are interpolated linearly
+		key_frames = data[:, 0]
+		bone_names.append(pbone.name)
+		locations.append(np.stack([np.interp(frames, key_frames, loc[:, i]) for i in range(3)], axis=1))
+		rotations.append(np.stack([np.interp(frames, key_frames, rot[:, i]) for i in range(4)], axis=1))
+
+	if bones_not_found:
+		print(f'Warning: {len(bones_not_found)} bones not found in "{arm.name}", skipped: ' + ", ".join(bones_not_found))
+
+	n, b = len(frames), len(bone_names)
+	locations = np.stack(locations, axis=1) if b else np.zeros((n, 0, 3))
+	rotations = np.stack(rotations, axis=1) if b else np.zeros((n, 0, 4))
+	rotations /= np.maximum(np.linalg.norm(rotations, axis=2, keepdims=True), 1e-12)
+	return frames.astype(int), bone_names, locations, rotations, np.ones((n, b, 3))
+
+
+_ACTION_BONE_PATH = re.compile(r'pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(location|rotation_quaternion|rotation_euler|scale)$')
+
+def sample_action( arm: bpy.types.Object, action: bpy.types.Action, frame_start, frame_end ) -> tuple:
+	'''
+		Sample bone F-Curves of the action on every frame. Same return value as sample_vmd_motion()
+	'''
+	curves = {} # {bone name: {(channel, index): fcurve}}
+	for fcurve in action.fcurves:
+		match = _ACTION_BONE_PATH.match(fcurve.data_path)
+		if match:
+			name = match.group(1).replace('\\"', '"').replace('\\\\', '\\')
+			curves.setdefault(name, {})[(match.group(2), fcurve.array_index)] = fcurve
+
+	frames = np.arange(frame_start, frame_end + 1)
+	n = len(frames)
+
+	def sample(bone_curves, channel, defaults):
+		columns = []
+		for i, default in enumerate(defaults):
+			fcurve = bone_curves.get((channel, i))
+			columns.append(np.array([fcurve.evaluate(frame) for frame in frames]) if fcurve else np.full(n, default))
+		return np.stack(columns, axis=1)
+
+	bone_names, locations, rotations, scales = [], [], [], []
+	for name, bone_curves in curves.items():
+		pbone = arm.pose.bones.get(name)
+		if pbone is None:
+			continue
+
+		mode = pbone.rotation_mode
+		if mode == 'QUATERNION':
+			rot = sample(bone_curves, 'rotation_quaternion', (1.0, 0.0, 0.0, 0.0))
+			rot /= np.maximum(np.linalg.norm(rot, axis=1, keepdims=True), 1e-12)
+		elif mode == 'AXIS_ANGLE':
+			print(f'Warning: Axis angle rotation of "{name}" is not supported, rotation is ignored')
+			rot = np.tile((1.0, 0.0, 0.0, 0.0), (n, 1))
+		else:
+			rot = utils.euler_to_quaternion_batch(sample(bone_curves, 'rotation_euler', (0.0, 0.0, 0.0)), mode)
+
+		bone_names.append(name)
+		locations.append(sample(bone_curves, 'location', (0.0, 0.0, 0.0)))
+		rotations.append(rot)
+		scales.append(sample(bone_curves, 'scale', (1.0, 1.0, 1.0)))
+
+	b = len(bone_names)
+	stack = lambda arrays, size, fill: np.stack(arrays, axis=1) if b else np.full((n, 0, size), fill)
+	return frames, bone_names, stack(locations, 3, 0.0), stack(rotations, 4, 0.0), stack(scales, 3, 1.0)
+
+
+def add_poses_from_samples( book: spl.PoseBook, samples, tolerance=0.05, max_poses=0, location_weight=1.0, name_prefix="Frame" ) -> tuple:
+	'''
+		Cluster sampled frames and add a pose per representative frame.
+		Parameters:
+			samples: return value of sample_vmd_motion() / sample_action()
+			tolerance: maximum RMS difference per bone between a frame and its pose (quaternion components, locations * location_weight)
+			max_poses: maximum number of poses (0 = unlimited, only the tolerance decides)
+		Returns:
+			(number of poses added, max RMS difference per bone)
+	'''
+	frames, bone_names, locations, rotations, scales = samples
+	n, b = locations.shape[:2]
+	if n == 0 or b == 0:
+		return 0, 0.0
+
+	features = np.concatenate([locations * location_weight, cluster.quaternion_features(rotations), scales], axis=2)
+	norm = math.sqrt(b)
+	indices, labels, max_error = cluster.select_representatives(features.reshape(n, -1) / norm, tolerance, max_poses)
+
+	# only bones out of the rest pose are stored
+	eps = 1e-5
+	moved = (np.abs(locations) > eps).any(axis=2)
+	moved |= (np.abs(cluster.quaternion_features(rotations) - (1.0, 0.0, 0.0, 0.0)) > eps).any(axis=2)
+	moved |= (np.abs(scales - 1.0) > eps).any(axis=2)
+
+	for index in indices:
+		pose = book.add_pose(f"{name_prefix} {frames[index]}")
+		mask = moved[index]
+		pose.set_bones([name for name, m in zip(bone_names, mask) if m], locations[index][mask].ravel(), rotations[index][mask].ravel(), scales[index][mask].ravel())
+
+	return len(indices), max_error
+
+
+def extract_poses_from_vmd( spl_data: spl.PoselibData, filepath, scale=0.08, tolerance=0.05, max_poses=0, location_weight=1.0 ) -> tuple:
+	'''
+		Returns:
+			(new PoseBook, max RMS difference per bone)
+	'''
+	motion = vmd.read_vmd(filepath)
+	samples = sample_vmd_motion(spl_data.get_armature(), motion, scale)
+	book = spl_data.add_book(os.path.splitext(os.path.basename(filepath))[0])
+	_, max_error = add_poses_from_samples(book, samples, tolerance, max_poses, location_weight)
+	return book, max_error
+
+
+def extract_poses_from_action( spl_data: spl.PoselibData, action: bpy.types.Action, frame_start, frame_end, tolerance=0.05, max_poses=0, location_weight=1.0 ) -> tuple:
+	'''
+		Returns:
+			(new PoseBook, max RMS difference per bone)
+	'''
+	samples = sample_action(spl_data.get_armature(), action, frame_start, frame_end)
+	book = spl_data.add_book(action.name)
+	_, max_error = add_poses_from_samples(book, samples, tolerance, max_poses, location_weight)
+	return book, max_error
+
+
+# PMX bone morphs (without mmd_tools)
+from . import pmx
+
+_PMX_PANEL_CATEGORIES = {1: 'EYEBROW', 2: 'EYE', 3: 'MOUTH'} # {PMX morph panel: pose category}
+
+# Load bone morphs of a PMX file into the book. Returns {bone name: number of offsets skipped} for bones not found in the armature
+def load_book_from_pmx( book: spl.PoseBook, filepath, scale=0.08 ) -> dict:
+	model = pmx.read_pmx(filepath)
+	arm = book.get_armature()
+	scale = scale / arm.scale[0] # consider armature scale
+	resolver = mmd.get_bone_name_resolver(arm)
+	rest = utils.get_rest_matrices(arm)
+
+	bone_cache = {} # {PMX bone index: (Blender bone name, converter) or None}
+	bones_not_found = {}
+
+	for morph in model.get_bone_morphs():
+		pose = book.poses.get(morph.name)
+		if not pose:
+			pose = book.add_pose(morph.name)
+		else:
+			print(f'Pose "{morph.name}" is already exists. Overwrite it.')
+		pose.name_alt = morph.name_en
+		pose.category = _PMX_PANEL_CATEGORIES.get(morph.panel, 'OTHER') # system (0) and other panels: OTHER
+
+		names, locations, rotations = [], [], []
+		for index, loc, rot in morph.offsets:
+			if index not in bone_cache:
+				pbone = resolver.resolve(model.bones[index].name) if 0 <= index < len(model.bones) else None
+				bone_cache[index] = None if pbone is None else (pbone.name, mmd.BoneConverter(pbone, scale, rest=rest))
+			cached = bone_cache[index]
+			if cached is None:
+				name = model.bones[index].name if 0 <= index < len(model.bones) else str(index)
+				bones_not_found[name] = bones_not_found.get(name, 0) + 1
+				continue
+
+			name, converter = cached
+			names.append(name)
+			locations.extend(converter.convert_location(Vector(loc)))
+			rotations.extend(converter.convert_rotation(Quaternion((rot[3], rot[0], rot[1], rot[2]))))
+
+		pose.set_bones(names, locations, rotations)
+
+	if bones_not_found:
+		print(f'Warning: {len(bones_not_found)} bones not found in "{arm.name}", skipped offsets: ' + ", ".join(f"{name} ({count})" for name, count in bones_not_found.items()))
+
+	book.name = model.name or os.path.basename(filepath)
+	return bones_not_found
+
+
+# Write poses as bone morphs into an existing PMX file. Morphs with the same name are replaced, others are added
+def save_book_to_pmx( book: spl.PoseBook, filepath, scale=12.5, use_alt_names=False, output_path=None ) -> tuple:
+	'''
+		Parameters:
+			output_path: write to another file (default: overwrite filepath)
+		Returns:
+			(number of morphs replaced, number of morphs added, list of bone names not found in the PMX file)
+	'''
+	model = pmx.read_pmx(filepath)
+	arm = book.get_armature()
+	scale = scale * arm.matrix_world.to_scale()[0] # consider armature scale, only uniform scale is supported, using scale.x here
+	bone_indices = {bone.name: index for index, bone in reversed(list(enumerate(model.bones)))} # first one wins
+	rest = utils.get_rest_matrices(arm)
+
+	bone_cache = {} # {bone name: (converter, PMX bone index) or None}
+	def get_bone(name):
+		pbone = arm.pose.bones.get(name)
+		if pbone is None:
+			return None
+		index = bone_indices.get(mmd.get_mmd_bone_name_j_e(pbone)[0], bone_indices.get(name))
+		return None if index is None else (mmd.BoneConverter(pbone, scale, invert=True, rest=rest), index)
+
+	replaced, added = 0, 0
+	bones_not_found = {}
+	for pose in book.poses:
+		name = pose.name_alt if use_alt_names and pose.name_alt else pose.name
+		name_en = pose.name if use_alt_names and pose.name_alt else pose.name_alt
+		panel = _POSE_CATEGORIES.index(pose.category) if pose.category in _POSE_CATEGORIES[1:] else 4
+
+		offsets = []
+		for bone in pose.bones:
+			if bone.name not in bone_cache:
+				bone_cache[bone.name] = get_bone(bone.name)
+			cached = bone_cache[bone.name]
+			if cached is None:
+				bones_not_found[bone.name] = True
+				continue
 
+			converter, index = cached
+			loc = converter.convert_location(bone.location)
+			rot = converter.convert_rotation(bone.rotation)
+			offsets.append((index, loc[:], (rot.x, rot.y, rot.z, rot.w)))
 
+		if model.set_bone_morph(name, name_en, panel, offsets):
+			added += 1
+		else:
+			replaced += 1
 
+	if bones_not_found:
+		print(f'Warning: {len(bones_not_found)} bones not found in "{filepath}", skipped: ' + ", ".join(bones_not_found))
 
+	pmx.write_pmx(model, output_path or filepath)
+	return replaced, added, list(bones_not_found)
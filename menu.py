@@ -12,6 +12,7 @@ class SPL_MT_PoseMenu(Menu):
 	def draw(self, context):
 		layout = self.layout
 		layout.operator("spl.add_pose", text="Add Pose")
+		layout.operator("spl.search_poses", text="Search Poses", icon='VIEWZOOM')
 
 		spl = get_poselib_from_context(context)
 		book = spl.get_active_book()
@@ -1,25 +1,59 @@
 # mmd_tools related functions
 
+import re
 import bpy
-from typing import Tuple
+from typing import Tuple, Optional
 
 # Check if mmd_tools is installed
+_MMD_TOOLS_MODULES = ('mmd_tools', 'bl_ext.blender_org.mmd_tools') # addon and extension (Blender 4.2 or later)
+_mmd_tools_installed = (None, False) # (enabled addon count, result)
+
 def is_mmd_tools_installed():
+    # Enabling/disabling any addon changes the count, which invalidates the cached result
+    global _mmd_tools_installed
     addons = bpy.context.preferences.addons
-    return 'mmd_tools' in addons or 'bl_ext.blender_org.mmd_tools' in addons # check addon and extension (Blender 4.2 or later)
+    count = len(addons)
+    if _mmd_tools_installed[0] != count:
+        _mmd_tools_installed = (count, any(name in addons for name in _MMD_TOOLS_MODULES))
+    return _mmd_tools_installed[1]
 
 
 # get mmd root object
+_model_roots = {} # {object pointer: (parent pointer, root object name or None)}
+
 def get_model_root(obj: bpy.types.Object) -> bpy.types.Object:
     if not is_mmd_tools_installed():
         return None
 
+    if not obj:
+        return None
+
+    # Memoized per object, invalidated when the parent changes
+    key = obj.as_pointer()
+    parent_key = obj.parent.as_pointer() if obj.parent else 0
+    cached = _model_roots.get(key)
+    if cached and cached[0] == parent_key:
+        if cached[1] is None:
+            return None
+        root = bpy.data.objects.get(cached[1])
+        if root and root.mmd_type == 'ROOT': # still valid (not renamed or removed)
+            return root
+
+    root = _find_model_root(obj)
+    _model_roots[key] = (parent_key, root.name if root else None)
+    return root
+
+def _find_model_root(obj: bpy.types.Object) -> bpy.types.Object:
     if not obj:
         return None
     if obj.mmd_type == 'ROOT':
         return obj
 
-    return get_model_root(obj.parent)
+    return _find_model_root(obj.parent)
+
+# Drop memoized model roots (on parent change, file load, undo, etc.)
+def clear_model_roots():
+    _model_roots.clear()
 
 
 # Get mmd_bone.name and name_e if present, otherwise return bone.name
@@ -38,32 +72,124 @@ def get_mmd_bone_name_j_e(bone: bpy.types.Bone) -> Tuple[str, str]:
 def get_pose_bone_by_mmd_name(armature: bpy.types.Object, name: str) -> bpy.types.PoseBone:
     if not armature or armature.type != 'ARMATURE':
         raise ValueError("armature is None or not an armature")
-    
-    if not is_mmd_tools_installed():
-        return armature.pose.bones.get(name)
 
-    pbone = armature.pose.bones.get(name)
-    if pbone:
-        return pbone
+    return get_bone_name_resolver(armature).resolve(name)
+
+
+# Bone name resolver: one index of Blender names, MMD names (name_j/name_e) and aliases per armature
+_LR_PREFIXES = (('左', 'L'), ('右', 'R'))
+_LR_SUFFIX = re.compile(r'^(.+?)[._ ]([LRlr])$')
+_NUMBER_SUFFIX = re.compile(r'\.\d{3}$')
+
+def normalize_bone_name(name: str) -> str:
+    """Normalize naming conventions: strip .001 suffix, and unify L/R notation (左腕, 腕.L, 腕_L -> 腕|L)"""
+    name = _NUMBER_SUFFIX.sub('', name)
+    for prefix, side in _LR_PREFIXES:
+        if name.startswith(prefix) and len(name) > 1:
+            return name[1:] + '|' + side
+    m = _LR_SUFFIX.match(name)
+    if m:
+        return m.group(1) + '|' + m.group(2).upper()
+    return name
+
+
+class BoneNameResolver:
+    def __init__(self, armature: bpy.types.Object):
+        self.fingerprint = _resolver_fingerprint(armature)
+        self.__armature = armature
+        self.__names = {} # {name: bone name} Blender names, then MMD names
+        self.__normalized = {} # {normalized name: bone name}
+
+        bone_names = armature.pose.bones.keys()
+        for bone_name in bone_names:
+            self.__names[bone_name] = bone_name
+
+        # Same priority as the linear scan used to have: first bone which has matching name_j or name_e
+        if is_mmd_tools_installed():
+            for pbone in armature.pose.bones:
+                mmd_bone = pbone.mmd_bone
+                if mmd_bone.name_j:
+                    self.__names.setdefault(mmd_bone.name_j, pbone.name)
+                if mmd_bone.name_e:
+                    self.__names.setdefault(mmd_bone.name_e, pbone.name)
+
+        for name, bone_name in self.__names.items():
+            self.__normalized.setdefault(normalize_bone_name(name), bone_name)
+
+    def __repr__(self):
+        return "<BoneNameResolver %s, names %d>" % (self.__armature.name, len(self.__names))
+
+    def resolve_name(self, name: str, aliases: dict = None, fuzzy: bool = False) -> Optional[str]:
+        """
+        Resolve a Blender/MMD bone name to the Blender bone name.
+
+        Args:
+            name: Bone name to resolve.
+            aliases: Optional user alias table {alias: bone name (Blender or MMD)}.
+            fuzzy: Also match by normalized name (.001 suffix, L/R notation).
+
+        Returns:
+            Blender bone name or None if not found.
+        """
+        bone_name = self.__names.get(name)
+        if bone_name is not None:
+            return bone_name
+
+        if aliases:
+            alias = aliases.get(name)
+            if alias is not None:
+                bone_name = self.__names.get(alias)
+                if bone_name is not None:
+                    return bone_name
+
+        if fuzzy:
+            return self.__normalized.get(normalize_bone_name(name))
+
+        return None
+
+    def resolve(self, name: str, aliases: dict = None, fuzzy: bool = False) -> Optional[bpy.types.PoseBone]:
+        """Same as resolve_name(), but returns the PoseBone"""
+        bone_name = self.resolve_name(name, aliases, fuzzy)
+        if bone_name is None:
+            return None
+        return self.__armature.pose.bones.get(bone_name)
+
+
+_bone_name_resolvers = {} # {armature pointer: BoneNameResolver}
 
-    for pbone in armature.pose.bones:
-        if pbone.mmd_bone.name_j == name or pbone.mmd_bone.name_e == name:
-            return pbone
+def _resolver_fingerprint(armature: bpy.types.Object):
+    # bones were added/removed/renamed, MMD names (name_j/name_e) were edited, or armature data was swapped.
+    # MMD names have no rename notification, so they are compared on every lookup
+    pose_bones = armature.pose.bones
+    mmd_names = tuple((pbone.mmd_bone.name_j, pbone.mmd_bone.name_e) for pbone in pose_bones) if is_mmd_tools_installed() else ()
+    return (armature.name, armature.data.as_pointer(), tuple(pose_bones.keys()), mmd_names)
 
-    return None
+# Get (or build) the resolver for the armature
+def get_bone_name_resolver(armature: bpy.types.Object) -> BoneNameResolver:
+    key = armature.as_pointer()
+    resolver = _bone_name_resolvers.get(key)
+    if resolver is None or resolver.fingerprint != _resolver_fingerprint(armature):
+        resolver = BoneNameResolver(armature)
+        _bone_name_resolvers[key] = resolver
+    return resolver
+
+# Drop all resolvers (on bone rename, file load, undo, etc.)
+def clear_bone_name_resolvers():
+    _bone_name_resolvers.clear()
 
 
 # Bone Transform converter classes from mmd_tools/vmd/importer.py
 from mathutils import Vector, Quaternion
 
+from . import utils
+
 class BoneConverter:
-    def __init__(self, pose_bone, scale, invert=False):
-        mat = pose_bone.bone.matrix_local.to_3x3()
-        mat[1], mat[2] = mat[2].copy(), mat[1].copy()
-        self.__mat = mat.transposed()
+    # rest: utils.RestMatrices of the armature, pass it when converting many bones
+    def __init__(self, pose_bone, scale, invert=False, rest=None):
+        if rest is None:
+            rest = utils.get_rest_matrices(pose_bone.id_data)
+        self.__mat = rest.get(pose_bone.name, mmd=True, invert=invert)
         self.__scale = scale
-        if invert:
-            self.__mat.invert()
 
     def convert_location(self, location:Vector):
         return (self.__mat @ location) * self.__scale
@@ -77,116 +203,5 @@ class BoneConverter:
 # vpd = VpdFile()
 # 
 
-class InvalidFileError(Exception):
-    pass
-
-
-class VpdBone:
-    def __init__(self, bone_name, location, rotation):
-        self.bone_name = bone_name
-        self.location = location
-        self.rotation = rotation if any(rotation) else [0, 0, 0, 1]
-
-    def __repr__(self):
-        return "<VpdBone %s, loc %s, rot %s>" % (
-            self.bone_name,
-            str(self.location),
-            str(self.rotation),
-        )
-
-class VpdMorph:
-    def __init__(self, morph_name, weight):
-        self.morph_name = morph_name
-        self.weight = weight
-
-    def __repr__(self):
-        return "<VpdMorph %s, weight %f>" % (
-            self.morph_name,
-            self.weight,
-        )
-
-
-class VpdFile:
-    def __init__(self):
-        self.filepath = ""
-        self.osm_name = None
-        self.bones = []
-        self.morphs = []
-
-    def __repr__(self):
-        return "<File %s, osm %s, bones %d, morphs %d>" % (
-            self.filepath,
-            self.osm_name,
-            len(self.bones),
-            len(self.morphs),
-        )
-
-    def load(self, **args):
-        path = args["filepath"]
-
-        encoding = "shift_jis"
-        with open(path, "rt", encoding=encoding, errors="replace") as fin:
-            self.filepath = path
-            if not fin.readline().startswith("Vocaloid Pose Data file"):
-                raise InvalidFileError
-
-            fin.readline()
-            self.osm_name = fin.readline().split(";")[0].strip()
-            bone_counts = int(fin.readline().split(";")[0].strip())
-            fin.readline()
-
-            for line in fin:
-                if line.startswith("Bone"):
-                    bone_name = line.split("{")[-1].strip()
-
-                    location = [float(x) for x in fin.readline().split(";")[0].strip().split(",")]
-                    if len(location) != 3:
-                        raise InvalidFileError
-
-                    rotation = [float(x) for x in fin.readline().split(";")[0].strip().split(",")]
-                    if len(rotation) != 4:
-                        raise InvalidFileError
-
-                    if not fin.readline().startswith("}"):
-                        raise InvalidFileError
-
-                    self.bones.append(VpdBone(bone_name, location, rotation))
-
-                elif line.startswith("Morph"):
-                    morph_name = line.split("{")[-1].strip()
-                    weight = float(fin.readline().split(";")[0].strip())
-
-                    if not fin.readline().startswith("}"):
-                        raise InvalidFileError
-
-                    self.morphs.append(VpdMorph(morph_name, weight))
-
-            if len(self.bones) != bone_counts:
-                raise InvalidFileError
-
-    def save(self, **args):
-        path = args.get("filepath", self.filepath)
-
-        encoding = "shift_jis"
-        with open(path, "wt", encoding=encoding, errors="replace", newline="") as fout:
-            self.filepath = path
-            fout.write("Vocaloid Pose Data file\r\n")
-
-            fout.write("\r\n")
-            fout.write("%s;\t\t// 親ファイル名\r\n" % self.osm_name)
-            fout.write("%d;\t\t\t\t// 総ポーズボーン数\r\n" % len(self.bones))
-            fout.write("\r\n")
-
-            for i, b in enumerate(self.bones):
-                fout.write("Bone%d{%s\r\n" % (i, b.bone_name))
-                fout.write("  %f,%f,%f;\t\t\t\t// trans x,y,z\r\n" % tuple(b.location))
-                fout.write("  %f,%f,%f,%f;\t\t// Quaternion x,y,z,w\r\n" % tuple(b.rotation))
-                fout.write("}\r\n")
-                fout.write("\r\n")
-
-            for i, m in enumerate(self.morphs):
-                fout.write("Morph%d{%s\r\n" % (i, m.morph_name))
-                fout.write("  %f;\t\t\t\t// weight\r\n" % m.weight)
-                fout.write("}\r\n")
-                fout.write("\r\n")
-
+# VPD file classes live in spl_formats (no bpy dependency, used by import workers)
+from .spl_formats import InvalidFileError, VpdBone, VpdMorph, VpdFile
@@ -1,11 +1,12 @@
 # Description: Operator definitions for Sakura Poselib
 
 import bpy
+import os
 from bpy.props import *
 
-from . import mmd, internal, utils
+from . import mmd, internal, utils, search, spl_formats, splb
 
-from .spl import get_poselib_from_context, update_combined_pose, POSE_CATEGORIES
+from .spl import get_poselib, get_poselib_from_context, update_combined_pose, POSE_CATEGORIES
 from .poll_requirements import *
 
 
@@ -72,6 +73,12 @@ class SPL_OT_SendToMMDTools( bpy.types.Operator ):
         default=False,
     )
 
+    only_changed: BoolProperty(
+        name="Only Changed",
+        description="Rewrite only Bone Morphs whose data differs from the poses",
+        default=True,
+    )
+
     # show options first
     def invoke(self, context, event):
         return context.window_manager.invoke_props_dialog(self)
@@ -87,7 +94,8 @@ class SPL_OT_SendToMMDTools( bpy.types.Operator ):
         book = spl.get_active_book()
 
         # Convert the pose to mmd_tools Bone Morph
-        internal.convert_poses_to_mmdtools(book, self.use_alt_pose_names, self.clear_exsisiting)
+        written, skipped = internal.convert_poses_to_mmdtools(book, self.use_alt_pose_names, self.clear_exsisiting, self.only_changed)
+        self.report({'INFO'}, f"{written} Bone Morphs sent, {skipped} unchanged")
 
         return {'FINISHED'}
 
@@ -138,6 +146,41 @@ class SPL_OT_SaveToJson( bpy.types.Operator, ExportHelper ):
         default = True,
     )
 
+    precision: IntProperty(
+        name="Precision",
+        description="Number of decimal places of transforms. -1 for full precision",
+        default=-1, min=-1, max=15,
+    )
+
+    compact: BoolProperty(
+        name="Compact",
+        description="Write without indentation (one pose per line) to reduce file size",
+        default=False,
+    )
+
+    omit_identity: BoolProperty(
+        name="Omit Identity Transforms",
+        description="Omit zero location, identity rotation and unit scale to reduce file size",
+        default=False,
+    )
+
+    per_pose_files: BoolProperty(
+        name="Per-Pose Files",
+        description="Save as a directory with a manifest and one file per pose. Only changed poses are rewritten on later saves (compact and compression are not used)",
+        default=False,
+    )
+
+    compression: EnumProperty(
+        name="Compression",
+        description="Compress the file (loading detects compressed files automatically)",
+        items=[
+            ('NONE', "None", "No compression"),
+            ('GZIP', "gzip", "Compress with gzip (.gz)"),
+            ('XZ', "xz", "Compress with xz (.xz, smaller but slower)"),
+        ],
+        default='NONE',
+    )
+
     @classmethod
     @requires_poses
     def poll(cls, context):
@@ -156,8 +199,18 @@ class SPL_OT_SaveToJson( bpy.types.Operator, ExportHelper ):
     def execute(self, context):
         spl = get_poselib_from_context(context)
         book = spl.get_active_book()
+        if self.per_pose_files:
+            # Save poses to directory (named after the file, without extension)
+            dirpath = os.path.splitext(self.filepath)[0]
+            count, written, removed = internal.save_book_to_json_dir(book, dirpath, self.use_armature_space,
+                precision=self.precision if self.precision >= 0 else None, omit_identity=self.omit_identity)
+            self.report({'INFO'}, f"Saved {count} poses to {dirpath} ({written} written, {removed} removed)")
+            return {'FINISHED'}
+
+        filepath = self.filepath + spl_formats.COMPRESSION_EXTENSIONS[self.compression]
         # Save poses to file
-        internal.save_book_to_json(book, self.filepath, self.use_armature_space)
+        internal.save_book_to_json(book, filepath, self.use_armature_space,
+            precision=self.precision if self.precision >= 0 else None, compact=self.compact, omit_identity=self.omit_identity, compression=self.compression)
 
         return {'FINISHED'}
 
@@ -166,12 +219,31 @@ class SPL_OT_SaveToJson( bpy.types.Operator, ExportHelper ):
 class SPL_OT_LoadFromJson( bpy.types.Operator, ImportHelper ):
     bl_idname = "spl.load_from_json"
     bl_label = "Load from Json"
-    bl_description = "Load a PoseBook from a Json file"
+    bl_description = "Load a PoseBook from a Json file (or manifest.json of a per-pose directory)"
     bl_options = {'REGISTER', 'UNDO'}
 
-    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+    filter_glob: StringProperty(default="*.json;*.json.gz;*.json.xz", options={'HIDDEN'})
     filename_ext = '.json'
 
+    pose_names: StringProperty(
+        name="Pose Names",
+        description="Load only poses with these names (comma separated). Leave empty to load all poses",
+        default="",
+    )
+
+    category: EnumProperty(
+        name="Category",
+        description="Load only poses in this category",
+        items=POSE_CATEGORIES,
+        default="ALL",
+    )
+
+    selected_bones_only: BoolProperty(
+        name="Selected Bones Only",
+        description="Load only transforms of the selected bones",
+        default=False,
+    )
+
     @classmethod
     @requires_active_armature
     def poll(cls, context):
@@ -180,10 +252,20 @@ class SPL_OT_LoadFromJson( bpy.types.Operator, ImportHelper ):
     # Execute the operator
     def execute(self, context):
         spl = get_poselib_from_context(context)
+
+        pose_names = [name.strip() for name in self.pose_names.split(",") if name.strip()] or None
+        categories = None if self.category == 'ALL' else [self.category]
+        bone_names = None
+        if self.selected_bones_only:
+            bone_names = [pbone.name for pbone in spl.get_armature().pose.bones if pbone.bone.select]
+
         book = spl.add_book()
 
         # Load poses from file
-        bones_not_found = internal.load_book_from_json(book, self.filepath)
+        errors = []
+        bones_not_found = internal.load_book_from_json(book, self.filepath, pose_names, categories, bone_names, errors)
+        if len(errors) > 0:
+            self.report({'WARNING'}, f"{len(errors)} malformed entries were skipped (see console for details). First: {errors[0]}")
         if len(bones_not_found) > 0:
             msg = "Following bones were not found in the armature. They were not loaded."
             # print 10 bones on each line
@@ -198,6 +280,83 @@ class SPL_OT_LoadFromJson( bpy.types.Operator, ImportHelper ):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+# Operator: Save PoseBook to binary file
+class SPL_OT_SaveToSplb( bpy.types.Operator, ExportHelper ):
+    bl_idname = "spl.save_to_splb"
+    bl_label = "Save to SPLB"
+    bl_description = "Save active PoseBook to a binary file (fast to load, for large libraries)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.splb", options={'HIDDEN'})
+    filename_ext = '.splb'
+
+    use_armature_space: BoolProperty(
+        name="Use Armature Space",
+        description="Save transforms in armature space instead of bone local space. Making it compatible with armature with different bone rolls",
+        default = False,
+    )
+
+    @classmethod
+    @requires_poses
+    def poll(cls, context):
+        return True
+
+    # set self.filepath using book.name
+    def invoke(self, context, event):
+        spl = get_poselib_from_context(context)
+        book = spl.get_active_book()
+        arm = spl.get_armature()
+        self.filepath = arm.name + "_posebook_" + book.name
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    # Execute the operator
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        book = spl.get_active_book()
+        internal.save_book_to_splb(book, self.filepath, self.use_armature_space)
+        return {'FINISHED'}
+
+
+# Operator: Load PoseBook from binary file
+class SPL_OT_LoadFromSplb( bpy.types.Operator, ImportHelper ):
+    bl_idname = "spl.load_from_splb"
+    bl_label = "Load from SPLB"
+    bl_description = "Load a PoseBook from a binary file"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.splb", options={'HIDDEN'})
+    filename_ext = '.splb'
+
+    @classmethod
+    @requires_active_armature
+    def poll(cls, context):
+        return True
+
+    # Execute the operator
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+
+        # parse first, so a broken file doesn't leave an empty book behind
+        try:
+            data = splb.SplbFile(self.filepath)
+        except (OSError, ValueError, splb.InvalidSplbError) as e:
+            self.report({'ERROR'}, f"Failed to load {self.filepath}: {e}")
+            return {'CANCELLED'}
+
+        with data:
+            book = spl.add_book()
+            bones_not_found = internal.load_book_from_splb(book, data)
+
+        if len(bones_not_found) > 0:
+            self.report({'WARNING'}, f"{len(bones_not_found)} bones were not found in the armature: " + ", ".join(bones_not_found[:10]))
+        return {'FINISHED'}
+
+    # Invoke the operator
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
 
 
 # Operator: Save Poses to CSV
@@ -230,11 +389,26 @@ class SPL_OT_SaveToCSV( bpy.types.Operator, ExportHelper ):
         default=True,
     )
 
+    all_books: BoolProperty(
+        name="All PoseBooks",
+        description="Export poses of all PoseBooks into a single CSV file (e.g. the full morph set of a model)",
+        default=False,
+    )
+
+    category: EnumProperty(
+        name="Category",
+        description="Export only poses in this category",
+        items=POSE_CATEGORIES,
+        default="ALL",
+    )
+
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "scale")
         layout.prop(self, "use_mmd_bone_names")
         layout.prop(self, "use_alt_pose_names")
+        layout.prop(self, "all_books")
+        layout.prop(self, "category")
 
     @classmethod
     @requires_poses
@@ -253,10 +427,12 @@ class SPL_OT_SaveToCSV( bpy.types.Operator, ExportHelper ):
     # Execute the operator
     def execute(self, context):
         spl = get_poselib_from_context(context)
-        book = spl.get_active_book()
+        books = list(spl.books) if self.all_books else [spl.get_active_book()]
+        categories = None if self.category == 'ALL' else [self.category]
 
         # Save poses to file
-        internal.save_book_to_csv(book, self.filepath, self.scale, self.use_mmd_bone_names, self.use_alt_pose_names )
+        if not internal.save_books_to_csv(books, self.filepath, self.scale, self.use_mmd_bone_names, self.use_alt_pose_names, categories ):
+            self.report({'INFO'}, "No changes, the file was not rewritten")
 
         return {'FINISHED'}
 
@@ -290,9 +466,304 @@ class SPL_OT_LoadFromCSV( bpy.types.Operator, ImportHelper ):
         book = spl.add_book()
 
         # Load poses from file
-        internal.load_book_from_csv(book, self.filepath, self.scale )
+        bones_not_found = internal.load_book_from_csv(book, self.filepath, self.scale )
+        if bones_not_found:
+            self.report({'WARNING'}, f"{len(bones_not_found)} bones were not found in the armature ({sum(bones_not_found.values())} rows skipped): " + ", ".join(list(bones_not_found)[:10]))
+        return {'FINISHED'}
+
+# Operator: Load PoseBook from bone morphs of a PMX file
+class SPL_OT_LoadFromPmx( bpy.types.Operator, ImportHelper ):
+    bl_idname = "spl.load_from_pmx"
+    bl_label = "Load from PMX"
+    bl_description = "Load bone morphs of a PMX model file into a new PoseBook (without importing the model)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.pmx", options={'HIDDEN'})
+    filename_ext = '.pmx'
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (MMD -> Blender)",
+        default=0.08,
+        min=0.001,
+        max=100.0,
+    )
+
+    @classmethod
+    @requires_active_armature
+    def poll(cls, context):
+        return True
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        book = spl.add_book()
+
+        try:
+            bones_not_found = internal.load_book_from_pmx(book, self.filepath, self.scale)
+        except (OSError, internal.pmx.InvalidPmxError) as e:
+            spl.remove_book(book)
+            self.report({'ERROR'}, f"Failed to load PMX file: {e}")
+            return {'CANCELLED'}
+
+        if bones_not_found:
+            self.report({'WARNING'}, f"{len(bones_not_found)} bones were not found in the armature ({sum(bones_not_found.values())} offsets skipped): " + ", ".join(list(bones_not_found)[:10]))
+        else:
+            self.report({'INFO'}, f'Loaded {len(book.poses)} bone morphs into "{book.name}"')
+        return {'FINISHED'}
+
+
+# Operator: Write PoseBook as bone morphs into a PMX file
+class SPL_OT_SaveToPmx( bpy.types.Operator, ImportHelper ):
+    bl_idname = "spl.save_to_pmx"
+    bl_label = "Save to PMX"
+    bl_description = "Write poses of the active PoseBook as bone morphs into an existing PMX model file. Morphs with the same names are replaced, other data is kept"
+    bl_options = {'REGISTER'}
+
+    filter_glob: StringProperty(default="*.pmx", options={'HIDDEN'})
+    filename_ext = '.pmx'
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (Blender -> MMD)",
+        default=12.5,
+        min=1.0,
+        max=100.0,
+    )
+
+    use_alt_pose_names: BoolProperty(
+        name="Use Alt Pose Names",
+        description="Use alternative pose names as primary (PoseData.name_alt) instead of default pose names (mainly intended for translation purposes)",
+        default=False,
+    )
+
+    @classmethod
+    @requires_poses
+    def poll(cls, context):
+        return True
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        book = spl.get_active_book()
+
+        try:
+            replaced, added, bones_not_found = internal.save_book_to_pmx(book, self.filepath, self.scale, self.use_alt_pose_names)
+        except (OSError, internal.pmx.InvalidPmxError) as e:
+            self.report({'ERROR'}, f"Failed to write PMX file: {e}")
+            return {'CANCELLED'}
+
+        message = f"{replaced} bone morphs replaced, {added} added"
+        if bones_not_found:
+            self.report({'WARNING'}, message + f". {len(bones_not_found)} bones were not found in the PMX file: " + ", ".join(bones_not_found[:10]))
+        else:
+            self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+
+# Operator: Import multiple files / a folder
+class SPL_OT_ImportFiles( bpy.types.Operator, ImportHelper ):
+    bl_idname = "spl.import_files"
+    bl_label = "Import Files"
+    bl_description = "Import multiple Json/CSV/VPD files (or all of them in a folder) into new PoseBooks. Files are parsed in parallel"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.json;*.json.gz;*.json.xz;*.csv;*.vpd", options={'HIDDEN'})
+
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    use_whole_folder: BoolProperty(
+        name="Whole Folder",
+        description="Import all supported files in the folder (including subfolders) instead of the selected files",
+        default=False,
+    )
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (MMD -> Blender)",
+        default=0.08,
+        min=0.001,
+        max=100.0,
+    )
+
+    @classmethod
+    @requires_active_armature
+    def poll(cls, context):
+        return True
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+
+        if self.use_whole_folder:
+            filepaths = [os.path.join(root, name) for root, _, names in os.walk(self.directory) for name in names if spl_formats.file_kind(name)]
+        else:
+            filepaths = [os.path.join(self.directory, f.name) for f in self.files if f.name and spl_formats.file_kind(f.name)]
+
+        if not filepaths:
+            self.report({'WARNING'}, "No Json/CSV/VPD files to import.")
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        wm.progress_begin(0, len(filepaths))
+        try:
+            books, failed, partial = internal.import_files(spl, filepaths, self.scale, progress=lambda done, total: wm.progress_update(done))
+        finally:
+            wm.progress_end()
+
+        for path, message in (*failed.items(), *partial.items()):
+            print(f"Sakura Poselib: {path}: {message}")
+
+        if failed or partial:
+            self.report({'WARNING'}, f"Imported {len(filepaths) - len(failed)}/{len(filepaths)} files into {len(books)} PoseBooks. {len(failed)} files failed, {len(partial)} files had skipped entries (see console for details)")
+        else:
+            self.report({'INFO'}, f"Imported {len(filepaths)} files into {len(books)} PoseBooks")
         return {'FINISHED'}
 
+
+# Operator: Export all PoseBooks (Modal Operator)
+class SPL_OT_ExportAllBooks( bpy.types.Operator ):
+    bl_idname = "spl.export_all_books"
+    bl_label = "Export All Books"
+    bl_description = "Export all PoseBooks to a folder. Files are written in the background, press ESC to cancel"
+    bl_options = {'REGISTER'}
+
+    directory: StringProperty(subtype='DIR_PATH')
+    filter_folder: BoolProperty(default=True, options={'HIDDEN'})
+
+    file_format: EnumProperty(
+        name="Format",
+        items=[
+            ('JSON', "Json", "A Json file per PoseBook"),
+            ('CSV', "CSV", "A CSV file (compatible with PMX Editor) per PoseBook"),
+            ('VPD', "VPD", "A folder per PoseBook, a VPD file per pose"),
+        ],
+        default='JSON',
+    )
+
+    use_armature_space: BoolProperty(
+        name="Use Armature Space",
+        description="Save transforms in armature space instead of bone local space. Making it compatible with armature with different bone rolls",
+        default=True,
+    )
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (Blender -> MMD)",
+        default=12.5,
+        min=1.0,
+        max=100.0,
+    )
+
+    use_mmd_bone_names: BoolProperty(
+        name="Use MMD Bone Names",
+        description="Use MMD bone names (mmd_tools:mmd_bone.name) instead of Blender bone names",
+        default=True,
+    )
+
+    use_alt_pose_names: BoolProperty(
+        name="Use Alt Pose Names",
+        description="Use alternative pose names as primary (PoseData.name_alt) instead of default pose names (mainly intended for translation purposes)",
+        default=True,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "file_format")
+        if self.file_format == 'JSON':
+            layout.prop(self, "use_armature_space")
+        else:
+            layout.prop(self, "scale")
+        if self.file_format == 'CSV':
+            layout.prop(self, "use_mmd_bone_names")
+            layout.prop(self, "use_alt_pose_names")
+
+    @classmethod
+    @requires_poses
+    def poll(cls, context):
+        return True
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        import concurrent.futures
+        spl = get_poselib_from_context(context)
+
+        # Snapshot on the main thread (bpy is not thread safe)
+        self._failed = {} # {book name: error message}
+        jobs = []
+        used = set() # output paths, so books with similar names don't write the same file
+        for book in spl.books:
+            try:
+                jobs.append((book.name, *internal.snapshot_book_export(book, self.file_format, self.directory,
+                    self.scale, self.use_armature_space, self.use_mmd_bone_names, self.use_alt_pose_names, used)))
+            except Exception as e:
+                self._failed[book.name] = str(e)
+
+        # Encode and write in background threads
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(4, max(1, len(jobs))))
+        self._futures = {self._executor.submit(write): (book_name, path) for book_name, path, write in jobs}
+        self._cancelled = False
+
+        wm = context.window_manager
+        wm.progress_begin(0, max(1, len(self._futures)))
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            # pending books are skipped, books being written are finished
+            self._cancelled = True
+            for future in self._futures:
+                future.cancel()
+            return {'RUNNING_MODAL'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'} # keep the UI responsive
+
+        done = [future for future in self._futures if future.done()]
+        context.window_manager.progress_update(len(done))
+        if len(done) < len(self._futures):
+            return {'RUNNING_MODAL'}
+
+        self._finish(context)
+        return {'CANCELLED'} if self._cancelled else {'FINISHED'}
+
+    def cancel(self, context):
+        self._cancelled = True
+        for future in self._futures:
+            future.cancel()
+        self._finish(context)
+
+    def _finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        self._executor.shutdown(wait=False)
+
+        written = 0
+        skipped = 0
+        for future, (book_name, path) in self._futures.items():
+            if future.cancelled():
+                skipped += 1
+            elif future.exception() is not None:
+                self._failed[book_name] = str(future.exception())
+            else:
+                written += 1
+
+        for book_name, message in self._failed.items():
+            print(f"Sakura Poselib: Failed to export PoseBook \"{book_name}\": {message}")
+
+        msg = f"Exported {written} PoseBooks to {self.directory}"
+        if skipped:
+            msg += f", {skipped} cancelled"
+        if self._failed:
+            msg += f", {len(self._failed)} failed (see console for details)"
+        self.report({'WARNING'} if skipped or self._failed else {'INFO'}, msg)
+
+
 # Operator: Save active Pose to a VPD file
 class SPL_OT_SavePoseToVPD( bpy.types.Operator, ExportHelper ):
     bl_idname = "spl.save_pose_to_vpd"
@@ -335,6 +806,286 @@ class SPL_OT_SavePoseToVPD( bpy.types.Operator, ExportHelper ):
         return {'FINISHED'}
 
 
+# Operator: Save all poses of the active PoseBook to VPD files
+class SPL_OT_SaveBookToVPD( bpy.types.Operator ):
+    bl_idname = "spl.save_book_to_vpd"
+    bl_label = "Save PoseBook to VPD"
+    bl_description = "Save all poses in the active PoseBook to a folder, a VPD file per pose (compatible with MMD applications)"
+    bl_options = {'REGISTER'}
+
+    directory: StringProperty(subtype='DIR_PATH')
+    filter_folder: BoolProperty(default=True, options={'HIDDEN'})
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (Blender -> MMD)",
+        default=12.5,
+        min=1.0,
+        max=100.0,
+    )
+
+    name_template: StringProperty(
+        name="File Name",
+        description="File name template. Available: {pose}, {alt}, {book}, {category}, {index}, {armature}",
+        default=internal.VPD_NAME_TEMPLATE,
+    )
+
+    use_category_folders: BoolProperty(
+        name="Category Folders",
+        description="Save poses into a subfolder per category",
+        default=False,
+    )
+
+    include_morphs: BoolProperty(
+        name="Include Other Pose Values",
+        description="Write current values of the other poses in the PoseBook as Morph entries (nonzero values only)",
+        default=False,
+    )
+
+    @classmethod
+    @requires_poses
+    def poll(cls, context):
+        return True
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        book = spl.get_active_book()
+
+        error = internal.validate_vpd_name_template(self.name_template)
+        if error:
+            self.report({'ERROR'}, f"Invalid file name template: {error}")
+            return {'CANCELLED'}
+
+        try:
+            count = internal.export_book_as_vpd(book, self.directory, self.scale, self.name_template, self.use_category_folders, self.include_morphs)
+        except OSError as e:
+            self.report({'ERROR'}, f"Failed to write VPD files: {e}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"Saved {count} poses to {self.directory}")
+        return {'FINISHED'}
+
+
+# Operator: Export pose animation as a VMD motion
+class SPL_OT_ExportVMD( bpy.types.Operator, ExportHelper ):
+    bl_idname = "spl.export_vmd"
+    bl_label = "Export Motion to VMD"
+    bl_description = "Export the animated poses of all PoseBooks as a VMD motion (compatible with MMD applications)"
+    bl_options = {'REGISTER'}
+
+    filter_glob: StringProperty(default="*.vmd", options={'HIDDEN'})
+    filename_ext = '.vmd'
+
+    source: EnumProperty(
+        name="Source",
+        items=[
+            ('INFLUENCE', "Pose Influences", "Sample keyed pose influences and combine the poses (fast)"),
+            ('EVALUATED', "Evaluated Bones", "Read evaluated bone transforms on every frame (includes other animation and constraints, slower)"),
+        ],
+        default='INFLUENCE',
+    )
+
+    frame_start: IntProperty(name="Start Frame", default=1)
+    frame_end: IntProperty(name="End Frame", default=250)
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (Blender -> MMD)",
+        default=12.5,
+        min=1.0,
+        max=100.0,
+    )
+
+    use_morphs: BoolProperty(
+        name="Bone Morph Keys",
+        description="Write poses which exist as mmd_tools Bone Morphs as morph keys instead of bone keys",
+        default=False,
+    )
+
+    use_alt_pose_names: BoolProperty(
+        name="Use Alt Pose Names",
+        description="Use alternative pose names as primary (PoseData.name_alt) instead of default pose names (mainly intended for translation purposes)",
+        default=False,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "source")
+        layout.prop(self, "frame_start")
+        layout.prop(self, "frame_end")
+        layout.prop(self, "scale")
+        if self.source == 'INFLUENCE':
+            layout.prop(self, "use_morphs")
+            if self.use_morphs:
+                layout.prop(self, "use_alt_pose_names")
+
+    @classmethod
+    @requires_poses
+    def poll(cls, context):
+        return True
+
+    def invoke(self, context, event):
+        spl = get_poselib_from_context(context)
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+        self.filepath = spl.get_armature().name + "_motion"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        if self.frame_end < self.frame_start:
+            self.report({'ERROR'}, "End frame must be after start frame")
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        wm.progress_begin(self.frame_start, self.frame_end)
+        try:
+            bone_keys, morph_keys = internal.export_vmd(spl, self.filepath, self.frame_start, self.frame_end, self.scale,
+                self.source, self.use_morphs, self.use_alt_pose_names, progress=wm.progress_update)
+        finally:
+            wm.progress_end()
+
+        self.report({'INFO'}, f"Exported {bone_keys} bone keys and {morph_keys} morph keys to {self.filepath}")
+        return {'FINISHED'}
+
+
+# Operator: Extract poses from a VMD motion
+class SPL_OT_ExtractPosesFromVMD( bpy.types.Operator, ImportHelper ):
+    bl_idname = "spl.extract_poses_from_vmd"
+    bl_label = "Extract Poses from VMD"
+    bl_description = "Sample all frames of a VMD motion and add representative poses to a new PoseBook. Similar frames are grouped into a pose"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.vmd", options={'HIDDEN'})
+    filename_ext = '.vmd'
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale factor (MMD -> Blender)",
+        default=0.08,
+        min=0.001,
+        max=100.0,
+    )
+
+    tolerance: FloatProperty(
+        name="Tolerance",
+        description="Maximum difference between a frame and its pose (RMS per bone of quaternion components and locations). Smaller values make more poses",
+        default=0.05,
+        min=0.001,
+        max=1.0,
+        precision=3,
+    )
+
+    max_poses: IntProperty(
+        name="Max Poses",
+        description="Maximum number of poses (0 = unlimited)",
+        default=0,
+        min=0,
+    )
+
+    location_weight: FloatProperty(
+        name="Location Weight",
+        description="Weight of bone locations compared to rotations when comparing frames",
+        default=1.0,
+        min=0.0,
+        max=100.0,
+    )
+
+    @classmethod
+    @requires_active_armature
+    def poll(cls, context):
+        return True
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        try:
+            book, max_error = internal.extract_poses_from_vmd(spl, self.filepath, self.scale, self.tolerance, self.max_poses, self.location_weight)
+        except (OSError, internal.vmd.InvalidVmdError) as e:
+            self.report({'ERROR'}, f"Failed to load VMD file: {e}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f'Extracted {len(book.poses)} poses into "{book.name}" (max difference {max_error:.3f})')
+        return {'FINISHED'}
+
+
+# Operator: Extract poses from an Action
+class SPL_OT_ExtractPosesFromAction( bpy.types.Operator ):
+    bl_idname = "spl.extract_poses_from_action"
+    bl_label = "Extract Poses from Action"
+    bl_description = "Sample all frames of an Action and add representative poses to a new PoseBook. Similar frames are grouped into a pose"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    action: StringProperty(name="Action")
+
+    frame_start: IntProperty(name="Start Frame", default=1)
+    frame_end: IntProperty(name="End Frame", default=250)
+
+    tolerance: FloatProperty(
+        name="Tolerance",
+        description="Maximum difference between a frame and its pose (RMS per bone of quaternion components and locations). Smaller values make more poses",
+        default=0.05,
+        min=0.001,
+        max=1.0,
+        precision=3,
+    )
+
+    max_poses: IntProperty(
+        name="Max Poses",
+        description="Maximum number of poses (0 = unlimited)",
+        default=0,
+        min=0,
+    )
+
+    location_weight: FloatProperty(
+        name="Location Weight",
+        description="Weight of bone locations compared to rotations when comparing frames",
+        default=1.0,
+        min=0.0,
+        max=100.0,
+    )
+
+    @classmethod
+    @requires_active_armature
+    def poll(cls, context):
+        return True
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop_search(self, "action", bpy.data, "actions")
+        layout.prop(self, "frame_start")
+        layout.prop(self, "frame_end")
+        layout.prop(self, "tolerance")
+        layout.prop(self, "max_poses")
+        layout.prop(self, "location_weight")
+
+    def invoke(self, context, event):
+        arm = get_poselib_from_context(context).get_armature()
+        action = arm.animation_data.action if arm.animation_data else None
+        if action:
+            self.action = action.name
+            self.frame_start, self.frame_end = (int(f) for f in action.frame_range)
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        spl = get_poselib_from_context(context)
+        action = bpy.data.actions.get(self.action)
+        if action is None:
+            self.report({'ERROR'}, "Action not found")
+            return {'CANCELLED'}
+        if self.frame_end < self.frame_start:
+            self.report({'ERROR'}, "End frame must be after start frame")
+            return {'CANCELLED'}
+
+        book, max_error = internal.extract_poses_from_action(spl, action, self.frame_start, self.frame_end, self.tolerance, self.max_poses, self.location_weight)
+        self.report({'INFO'}, f'Extracted {len(book.poses)} poses into "{book.name}" (max difference {max_error:.3f})')
+        return {'FINISHED'}
+
+
 # Operator: Load a Pose from a VPD file
 class SPL_OT_LoadPoseFromVPD( bpy.types.Operator, ImportHelper ):
     bl_idname = "spl.load_pose_from_vpd"
@@ -1039,7 +1790,17 @@ class SPL_OT_CleanPoses( bpy.types.Operator ):
         # Remove unused/invalid bones in poses within the active posebook
         for pose in book.poses:
             bone_to_remove = {} # {bone_name: reason for removal}
-            for bone in pose.bones:
+
+            if self.check_transform:
+                # check all bones of the pose at once
+                count = len(pose.bones)
+                locations, rotations, scales = [0.0] * (count * 3), [0.0] * (count * 4), [0.0] * (count * 3)
+                pose.bones.foreach_get('location', locations)
+                pose.bones.foreach_get('rotation', rotations)
+                pose.bones.foreach_get('scale', scales)
+                has_transform = utils.has_transform_batch(locations, rotations, scales, self.threshold)
+
+            for index, bone in enumerate(pose.bones):
                 if self.check_name:
                     # Remove bones that are not in the armature
                     if not bone.name in arm.data.bones:
@@ -1047,7 +1808,7 @@ class SPL_OT_CleanPoses( bpy.types.Operator ):
                         continue
                 if self.check_transform:
                     # Remove bones that are not contributing to the deformation
-                    if not utils.has_transform(bone.location, bone.rotation, bone.scale, self.threshold):
+                    if not has_transform[index]:
                         bone_to_remove[bone.name] = "No deformation"
                         continue
 
@@ -1512,6 +2273,124 @@ class SPL_OT_SortPoses(bpy.types.Operator):
 
 
 
+# Operator: Go to a pose in any PoseBook of any armature (used by Search Poses)
+class SPL_OT_GoToPose(bpy.types.Operator):
+    bl_idname = "spl.go_to_pose"
+    bl_label = "Go to Pose"
+    bl_description = "Make the pose active. Optionally apply or key it"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    object_name: StringProperty(options={'HIDDEN'})
+    book_name: StringProperty(options={'HIDDEN'})
+    pose_name: StringProperty(options={'HIDDEN'})
+
+    action: EnumProperty(
+        name="Action",
+        items=(
+            ('JUMP', "Jump", "Make the pose active"),
+            ('APPLY', "Apply", "Make the pose active and apply it"),
+            ('KEY', "Key", "Make the pose active, apply it and insert a keyframe (Animation mode only)"),
+        ),
+        default='JUMP',
+    )
+
+    def execute(self, context):
+        # the object may have been renamed or deleted since the search
+        arm = bpy.data.objects.get(self.object_name)
+        if arm is None:
+            self.report({'WARNING'}, f"Object not found: {self.object_name}")
+            return {'CANCELLED'}
+
+        spl = get_poselib(arm)
+        book = spl.get_book_by_name(self.book_name) if spl else None
+        if not book:
+            self.report({'WARNING'}, "PoseBook not found")
+            return {'CANCELLED'}
+
+        pose_index = book.poses.find(self.pose_name)
+        if pose_index < 0:
+            self.report({'WARNING'}, "Pose not found")
+            return {'CANCELLED'}
+
+        # Make the armature active if possible
+        if context.view_layer.objects.get(arm.name) and context.mode == 'OBJECT':
+            context.view_layer.objects.active = arm
+
+        spl.active_book_index = spl.books.find(book.name)
+        book.active_pose_index = pose_index
+        if self.action == 'JUMP':
+            return {'FINISHED'}
+
+        pose = book.poses[pose_index]
+        book.apply_single_pose(pose)
+        if self.action == 'APPLY':
+            return {'FINISHED'}
+
+        # Insert keyframe to the pose influence
+        con_name = pose.get('constraint_name')
+        if not spl.enable_animation or not con_name or con_name not in arm.keys():
+            self.report({'WARNING'}, "Enable Animation to key poses")
+            return {'CANCELLED'}
+
+        arm.keyframe_insert(data_path='["%s"]' % bpy.utils.escape_identifier(con_name), frame=context.scene.frame_current)
+        return {'FINISHED'}
+
+
+# Operator: Search poses in all PoseBooks of all armatures
+class SPL_OT_SearchPoses(bpy.types.Operator):
+    bl_idname = "spl.search_poses"
+    bl_label = "Search Poses"
+    bl_description = "Search poses by name, alt name or category in all PoseBooks of all armatures"
+    bl_options = {'REGISTER'}
+
+    query: StringProperty(
+        name="Search",
+        description="Words to search (name, alt name, category)",
+        default="",
+        options={'TEXTEDIT_UPDATE', 'SKIP_SAVE'},
+    )
+
+    max_results: IntProperty(
+        name="Max Results",
+        default=30,
+        min=1,
+        max=500,
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self, width=560)
+
+    def draw(self, context):
+        l = self.layout
+        l.prop(self, "query", text="", icon='VIEWZOOM')
+
+        if not self.query.strip():
+            return
+
+        results = search.search_poses(self.query, limit=self.max_results)
+        if not results:
+            l.label(text="No poses found.", icon='INFO')
+            return
+
+        col = l.column(align=True)
+        for result in results:
+            row = col.row(align=True)
+            sp = row.split(factor=0.35, align=True)
+            sp.label(text=f"{result.object_name} / {result.book_name}", icon='ASSET_MANAGER', translate=False)
+            sp = sp.split(factor=0.75, align=True)
+            sp.label(text=f"{result.pose_name}  {result.name_alt}", icon='POSE_HLT', translate=False)
+            sp.label(text=result.category.capitalize())
+            for action, icon in (('JUMP', 'RESTRICT_SELECT_OFF'), ('APPLY', 'VIEWZOOM'), ('KEY', 'KEY_HLT')):
+                op = row.operator('spl.go_to_pose', text='', icon=icon)
+                op.object_name = result.object_name
+                op.book_name = result.book_name
+                op.pose_name = result.pose_name
+                op.action = action
+
+    def execute(self, context):
+        return {'FINISHED'}
+
+
 # Register & Unregister
 
 def get_operator_classes():
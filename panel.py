@@ -145,8 +145,20 @@ class SPL_MT_ConvertMenu(bpy.types.Menu):
 		l.operator('spl.load_from_json', icon='FILE_FOLDER')
 		l.operator('spl.save_to_json', icon='CURRENT_FILE')
 		l.separator()
+		l.operator('spl.load_from_splb', icon='FILE_FOLDER')
+		l.operator('spl.save_to_splb', icon='CURRENT_FILE')
+		l.separator()
 		l.operator('spl.load_from_csv', icon='FILE_FOLDER')
 		l.operator('spl.save_to_csv', icon='CURRENT_FILE')
+		l.separator()
+		l.operator('spl.load_from_pmx', icon='FILE_FOLDER')
+		l.operator('spl.save_to_pmx', icon='CURRENT_FILE')
+		l.separator()
+		l.operator('spl.import_files', icon='FILE_FOLDER')
+		l.operator('spl.export_all_books', icon='CURRENT_FILE')
+		l.separator()
+		l.operator('spl.extract_poses_from_vmd', icon='FILE_FOLDER')
+		l.operator('spl.extract_poses_from_action', icon='ACTION')
 
 # Submenu for Import actions
 class SPL_MT_ImportMenu(bpy.types.Menu):
@@ -159,7 +171,13 @@ class SPL_MT_ImportMenu(bpy.types.Menu):
 		l.operator('spl.load_from_mmdtools', icon='IMPORT')
 		l.separator()
 		l.operator('spl.load_from_json', icon='FILE_FOLDER')
+		l.operator('spl.load_from_splb', icon='FILE_FOLDER')
 		l.operator('spl.load_from_csv', icon='FILE_FOLDER')
+		l.operator('spl.load_from_pmx', icon='FILE_FOLDER')
+		l.operator('spl.import_files', icon='FILE_FOLDER')
+		l.separator()
+		l.operator('spl.extract_poses_from_vmd', icon='FILE_FOLDER')
+		l.operator('spl.extract_poses_from_action', icon='ACTION')
 
 
 # Submenu for Export actions
@@ -174,7 +192,10 @@ class SPL_MT_ExportMenu(bpy.types.Menu):
 
 		l.separator()
 		l.operator('spl.save_to_json', icon='CURRENT_FILE')
+		l.operator('spl.save_to_splb', icon='CURRENT_FILE')
 		l.operator('spl.save_to_csv', icon='CURRENT_FILE')
+		l.operator('spl.save_to_pmx', icon='CURRENT_FILE')
+		l.operator('spl.export_all_books', icon='CURRENT_FILE')
 
 
 # Submenu for Pose List
@@ -193,6 +214,8 @@ class SPL_MT_PoseListMenu(bpy.types.Menu):
 		l.operator( 'spl.clean_poses', icon='BRUSH_DATA')
 		l.separator()
 		l.operator( 'spl.save_pose_to_vpd', icon='EXPORT')
+		l.operator( 'spl.save_book_to_vpd', icon='EXPORT')
+		l.operator( 'spl.export_vmd', icon='EXPORT')
 		l.operator( 'spl.load_pose_from_vpd', icon='IMPORT')
 
 # Submenu for Pose List Display Settings
@@ -250,6 +273,7 @@ def draw_main_panel(self, context: bpy.types.Context):
 	row.operator( 'spl.move_book', text='', icon='TRIA_UP').direction = 'UP'
 	row.operator( 'spl.move_book', text='', icon='TRIA_DOWN').direction = 'DOWN'
 	row.separator()
+	row.operator( 'spl.search_poses', text='', icon='VIEWZOOM')
 	# PoseBook submenu
 	row.menu( 'SPL_MT_PoseBookMenu', text='', icon='DOWNARROW_HLT')
 
@@ -436,6 +460,9 @@ class SPL_PT_PoseBookConverter(Panel):
 		row.operator("spl.load_from_json", icon='FILE_FOLDER')
 		row.operator("spl.save_to_json", icon='CURRENT_FILE')
 		row = l.row()
+		row.operator("spl.load_from_splb", icon='FILE_FOLDER')
+		row.operator("spl.save_to_splb", icon='CURRENT_FILE')
+		row = l.row()
 		row.operator("spl.load_from_csv", icon='FILE_FOLDER')
 		row.operator("spl.save_to_csv", icon='CURRENT_FILE')
 
@@ -0,0 +1,317 @@
+# PMX (Polygon Model eXtended) bone morphs for Sakura Poselib
+#
+# Only the header, bone and morph sections are parsed. Vertices, faces, textures and materials are skipped
+# by their sizes. Bone morphs can be written back to the file: the morph section is rebuilt and everything
+# else (including non-bone morphs) is copied as is.
+#
+# Existing morphs keep their indices (display frames and group morphs refer to them), new morphs are appended.
+#
+# This module must not depend on bpy/mathutils.
+
+import os
+import shutil
+import struct
+from typing import List, Optional
+
+PMX_MAGIC = b'PMX '
+
+MORPH_GROUP = 0
+MORPH_BONE = 2
+
+_INT = struct.Struct('<i')
+
+_SIGNED_INDEX = {1: 'b', 2: 'h', 4: 'i'}
+
+
+class InvalidPmxError(Exception):
+	pass
+
+
+class PmxBone:
+	__slots__ = ('name', 'name_en')
+
+	def __init__(self, name: str, name_en: str):
+		self.name = name
+		self.name_en = name_en
+
+	def __repr__(self):
+		return f'<PmxBone {self.name}>'
+
+
+class PmxMorph:
+	'''
+		offsets: for bone morphs, list of (bone index, (x, y, z), (x, y, z, w)) in MMD space.
+		Other morphs keep their offsets as raw bytes (offset_count, raw).
+	'''
+	__slots__ = ('name', 'name_en', 'panel', 'kind', 'offsets', 'offset_count', 'raw')
+
+	def __init__(self, name: str, name_en: str = '', panel: int = 4, kind: int = MORPH_BONE):
+		self.name = name
+		self.name_en = name_en
+		self.panel = panel # 0: system, 1: eyebrow, 2: eye, 3: mouth, 4: other
+		self.kind = kind
+		self.offsets = []
+		self.offset_count = 0
+		self.raw = b''
+
+	def __repr__(self):
+		return f'<PmxMorph {self.name} (type {self.kind})>'
+
+
+class PmxFile:
+	def __init__(self):
+		self.filepath = ''
+		self.version = 2.0
+		self.encoding = 'utf-16-le'
+		self.index_sizes = {} # {'vertex', 'texture', 'material', 'bone', 'morph', 'rigid_body': size in bytes}
+		self.name = ''
+		self.name_en = ''
+		self.bones: List[PmxBone] = []
+		self.morphs: List[PmxMorph] = []
+		self.morph_section = (0, 0) # (start, end) offsets of the morph section in the file
+
+	def __repr__(self):
+		return f'<PmxFile {self.name}, bones {len(self.bones)}, morphs {len(self.morphs)}>'
+
+	def get_bone_morphs(self) -> List[PmxMorph]:
+		return [morph for morph in self.morphs if morph.kind == MORPH_BONE]
+
+	def set_bone_morph(self, name: str, name_en: str, panel: int, offsets) -> bool:
+		'''
+			Replace offsets of the bone morph with the name, or append a new bone morph.
+			Returns:
+				True if a morph was added
+		'''
+		for morph in self.morphs:
+			if morph.kind == MORPH_BONE and morph.name == name:
+				morph.offsets = list(offsets)
+				return False
+
+		morph = PmxMorph(name, name_en, panel)
+		morph.offsets = list(offsets)
+		self.morphs.append(morph)
+		return True
+
+
+class _Reader:
+	__slots__ = ('data', 'pos', 'encoding')
+
+	def __init__(self, data, encoding='utf-16-le'):
+		self.data = data
+		self.pos = 0
+		self.encoding = encoding
+
+	def unpack(self, st: struct.Struct) -> tuple:
+		values = st.unpack_from(self.data, self.pos)
+		self.pos += st.size
+		return values
+
+	def int(self) -> int:
+		value = _INT.unpack_from(self.data, self.pos)[0]
+		self.pos += 4
+		return value
+
+	def byte(self) -> int:
+		value = self.data[self.pos]
+		self.pos += 1
+		return value
+
+	def text(self) -> str:
+		size = self.int()
+		if size < 0 or self.pos + size > len(self.data):
+			raise InvalidPmxError(f'Invalid text at offset {self.pos - 4}')
+		value = bytes(self.data[self.pos:self.pos + size]).decode(self.encoding, errors='replace')
+		self.pos += size
+		return value
+
+	def skip_texts(self, count: int):
+		for _ in range(count):
+			size = self.int()
+			if size < 0:
+				raise InvalidPmxError(f'Invalid text at offset {self.pos - 4}')
+			self.pos += size
+
+
+def _encode_text(text: str, encoding: str) -> bytes:
+	data = text.encode(encoding)
+	return _INT.pack(len(data)) + data
+
+
+def read_pmx(filepath: str) -> PmxFile:
+	with open(filepath, 'rb') as f:
+		data = f.read()
+
+	try:
+		return _read_pmx(memoryview(data), filepath)
+	except (struct.error, IndexError):
+		raise InvalidPmxError('File is truncated')
+
+
+def _read_pmx(data: memoryview, filepath: str) -> PmxFile:
+	if bytes(data[:4]) != PMX_MAGIC:
+		raise InvalidPmxError('Not a PMX file')
+
+	pmx = PmxFile()
+	pmx.filepath = filepath
+	r = _Reader(data)
+	r.pos = 4
+	pmx.version = round(r.unpack(struct.Struct('<f'))[0], 2)
+	globals_count = r.byte()
+	if globals_count < 8:
+		raise InvalidPmxError('Invalid header')
+	g = bytes(data[r.pos:r.pos + globals_count])
+	r.pos += globals_count
+
+	r.encoding = pmx.encoding = 'utf-8' if g[0] == 1 else 'utf-16-le'
+	additional_uvs = g[1]
+	sizes = pmx.index_sizes = dict(zip(('vertex', 'texture', 'material', 'bone', 'morph', 'rigid_body'), g[2:8]))
+	if any(size not in (1, 2, 4) for size in sizes.values()):
+		raise InvalidPmxError('Invalid index size')
+	vsize, tsize, msize, bsize, morph_size, rsize = g[2:8]
+
+	pmx.name = r.text()
+	pmx.name_en = r.text()
+	r.skip_texts(2) # comments
+
+	# vertices: position, normal, uv, additional uvs, deform (variable), edge scale
+	vertex_base = 32 + 16 * additional_uvs
+	deform_sizes = (bsize, bsize * 2 + 4, bsize * 4 + 16, bsize * 2 + 40, bsize * 4 + 16) # BDEF1, BDEF2, BDEF4, SDEF, QDEF
+	pos = r.pos + 4
+	for _ in range(r.int()):
+		pos += vertex_base
+		try:
+			pos += 1 + deform_sizes[data[pos]] + 4
+		except IndexError:
+			raise InvalidPmxError(f'Invalid vertex at offset {pos}')
+	r.pos = pos
+
+	# faces
+	count = r.int()
+	r.pos += count * vsize
+
+	# textures
+	r.skip_texts(r.int())
+
+	# materials
+	for _ in range(r.int()):
+		r.skip_texts(2) # names
+		r.pos += 44 + 1 + 20 + tsize * 2 + 1 # colors, flags, edge, texture and sphere indices, sphere mode
+		shared_toon = r.byte()
+		r.pos += 1 if shared_toon else tsize # toon
+		r.skip_texts(1) # memo
+		r.pos += 4 # face count
+
+	# bones
+	flags_struct = struct.Struct('<H')
+	bones = pmx.bones
+	for _ in range(r.int()):
+		bones.append(PmxBone(r.text(), r.text()))
+		r.pos += 12 + bsize + 4 # position, parent, layer
+		flags = r.unpack(flags_struct)[0]
+		r.pos += bsize if flags & 0x0001 else 12 # tail
+		if flags & 0x0300: # inherit rotation / location
+			r.pos += bsize + 4
+		if flags & 0x0400: # fixed axis
+			r.pos += 12
+		if flags & 0x0800: # local axis
+			r.pos += 24
+		if flags & 0x2000: # external parent
+			r.pos += 4
+		if flags & 0x0020: # IK
+			r.pos += bsize + 8
+			for _ in range(r.int()):
+				r.pos += bsize
+				if r.byte():
+					r.pos += 24
+
+	# morphs
+	start = r.pos
+	offset_sizes = {
+		0: morph_size + 4, # group
+		1: vsize + 12, # vertex
+		2: bsize + 28, # bone
+		3: vsize + 16, 4: vsize + 16, 5: vsize + 16, 6: vsize + 16, 7: vsize + 16, # uv
+		8: msize + 113, # material
+		9: morph_size + 4, # flip
+		10: rsize + 25, # impulse
+	}
+	bone_offset = struct.Struct('<' + _SIGNED_INDEX[bsize] + '3f4f')
+	for _ in range(r.int()):
+		morph = PmxMorph(r.text(), r.text(), r.byte(), r.byte())
+		count = r.int()
+		size = offset_sizes.get(morph.kind)
+		if size is None or count < 0:
+			raise InvalidPmxError(f'Invalid morph "{morph.name}"')
+		end = r.pos + count * size
+		if end > len(data):
+			raise InvalidPmxError('File is truncated')
+
+		if morph.kind == MORPH_BONE:
+			morph.offsets = [(index, (x, y, z), (qx, qy, qz, qw)) for index, x, y, z, qx, qy, qz, qw in bone_offset.iter_unpack(data[r.pos:end])]
+		else:
+			morph.offset_count = count
+			morph.raw = bytes(data[r.pos:end])
+		pmx.morphs.append(morph)
+		r.pos = end
+
+	pmx.morph_section = (start, r.pos)
+	return pmx
+
+
+def _pack_morphs(pmx: PmxFile) -> bytes:
+	bsize, morph_size = pmx.index_sizes['bone'], pmx.index_sizes['morph']
+	if len(pmx.morphs) > 1 << (morph_size * 8 - 1):
+		raise InvalidPmxError(f'Too many morphs ({len(pmx.morphs)}) for the morph index size of the file')
+
+	bone_offset = struct.Struct('<' + _SIGNED_INDEX[bsize] + '3f4f')
+	max_bone = min(len(pmx.bones), 1 << (bsize * 8 - 1))
+	encoding = pmx.encoding
+	chunks = [_INT.pack(len(pmx.morphs))]
+	for morph in pmx.morphs:
+		chunks.append(_encode_text(morph.name, encoding))
+		chunks.append(_encode_text(morph.name_en, encoding))
+		chunks.append(bytes((morph.panel, morph.kind)))
+		if morph.kind == MORPH_BONE:
+			offsets = [o for o in morph.offsets if 0 <= o[0] < max_bone]
+			chunks.append(_INT.pack(len(offsets)))
+			chunks.extend(bone_offset.pack(index, *loc, *rot) for index, loc, rot in offsets)
+		else:
+			chunks.append(_INT.pack(morph.offset_count))
+			chunks.append(morph.raw)
+	return b''.join(chunks)
+
+
+def write_pmx(pmx: PmxFile, filepath: Optional[str] = None):
+	'''
+		Write the PMX file with the current morphs. Everything else is copied from pmx.filepath.
+		filepath: output path (default: overwrite pmx.filepath, through a temporary file)
+	'''
+	filepath = filepath or pmx.filepath
+	start, end = pmx.morph_section
+	morphs = _pack_morphs(pmx)
+
+	temp_path = filepath + '.tmp'
+	try:
+		with open(pmx.filepath, 'rb') as src, open(temp_path, 'wb') as dst:
+			_copy_bytes(src, dst, start)
+			dst.write(morphs)
+			src.seek(end)
+			shutil.copyfileobj(src, dst)
+		os.replace(temp_path, filepath)
+	except BaseException:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		raise
+
+	# following writes start from the new file
+	pmx.filepath = filepath
+	pmx.morph_section = (start, start + len(morphs))
+
+
+def _copy_bytes(src, dst, size: int, chunk_size: int = 1 << 20):
+	while size > 0:
+		chunk = src.read(min(size, chunk_size))
+		if not chunk:
+			raise InvalidPmxError('File is truncated')
+		dst.write(chunk)
+		size -= len(chunk)
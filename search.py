@@ -0,0 +1,125 @@
+# Global pose search for Sakura Poselib
+#
+# Poses in all books of all armatures are indexed by n-grams (1~3 characters) of
+# their name, alternative name and category. Each book has its own index, which is
+# dropped when the book is edited (see spl.py callbacks) and rebuilt lazily on the next search.
+
+import bpy
+from typing import List
+
+_MAX_GRAM = 3
+
+class PoseSearchResult:
+    __slots__ = ('object_name', 'book_name', 'pose_name', 'name_alt', 'category', 'rank')
+
+    def __init__(self, object_name, book_name, pose_name, name_alt, category, rank):
+        self.object_name = object_name
+        self.book_name = book_name
+        self.pose_name = pose_name
+        self.name_alt = name_alt
+        self.category = category
+        self.rank = rank
+
+    def __repr__(self):
+        return "<PoseSearchResult %s/%s/%s>" % (self.object_name, self.book_name, self.pose_name)
+
+
+class _BookIndex:
+    __slots__ = ('pose_count', 'entries', 'texts', 'grams')
+
+    def __init__(self, book):
+        self.pose_count = len(book.poses)
+        self.entries = [(pose.name, pose.name_alt, pose.category) for pose in book.poses]
+        self.texts = ["\n".join(entry).lower() for entry in self.entries]
+        self.grams = {} # {gram: set of entry indices}
+
+        grams = self.grams
+        for idx, text in enumerate(self.texts):
+            length = len(text)
+            for i in range(length):
+                for n in range(1, _MAX_GRAM + 1):
+                    if i + n > length:
+                        break
+                    gram = text[i:i+n]
+                    if "\n" in gram:
+                        break
+                    ids = grams.get(gram)
+                    if ids is None:
+                        grams[gram] = {idx}
+                    else:
+                        ids.add(idx)
+
+    # returns indices of entries containing all tokens
+    def search(self, tokens: List[str]) -> set:
+        found = None
+        for token in tokens:
+            if len(token) <= _MAX_GRAM:
+                ids = self.grams.get(token, set())
+            else:
+                # candidates must have all trigrams of the token, then verify by substring match
+                trigrams = sorted((self.grams.get(token[i:i+_MAX_GRAM], set()) for i in range(len(token) - _MAX_GRAM + 1)), key=len)
+                ids = set.intersection(*trigrams)
+                ids = {idx for idx in ids if token in self.texts[idx]}
+
+            found = ids if found is None else found & ids
+            if not found:
+                return set()
+        return found or set()
+
+
+_book_indices = {} # {(object pointer, book name): _BookIndex}
+
+# Get (or build) the index of the book
+def _get_book_index(obj: bpy.types.Object, book) -> _BookIndex:
+    key = (obj.as_pointer(), book.name)
+    index = _book_indices.get(key)
+    if index is None or index.pose_count != len(book.poses): # poses added/removed
+        index = _BookIndex(book)
+        _book_indices[key] = index
+    return index
+
+# Drop the index of the book, call this when a pose in the book is edited
+def invalidate_book(book):
+    _book_indices.pop((book.id_data.as_pointer(), book.name), None)
+
+# Drop all indices of the object, call this when a book is renamed
+def invalidate_object(obj: bpy.types.ID):
+    key = obj.as_pointer()
+    for index_key in [k for k in _book_indices if k[0] == key]:
+        del _book_indices[index_key]
+
+# Drop all indices (on file load, undo, etc.)
+def clear():
+    _book_indices.clear()
+
+
+# Search poses in all books of all armatures. Results are sorted by relevance
+def search_poses(query: str, limit: int = 100) -> List[PoseSearchResult]:
+    from .spl import get_poselib
+
+    tokens = query.lower().split()
+    if not tokens:
+        return []
+
+    results = []
+    for obj in [o for o in bpy.data.objects if o.pose]:
+        spl = get_poselib(obj)
+        if spl is None:
+            continue
+
+        for book in spl.books:
+            index = _get_book_index(spl.id_data, book)
+            for idx in index.search(tokens):
+                name, name_alt, category = index.entries[idx]
+                lower_name = name.lower()
+                # exact match > prefix match > others, then shorter names first
+                if lower_name == query.lower() or name_alt.lower() == query.lower():
+                    rank = 0
+                elif lower_name.startswith(tokens[0]) or name_alt.lower().startswith(tokens[0]):
+                    rank = 1
+                else:
+                    rank = 2
+                results.append(PoseSearchResult(obj.name, book.name, name, name_alt, category, (rank, len(name), name)))
+
+    results.sort(key=lambda r: r.rank)
+    return results[:limit]
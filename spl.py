@@ -5,8 +5,9 @@ from bpy.types import PropertyGroup
 from bpy.props import *
 from mathutils import Vector, Quaternion, Euler, Matrix
 from typing import Optional
+import numpy as np
 
-from . import utils
+from . import utils, search
 
 # pose categories definition
 POSE_CATEGORIES = [
@@ -46,6 +47,36 @@ def resolve_naming_collision(self, collection):
 	return
 
 
+# Make names unique within the list by appending .001, .002, etc. (same manner as resolve_naming_collision)
+def make_unique_names(names) -> list:
+	names = list(names)
+	name_set = set(names)
+	if len(name_set) == len(names):
+		return names
+
+	used = set()
+	for i, name in enumerate(names):
+		if name in used:
+			base = re.sub(r"\.\d{3}$", "", name)
+			for counter in range(1, 1000):
+				candidate = "{0}.{1:03}".format(base, counter)
+				if candidate not in used and candidate not in name_set:
+					break
+			names[i] = candidate
+		used.add(names[i])
+	return names
+
+# Flatten transform channels for foreach_set
+def _flatten_channels(values, size, count, default):
+	if values is None:
+		return default * count
+	if hasattr(values, 'ravel'): # numpy array
+		return values.astype('float32', copy=False).ravel()
+	if len(values) == count * size:
+		return values
+	return [v for value in values for v in value]
+
+
 # Get armature object from ID datablock
 def get_armature_from_id( data:bpy.types.ID ) -> Optional[bpy.types.Object]:
 	obj:bpy.types.Object = data.id_data
@@ -125,6 +156,109 @@ def update_combined_pose( book: "PoseBook" ):
 	return
 
 
+###################################################
+# Bone Name Index
+###################################################
+
+# Index of bone names referenced by pose data, per poselib owner object.
+# {id pointer: {bone_name: {(book_name, pose_name), ...}}}
+# Entries are addressed by names (unique within their collections) rather than RNA references,
+# so moving/removing items never leaves dangling pointers. Stale entries are skipped on lookup,
+# and any rename of a book, pose or bone invalidates the index of its owner.
+_bone_name_index = {}
+
+# Get (or build) the bone name index for the PoselibData
+def get_bone_name_index( poselib: "PoselibData" ) -> dict:
+	key = poselib.id_data.as_pointer()
+	index = _bone_name_index.get(key)
+	if index is None:
+		index = {}
+		for book in poselib.books:
+			for pose in book.poses:
+				for bone_name in pose.bones.keys():
+					index.setdefault(bone_name, set()).add((book.name, pose.name))
+		_bone_name_index[key] = index
+	return index
+
+# Drop the bone name index of the object which owns the data
+def invalidate_bone_name_index( data: bpy.types.bpy_struct ):
+	_bone_name_index.pop(data.id_data.as_pointer(), None)
+
+# Drop all bone name indices (on file load, undo, etc.)
+def clear_bone_name_index():
+	_bone_name_index.clear()
+
+
+###################################################
+# Bone Rename Tracking
+###################################################
+
+# In-memory snapshot of bone names, per armature data. {armature data pointer: {bone name: (parent name, rest key)}}
+# Only armatures which have poselib books are tracked. Nothing is written into the file.
+_bone_name_snapshots = {}
+
+# Identity of each bone which survives renames: its parent and rest matrix (bytes of matrix_local and length)
+def _bone_identities( arm: bpy.types.Armature ) -> dict:
+	bones = arm.bones
+	count = len(bones)
+	matrices = np.empty(count * 16, np.float32)
+	lengths = np.empty(count, np.float32)
+	bones.foreach_get('matrix_local', matrices)
+	bones.foreach_get('length', lengths)
+	rest = np.concatenate((matrices.reshape(count, 16), lengths[:, None]), axis=1)
+	return {bone.name: (bone.parent.name if bone.parent else '', rest[i].tobytes()) for i, bone in enumerate(bones)}
+
+# Take a snapshot of bone names if the armature doesn't have one yet
+def ensure_bone_name_snapshot( arm: bpy.types.Armature ):
+	key = arm.as_pointer()
+	if key not in _bone_name_snapshots:
+		_bone_name_snapshots[key] = _bone_identities(arm)
+
+# Compare bone names with the snapshot, returns {old_name: new_name} and updates the snapshot
+def diff_bone_name_snapshot( arm: bpy.types.Armature ) -> dict:
+	key = arm.as_pointer()
+	old_bones = _bone_name_snapshots.get(key)
+	new_bones = _bone_identities(arm)
+	_bone_name_snapshots[key] = new_bones
+	if old_bones is None:
+		return {}
+
+	# names which are gone, or now belong to another bone (swapped names)
+	vanished = [name for name, bone in old_bones.items() if new_bones.get(name, (None, None))[1] != bone[1]]
+	appeared = {name: None for name, bone in new_bones.items() if old_bones.get(name, (None, None))[1] != bone[1]} # ordered set
+	if not vanished or not appeared:
+		return {}
+
+	# match by rest matrix, bones may have been added or removed in the same edit session.
+	# bones sharing a rest matrix are told apart by their parent
+	by_rest = {}
+	for name in appeared:
+		by_rest.setdefault(new_bones[name][1], []).append(name)
+
+	renames = {}
+	for old in vanished:
+		parent, rest = old_bones[old]
+		candidates = [name for name in by_rest.get(rest, ()) if name in appeared and name != old]
+		if len(candidates) > 1:
+			parent = renames.get(parent, parent)
+			candidates = [name for name in candidates if new_bones[name][0] == parent]
+		if len(candidates) == 1:
+			renames[old] = candidates[0]
+			del appeared[candidates[0]]
+
+	# renamed and moved: renaming never changes the bone order, so match the rest by position if nothing was added or removed
+	if appeared and len(old_bones) == len(new_bones):
+		for old, new in zip(old_bones, new_bones):
+			if new in appeared and old != new and old not in renames and old not in new_bones:
+				renames[old] = new
+
+	return renames
+
+# Forget all snapshots (on file load, undo, etc.). They are rebuilt lazily
+def clear_bone_name_snapshots():
+	_bone_name_snapshots.clear()
+
+
 ###################################################
 # Property Groups
 ###################################################
@@ -138,6 +272,7 @@ class BoneTransform(PropertyGroup):
 			return
 		# resolve naming collision
 		resolve_naming_collision(self, pose.bones)
+		invalidate_bone_name_index(self)
 		return
 
 	name: StringProperty(name="Bone Name", update=update_bone_name)
@@ -166,6 +301,8 @@ class PoseData(PropertyGroup):
 	def update_pose_name(self, context):
 		book = self.get_book()
 		resolve_naming_collision(self, book.poses)
+		invalidate_bone_name_index(self)
+		search.invalidate_book(book)
 
 		# Update action name
 		action =  self.get_action()
@@ -176,6 +313,10 @@ class PoseData(PropertyGroup):
 			self.action_uptodate = False
 		return
 
+	# callback for alt name / category change
+	def update_search_index(self, context):
+		search.invalidate_book(self.get_book())
+
 	########################################################################################
 	# Properties
 	name: StringProperty(
@@ -191,6 +332,7 @@ class PoseData(PropertyGroup):
 		name="Pose Name (Alt)", 
 		description="Alternative name. Mainly intended for translation. Not used as idetifier in blender", 
 		default="",
+		update=update_search_index,
 		options={'LIBRARY_EDITABLE'},
 		override={'LIBRARY_OVERRIDABLE'},
 	)
@@ -199,6 +341,7 @@ class PoseData(PropertyGroup):
 		name="Category", 
 		items=POSE_CATEGORIES,
 		default="OTHER", 
+		update=update_search_index,
 		options={'LIBRARY_EDITABLE'},
 		override={'LIBRARY_OVERRIDABLE'},
 	)
@@ -293,20 +436,69 @@ class PoseData(PropertyGroup):
 				return bone
 		return None
 
+	# Replace all bones at once (bulk path for importers)
+	def set_bones(self, names, locations=None, rotations=None, scales=None):
+		"""
+		Replace all bones with the given data.
+
+		Args:
+			names: Bone names.
+			locations, rotations, scales: Transforms parallel to names. Flat sequences (N*3, N*4, N*3),
+				sequences of vectors, or arrays. Omitted channels are set to identity.
+		"""
+		names = make_unique_names(names)
+		count = len(names)
+
+		bones = self.bones
+		bones.clear()
+		for _ in range(count):
+			bones.add()
+
+		# write names directly, uniqueness is already ensured
+		for bone, name in zip(bones, names):
+			bone['name'] = name
+
+		bones.foreach_set('location', _flatten_channels(locations, 3, count, (0.0, 0.0, 0.0)))
+		bones.foreach_set('rotation', _flatten_channels(rotations, 4, count, (1.0, 0.0, 0.0, 0.0)))
+		bones.foreach_set('scale', _flatten_channels(scales, 3, count, (1.0, 1.0, 1.0)))
+
+		self.active_bone_index = max(0, min(self.active_bone_index, count - 1))
+		self.action_uptodate = False
+		invalidate_bone_name_index(self)
+		return
+
 	def copy_from(self, pose: "PoseData"):
 		self.name = pose.name
 		self.name_alt = pose.name_alt
 		self.category = pose.category
 
-		self.bones.clear()
-		for bone in pose.bones:
-			new_bone = self.add_bone(bone.name)
-			new_bone.copy_from(bone)
+		count = len(pose.bones)
+		locations, rotations, scales = [0.0] * (count * 3), [0.0] * (count * 4), [0.0] * (count * 3)
+		pose.bones.foreach_get('location', locations)
+		pose.bones.foreach_get('rotation', rotations)
+		pose.bones.foreach_get('scale', scales)
+		self.set_bones(pose.bones.keys(), locations, rotations, scales)
 
 		self.action_uptodate = False
 		self.ensure_action()
 		return
 
+	# Get all bones as arrays (the counterpart of set_bones)
+	def get_bone_arrays(self) -> tuple:
+		"""
+		Returns:
+			(bone names, locations (N, 3), rotations (N, 4) WXYZ, scales (N, 3)), float32 arrays
+		"""
+		bones = self.bones
+		count = len(bones)
+		locations = np.empty((count, 3), dtype=np.float32)
+		rotations = np.empty((count, 4), dtype=np.float32)
+		scales = np.empty((count, 3), dtype=np.float32)
+		bones.foreach_get('location', locations.ravel())
+		bones.foreach_get('rotation', rotations.ravel())
+		bones.foreach_get('scale', scales.ravel())
+		return bones.keys(), locations, rotations, scales
+
 	# helper: check if bone is driven by a driver
 	def __is_bone_driver_driven( self, bone:bpy.types.PoseBone, valid_datapaths: list) -> bool:
 		return any(f'bones["{bone.name}"]' in dp for dp in valid_datapaths)
@@ -324,8 +516,7 @@ class PoseData(PropertyGroup):
 				if '.loc' in fc.data_path or '.rot' in fc.data_path or '.sca' in fc.data_path:
 					valid_datapaths.append(fc.data_path)
 
-		# clear all bones
-		self.bones.clear()
+		names, locations, rotations, scales = [], [], [], []
 
 		# Save only bones contributing to the deformation
 		for bone in arm.pose.bones:
@@ -335,10 +526,13 @@ class PoseData(PropertyGroup):
 				if ignore_driven_bones and self.__is_bone_driver_driven(bone, valid_datapaths):
 					continue
 
-				bd = self.add_bone(bone.name)
-				bd.location = bone.location
-				bd.rotation = utils.get_pose_bone_rotation_quaternion(bone)
-				bd.scale = bone.scale
+				names.append(bone.name)
+				locations.extend(bone.location)
+				rotations.extend(utils.get_pose_bone_rotation_quaternion(bone))
+				scales.extend(bone.scale)
+
+		self.set_bones(names, locations, rotations, scales)
+		self.active_bone_index = max(0, len(names) - 1)
 
 		self.ensure_action( force_update = True )
 		return
@@ -576,6 +770,8 @@ class PoseBook(PropertyGroup):
 			pose.remove_action()
 
 		resolve_naming_collision(self, spl.books)
+		invalidate_bone_name_index(self)
+		search.invalidate_object(self.id_data)
 
 		# recreate actions
 		if spl.enable_animation:
@@ -741,6 +937,158 @@ class PoseBook(PropertyGroup):
 			pose.reset_pose()
 		return
 
+	########################################################################################
+	# Array I/O (bulk access for scripts and batch tools)
+
+	def get_values(self) -> np.ndarray:
+		"""Pose values (influences) as a float32 array, in animation mode the values of the pose properties"""
+		values = np.zeros(len(self.poses), dtype=np.float32)
+		self.poses.foreach_get('value', values)
+
+		arm = get_armature_from_id(self)
+		if get_poselib(arm).enable_animation:
+			for i, pose in enumerate(self.poses):
+				con_name = pose.get('constraint_name')
+				if con_name and con_name in arm.keys():
+					values[i] = arm[con_name]
+		return values
+
+	def set_values(self, values):
+		"""Set all pose values at once and update the pose (same as setting PoseData.value of each pose)"""
+		values = np.asarray(values, dtype=np.float32).ravel()
+		if len(values) != len(self.poses):
+			raise ValueError(f"Expected {len(self.poses)} values, got {len(values)}")
+		self.poses.foreach_set('value', values)
+
+		arm = get_armature_from_id(self)
+		if get_poselib(arm).enable_animation:
+			for pose, value in zip(self.poses, values):
+				con_name = pose.get('constraint_name')
+				if con_name and con_name in arm.keys():
+					arm[con_name] = float(value)
+			arm.hide_render = arm.hide_render # hacky way to update the pose
+		else:
+			update_combined_pose(self)
+		return
+
+	def to_arrays(self) -> dict:
+		"""
+		Export all poses as arrays. Bones of pose i are rows offsets[i]:offsets[i+1] (CSR layout).
+
+		Returns:
+			{
+				'pose_names', 'pose_names_alt', 'categories': lists of str, per pose
+				'values': float32 (pose count,)
+				'bone_names': list of str, table of the bone names used by the poses
+				'offsets': int32 (pose count + 1,)
+				'bone_indices': int32 (row count,), index into bone_names
+				'locations', 'rotations', 'scales': float32 (row count, 3 / 4 (WXYZ) / 3)
+			}
+		"""
+		poses = self.poses
+		offsets = np.zeros(len(poses) + 1, dtype=np.int32)
+		np.cumsum([len(pose.bones) for pose in poses], out=offsets[1:])
+		total = int(offsets[-1])
+
+		locations = np.empty((total, 3), dtype=np.float32)
+		rotations = np.empty((total, 4), dtype=np.float32)
+		scales = np.empty((total, 3), dtype=np.float32)
+		bone_indices = np.empty(total, dtype=np.int32)
+		bone_table = {} # {bone name: index}
+
+		for pose, start, end in zip(poses, offsets[:-1], offsets[1:]):
+			bones = pose.bones
+			bones.foreach_get('location', locations[start:end].ravel())
+			bones.foreach_get('rotation', rotations[start:end].ravel())
+			bones.foreach_get('scale', scales[start:end].ravel())
+			bone_indices[start:end] = [bone_table.setdefault(name, len(bone_table)) for name in bones.keys()]
+
+		return {
+			'pose_names': poses.keys(),
+			'pose_names_alt': [pose.name_alt for pose in poses],
+			'categories': [pose.category for pose in poses],
+			'values': self.get_values(),
+			'bone_names': list(bone_table),
+			'offsets': offsets,
+			'bone_indices': bone_indices,
+			'locations': locations,
+			'rotations': rotations,
+			'scales': scales,
+		}
+
+	def from_arrays(self, arrays: dict, clear: bool = True):
+		"""
+		Import poses from arrays in the to_arrays() layout. Only 'pose_names', 'bone_names', 'offsets' and
+		'bone_indices' are required, omitted channels are set to identity and omitted values are left as is.
+
+		Args:
+			clear: Remove existing poses first, otherwise poses are appended
+
+		Raises:
+			ValueError: arrays are inconsistent (checked before the book is changed)
+		"""
+		pose_names = list(arrays['pose_names'])
+		bone_names = list(arrays['bone_names'])
+		offsets = np.asarray(arrays['offsets'], dtype=np.int64)
+		bone_indices = np.asarray(arrays['bone_indices'], dtype=np.int64)
+		if len(offsets) != len(pose_names) + 1:
+			raise ValueError("offsets must have (pose count + 1) entries")
+		if offsets[0] != 0 or (np.diff(offsets) < 0).any() or offsets[-1] != len(bone_indices):
+			raise ValueError("offsets must start at 0, be non-decreasing and end at the length of bone_indices")
+		if len(bone_indices) and (bone_indices.min() < 0 or bone_indices.max() >= len(bone_names)):
+			raise ValueError("bone_indices must be in the range of bone_names")
+
+		channels = {}
+		for key, size in (('locations', 3), ('rotations', 4), ('scales', 3)):
+			if arrays.get(key) is not None:
+				channel = np.asarray(arrays[key], dtype=np.float32)
+				if channel.size != len(bone_indices) * size:
+					raise ValueError(f"{key} must have {size} values per bone ({len(bone_indices)} bones)")
+				channels[key] = channel.reshape(-1, size)
+
+		names_alt = arrays.get('pose_names_alt')
+		categories = arrays.get('categories')
+		for key, values in (('pose_names_alt', names_alt), ('categories', categories)):
+			if values is not None and len(values) != len(pose_names):
+				raise ValueError(f"{key} must have an entry per pose")
+		if categories is not None and not {category for category, *_ in POSE_CATEGORIES[1:]}.issuperset(categories):
+			raise ValueError("categories must be one of EYEBROW, EYE, MOUTH, OTHER")
+		values = arrays.get('values')
+		if values is not None and np.size(values) != len(pose_names):
+			raise ValueError("values must have an entry per pose")
+
+		if clear:
+			# remove actions too, otherwise their constraints and properties are left on the armature
+			for pose in self.poses:
+				pose.remove_action()
+			self.poses.clear()
+			self.active_pose_index = 0
+		first = len(self.poses)
+
+		for i, name in enumerate(pose_names):
+			start, end = offsets[i], offsets[i + 1]
+			pose = self.add_pose(name)
+			if names_alt is not None:
+				pose.name_alt = names_alt[i]
+			if categories is not None:
+				pose.category = categories[i]
+
+			pose.set_bones(
+				[bone_names[index] for index in bone_indices[start:end]],
+				channels['locations'][start:end] if 'locations' in channels else None,
+				channels['rotations'][start:end] if 'rotations' in channels else None,
+				channels['scales'][start:end] if 'scales' in channels else None,
+			)
+
+		if values is not None:
+			if clear:
+				self.set_values(values)
+			else:
+				all_values = self.get_values()
+				all_values[first:] = np.asarray(values, dtype=np.float32).ravel()
+				self.set_values(all_values)
+		return
+
 
 
 # Root PoseLib Container
@@ -806,12 +1154,10 @@ class PoselibData(PropertyGroup):
 	# add a new book
 	def add_book(self, name:str = None ) -> PoseBook:
 		if len(self.books) == 0:
-			# create bone name backups
-			#print(self, self.id_data)
+			# start tracking bone renames of the armature
 			arm = get_armature_from_id(self)
-			#print(arm)
-			for bone in arm.data.bones:
-				bone["spl_bone_name_backup"] = bone.name
+			if arm:
+				ensure_bone_name_snapshot(arm.data)
 
 		book = self.books.add()
 		if not name:
@@ -863,8 +1209,33 @@ class PoselibData(PropertyGroup):
 			if book.name == name:
 				return book
 		return None
-	
-	
+
+	# Propagate armature bone renames to the pose data. renames: {old_name: new_name}
+	def rename_bones(self, renames: dict):
+		index = get_bone_name_index(self)
+
+		# Collect all targets first, so swapped names (e.g. L <-> R) are not renamed twice
+		targets = [] # [(BoneTransform, new_name)]
+		for old_name, new_name in renames.items():
+			for book_name, pose_name in index.get(old_name, ()):
+				book = self.books.get(book_name)
+				pose = book.poses.get(pose_name) if book else None
+				bone_data = pose.bones.get(old_name) if pose else None
+				if bone_data:
+					targets.append((bone_data, new_name))
+
+		# Write names directly, bypassing collision checks (armature bone names are unique)
+		for bone_data, new_name in targets:
+			bone_data['name'] = new_name
+
+		# Update the index in place
+		moved = {old_name: index.pop(old_name, set()) for old_name in renames}
+		for old_name, refs in moved.items():
+			if refs:
+				index.setdefault(renames[old_name], set()).update(refs)
+		return
+
+
 	# Copy entire data from another PoselibData
 	def copy_from(self, src: "PoselibData"):
 		self.books.clear()
@@ -0,0 +1,830 @@
+# File format codecs for Sakura Poselib
+#
+# This module must not depend on bpy/mathutils, so that it can be used (and tested) outside of Blender.
+
+import hashlib
+import json
+import os
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+
+###################################################
+# PoseBook JSON (streaming)
+#
+# A PoseBook JSON file is an array of pose objects:
+# [ { "name": ..., "name_alt": ..., "category": ..., "space": ..., "bones": [ {name, location, rotation, scale}, ... ] }, ... ]
+# The reader below decodes one pose at a time, so memory usage is bounded by the largest pose, not by the file size.
+
+# A malformed entry found while reading
+class EntryError:
+	__slots__ = ('index', 'line', 'message')
+
+	def __init__(self, index: int, line: int, message: str):
+		self.index = index # index of the pose entry in the array
+		self.line = line # line number (1-based) where the entry starts
+		self.message = message
+
+	def __str__(self):
+		return f'Entry {self.index} (line {self.line}): {self.message}'
+
+	def __repr__(self):
+		return f'<EntryError {self}>'
+
+
+# Pose categories (PoseData.category). Missing or unknown categories are read as OTHER
+POSE_CATEGORIES = ('EYEBROW', 'EYE', 'MOUTH', 'OTHER')
+
+def pose_category(pose: dict) -> str:
+	category = pose.get('category')
+	return category if isinstance(category, str) and category in POSE_CATEGORIES else 'OTHER'
+
+
+# strings (complete or not), brackets and separators
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\],"]')
+_JSON_SPACE = re.compile(r'[ \t\r\n]*')
+
+_CHUNK_SIZE = 1 << 16
+
+# bone channels and their identity values, which can be omitted in the file
+_IDENTITY_CHANNELS = (
+	('location', (0.0, 0.0, 0.0)),
+	('rotation', (1.0, 0.0, 0.0, 0.0)),
+	('scale', (1.0, 1.0, 1.0)),
+)
+
+
+# Split the top level array into raw entry texts.
+# Yields (entry index, line number, entry text, position of the "bones" key in the text or -1)
+def _iter_json_entries(f, chunk_size=_CHUNK_SIZE) -> Iterator[tuple]:
+	buf = ''
+	base_line = 1 # line number of buf[0]
+	eof = False
+
+	def fill(start):
+		# drop consumed text and read next chunk. returns new start (0)
+		nonlocal buf, base_line, eof
+		base_line += buf.count('\n', 0, start)
+		chunk = f.read(chunk_size)
+		if not chunk:
+			eof = True
+		buf = buf[start:] + chunk
+		return 0
+
+	# find the opening bracket
+	pos = 0
+	while True:
+		pos = _JSON_SPACE.match(buf, pos).end()
+		if pos < len(buf):
+			break
+		if eof:
+			raise ValueError('Empty file')
+		pos = fill(pos)
+
+	if buf[pos] != '[':
+		line = base_line + buf.count('\n', 0, pos)
+		raise ValueError(f'Line {line}: PoseBook JSON must be an array of poses')
+	pos += 1
+
+	index = 0
+	while True:
+		# skip separators before the entry
+		pos = _JSON_SPACE.match(buf, pos).end()
+		if pos >= len(buf):
+			if eof:
+				yield index, base_line + buf.count('\n', 0, pos), None, 'Unexpected end of file (missing "]")'
+				return
+			pos = fill(pos)
+			continue
+		if buf[pos] == ',':
+			pos += 1
+			continue
+		if buf[pos] == ']':
+			return
+
+		# scan the entry until "," or "]" at depth 0
+		start = pos
+		depth = 0
+		bones_key = -1
+		stray = False
+		while True:
+			m = _JSON_TOKEN.search(buf, pos)
+			if m is None or (m.group() == '"' and not eof):
+				# token may continue in the next chunk
+				if eof:
+					break
+				pos = (m.start() if m else len(buf)) - start
+				start = fill(start)
+				continue
+
+			token = m.group()
+			pos = m.end()
+			if token == '"':
+				break # unterminated string at the end of file
+			if token[0] == '"':
+				if depth == 1 and token == '"bones"' and bones_key < 0:
+					# key, not a value?
+					colon = _JSON_SPACE.match(buf, pos).end()
+					if colon < len(buf) and buf[colon] == ':':
+						bones_key = m.start() - start
+				continue
+			if token in '{[':
+				depth += 1
+			elif token in '}]':
+				if depth == 0:
+					if token == ']':
+						pos = m.start()
+						break
+					stray = True
+					continue
+				depth -= 1
+			elif depth == 0: # ','
+				pos = m.start()
+				break
+
+		line = base_line + buf.count('\n', 0, start)
+		if depth > 0 or (m is None and eof) or (m is not None and m.group() == '"'):
+			yield index, line, None, 'Unexpected end of file'
+			return
+		text = buf[start:pos]
+		yield index, line, text, -1 if stray else bones_key
+		index += 1
+
+
+# Decode "name", "category" etc. without decoding bones
+def _decode_entry_header(text: str, bones_key: int) -> Optional[dict]:
+	header = text[:bones_key].rstrip()
+	if header.endswith(','):
+		header = header[:-1]
+	try:
+		header = json.loads(header + '}')
+	except ValueError:
+		return None
+	return header if isinstance(header, dict) else None
+
+
+def _is_vector(value, size) -> bool:
+	return isinstance(value, (list, tuple)) and len(value) == size and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+
+
+def _prepare_filters(pose_names, categories, bone_names):
+	pose_names = None if pose_names is None else set(pose_names)
+	categories = None if categories is None else set(categories)
+	if bone_names is not None and not callable(bone_names):
+		bone_names = set(bone_names).__contains__
+	return pose_names, categories, bone_names
+
+
+def read_json_poses(
+		f,
+		pose_names: Iterable[str] = None,
+		categories: Iterable[str] = None,
+		bone_names: Union[Iterable[str], Callable[[str], bool]] = None,
+		errors: List[EntryError] = None,
+		chunk_size: int = _CHUNK_SIZE,
+	) -> Iterator[dict]:
+	'''
+		Read poses from a PoseBook JSON file one by one.
+		Parameters:
+			f: file object opened in text mode
+			pose_names: load only poses with these names (None: all)
+			categories: load only poses in these categories (None: all)
+			bone_names: load only these bones, a collection of names or a predicate (None: all)
+			errors: if given, malformed entries are appended to it and skipped. Otherwise ValueError is raised
+		Returns:
+			iterator of pose dicts, with "bones" filtered, validated and omitted channels filled
+	'''
+	pose_names, categories, bone_names = _prepare_filters(pose_names, categories, bone_names)
+
+	def report(index, line, message):
+		error = EntryError(index, line, message)
+		if errors is None:
+			raise ValueError(str(error))
+		errors.append(error)
+
+	for index, line, text, bones_key in _iter_json_entries(f, chunk_size):
+		if text is None:
+			report(index, line, bones_key)
+			return
+
+		# filter by name/category before decoding bones
+		if bones_key >= 0 and (pose_names is not None or categories is not None):
+			header = _decode_entry_header(text, bones_key)
+			if header is not None:
+				# keys written after "bones" are not in the header, leave them to _check_pose()
+				if pose_names is not None and 'name' in header and header['name'] not in pose_names:
+					continue
+				if categories is not None and 'category' in header and pose_category(header) not in categories:
+					continue
+
+		try:
+			pose = json.loads(text)
+		except ValueError as e:
+			report(index, line + e.lineno - 1, e.msg)
+			continue
+
+		pose = _check_pose(pose, pose_names, categories, bone_names, lambda message: report(index, line, message))
+		if pose is not None:
+			yield pose
+
+
+# Validate a decoded pose and filter its bones. Returns None if the pose is malformed or filtered out
+def _check_pose(pose, pose_names, categories, bone_names, report) -> Optional[dict]:
+	if not isinstance(pose, dict):
+		report('Pose must be an object')
+		return None
+	if not isinstance(pose.get('name'), str):
+		report('Pose has no name')
+		return None
+	if pose_names is not None and pose['name'] not in pose_names:
+		return None
+	pose['category'] = pose_category(pose)
+	if categories is not None and pose['category'] not in categories:
+		return None
+
+	bones = pose.get('bones', [])
+	if not isinstance(bones, list):
+		report(f'Pose "{pose["name"]}": "bones" must be an array')
+		return None
+
+	valid_bones = []
+	for i, bone in enumerate(bones):
+		if not isinstance(bone, dict) or not isinstance(bone.get('name'), str):
+			report(f'Pose "{pose["name"]}": bone {i} has no name')
+			continue
+		if bone_names is not None and not bone_names(bone['name']):
+			continue
+		# omitted channels are identity (see write_json_poses)
+		if not all(_is_vector(bone.setdefault(key, list(identity)), len(identity)) for key, identity in _IDENTITY_CHANNELS):
+			report(f'Pose "{pose["name"]}": bone "{bone["name"]}" has invalid transform')
+			continue
+		valid_bones.append(bone)
+
+	pose['bones'] = valid_bones
+	return pose
+
+
+def _round_values(values, precision):
+	# + 0.0 turns -0.0 into 0.0
+	return [round(v, precision) + 0.0 for v in values]
+
+
+def _encode_pose(pose: dict, precision: Optional[int], omit_identity: bool) -> dict:
+	if precision is None and not omit_identity:
+		return pose
+
+	bones = []
+	for bone in pose.get('bones', []):
+		bd = {'name': bone['name']}
+		for key, identity in _IDENTITY_CHANNELS:
+			values = bone.get(key, identity)
+			if precision is not None:
+				values = _round_values(values, precision)
+			if omit_identity and all(v == i for v, i in zip(values, identity)):
+				continue
+			bd[key] = list(values)
+		bones.append(bd)
+
+	return dict(pose, bones=bones)
+
+
+def write_json_poses(
+		f,
+		poses: Iterable[dict],
+		precision: Optional[int] = None,
+		compact: bool = False,
+		omit_identity: bool = False,
+	) -> int:
+	'''
+		Write poses to a PoseBook JSON file one by one.
+		With default options, the output is identical to json.dump(list(poses), f, indent=2).
+		Parameters:
+			f: file object opened in text mode
+			poses: iterable of pose dicts (see read_json_poses)
+			precision: number of decimal places of transforms (None: full precision)
+			compact: no indentation/spaces, one pose per line
+			omit_identity: omit zero location, identity rotation and unit scale
+		Returns:
+			number of poses written
+	'''
+	if compact:
+		dumps = lambda pose: json.dumps(pose, separators=(',', ':'))
+	else:
+		dumps = lambda pose: json.dumps(pose, indent=2).replace('\n', '\n  ')
+
+	count = 0
+	for pose in poses:
+		f.write(('[\n' if count == 0 else ',\n') + ('' if compact else '  '))
+		f.write(dumps(_encode_pose(pose, precision, omit_identity)))
+		count += 1
+
+	f.write('\n]' if count else '[]')
+	return count
+
+
+# Compression
+_GZIP_MAGIC = b'\x1f\x8b'
+_XZ_MAGIC = b'\xfd7zXZ\x00'
+
+COMPRESSION_EXTENSIONS = {
+	'NONE': '',
+	'GZIP': '.gz',
+	'XZ': '.xz',
+}
+
+# Open a text file, compressed files (gzip, xz) are detected by magic bytes when reading
+def open_text(filepath: str, mode: str = 'r', compression: str = 'NONE'):
+	if 'r' in mode:
+		with open(filepath, 'rb') as f:
+			magic = f.read(len(_XZ_MAGIC))
+		if magic.startswith(_GZIP_MAGIC):
+			compression = 'GZIP'
+		elif magic.startswith(_XZ_MAGIC):
+			compression = 'XZ'
+		else:
+			compression = 'NONE'
+
+	mode = mode.replace('t', '') + 't'
+	if compression == 'GZIP':
+		import gzip
+		return gzip.open(filepath, mode, encoding='utf-8')
+	if compression == 'XZ':
+		import lzma
+		return lzma.open(filepath, mode, encoding='utf-8')
+	return open(filepath, mode, encoding='utf-8')
+
+
+###################################################
+# Per-pose content hash and directory layout
+#
+# A PoseBook directory has a manifest and one JSON file per pose:
+#   manifest.json : {"format": "spl-posebook-dir", "version": 1, "poses": [{"name", "file", "hash"}, ...]}
+#   <pose>.json   : a pose object (same as an entry of PoseBook JSON)
+# Saving rewrites only the files of poses whose content hash changed, so unchanged pose files stay byte-identical.
+
+MANIFEST_NAME = 'manifest.json'
+_MANIFEST_FORMAT = 'spl-posebook-dir'
+_HASH_DIGITS = 5 # transforms are quantized to 1e-5 before hashing, so float noise does not change the hash
+
+def pose_content_hash(pose: dict, digits: int = _HASH_DIGITS) -> str:
+	'''
+		Stable hash of a pose dict, covering name, alt name, category, space and quantized bone transforms.
+	'''
+	factor = 10 ** digits
+	quantize = lambda values: [int(round(v * factor)) for v in values]
+	content = [
+		pose.get('name'), pose.get('name_alt') or '', pose_category(pose), pose.get('space', 'LOCAL'),
+		[[bone['name']] + [quantize(bone.get(key, identity)) for key, identity in _IDENTITY_CHANNELS] for bone in pose.get('bones', [])],
+	]
+	return hashlib.sha1(json.dumps(content, separators=(',', ':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# Replace characters which can't be used in file names (keeps non-ASCII characters, unlike bpy.path.clean_name)
+def safe_file_name(name: str, default: str = 'untitled') -> str:
+	return _UNSAFE_CHARS.sub('_', name).strip(' .') or default
+
+def _pose_file_name(pose_name: str, used: set) -> str:
+	base = safe_file_name(pose_name, 'pose')
+	name = base + '.json'
+	counter = 1
+	while name.lower() in used or name.lower() == MANIFEST_NAME:
+		name = f'{base}.{counter:03}.json'
+		counter += 1
+	used.add(name.lower())
+	return name
+
+
+# Manifest entries must name a file in the directory itself, never a path out of it
+def _is_plain_file_name(name) -> bool:
+	return isinstance(name, str) and name not in ('', '.', '..') and os.path.basename(name) == name
+
+
+def read_manifest(dirpath: str) -> Optional[dict]:
+	try:
+		with open(os.path.join(dirpath, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return None
+	if not isinstance(manifest, dict) or manifest.get('format') != _MANIFEST_FORMAT or not isinstance(manifest.get('poses'), list):
+		return None
+	return manifest
+
+
+def write_json_pose_dir(
+		dirpath: str,
+		poses: Iterable[dict],
+		precision: Optional[int] = None,
+		omit_identity: bool = False,
+	) -> tuple:
+	'''
+		Write poses to a PoseBook directory, rewriting only changed poses.
+		Returns:
+			(number of poses, number of pose files written, number of pose files removed)
+	'''
+	os.makedirs(dirpath, exist_ok=True)
+
+	old_manifest = read_manifest(dirpath) or {'poses': []}
+	old_entries = {entry.get('name'): entry for entry in old_manifest['poses'] if isinstance(entry, dict)}
+
+	# keep file names of existing poses, so renamed files don't show up as changes
+	used = {entry['file'].lower() for entry in old_entries.values() if _is_plain_file_name(entry.get('file'))}
+	entries = []
+	written = 0
+	for pose in poses:
+		pose = _encode_pose(pose, precision, omit_identity)
+		content_hash = pose_content_hash(pose)
+
+		old = old_entries.pop(pose['name'], None)
+		if old is not None and _is_plain_file_name(old.get('file')):
+			file_name = old['file']
+		else:
+			file_name = _pose_file_name(pose['name'], used)
+
+		path = os.path.join(dirpath, file_name)
+		if old is None or old.get('hash') != content_hash or not os.path.exists(path):
+			with open(path, 'w', encoding='utf-8') as f:
+				f.write(json.dumps(pose, indent=2))
+			written += 1
+
+		entries.append({'name': pose['name'], 'file': file_name, 'hash': content_hash})
+
+	# remove files of deleted poses
+	removed = 0
+	for old in old_entries.values():
+		file_name = old.get('file')
+		if _is_plain_file_name(file_name) and os.path.exists(os.path.join(dirpath, file_name)):
+			os.remove(os.path.join(dirpath, file_name))
+			removed += 1
+
+	manifest = json.dumps({'format': _MANIFEST_FORMAT, 'version': 1, 'poses': entries}, indent=2)
+	manifest_path = os.path.join(dirpath, MANIFEST_NAME)
+	write_text_if_changed(manifest_path, manifest)
+
+	return len(entries), written, removed
+
+
+def read_json_pose_dir(
+		dirpath: str,
+		pose_names: Iterable[str] = None,
+		categories: Iterable[str] = None,
+		bone_names: Union[Iterable[str], Callable[[str], bool]] = None,
+		errors: List[EntryError] = None,
+	) -> Iterator[dict]:
+	'''
+		Read poses from a PoseBook directory, in the order of the manifest. Parameters are same as read_json_poses.
+		Poses filtered by name are skipped without opening their files.
+	'''
+	manifest = read_manifest(dirpath)
+	if manifest is None:
+		raise ValueError(f'{os.path.join(dirpath, MANIFEST_NAME)}: Not a PoseBook manifest')
+
+	pose_names, categories, bone_names = _prepare_filters(pose_names, categories, bone_names)
+
+	for index, entry in enumerate(manifest['poses']):
+		def report(message, line=1):
+			error = EntryError(index, line, f'{entry.get("file")}: {message}' if isinstance(entry, dict) else message)
+			if errors is None:
+				raise ValueError(str(error))
+			errors.append(error)
+
+		if not isinstance(entry, dict) or not isinstance(entry.get('file'), str):
+			report('Invalid manifest entry')
+			continue
+		if not _is_plain_file_name(entry['file']):
+			report('File name must not contain a path')
+			continue
+		if pose_names is not None and entry.get('name') not in pose_names:
+			continue
+
+		try:
+			with open(os.path.join(dirpath, entry['file']), 'r', encoding='utf-8') as f:
+				pose = json.load(f)
+		except OSError as e:
+			report(str(e))
+			continue
+		except ValueError as e:
+			report(e.msg, e.lineno)
+			continue
+
+		pose = _check_pose(pose, pose_names, categories, bone_names, report)
+		if pose is not None:
+			yield pose
+
+
+# Write a text file only when its content differs, so unchanged files keep their timestamps. Returns True if written
+def write_text_if_changed(filepath: str, text: str, newline: str = None) -> bool:
+	try:
+		with open(filepath, 'r', encoding='utf-8', newline=newline) as f:
+			if f.read() == text:
+				return False
+	except (OSError, UnicodeDecodeError):
+		pass
+	with open(filepath, 'w', encoding='utf-8', newline=newline) as f:
+		f.write(text)
+	return True
+
+
+###################################################
+# VPD (Vocaloid Pose Data)
+
+class InvalidFileError(Exception):
+	pass
+
+
+class VpdBone:
+	__slots__ = ('bone_name', 'location', 'rotation')
+
+	def __init__(self, bone_name, location, rotation):
+		self.bone_name = bone_name
+		self.location = location
+		self.rotation = rotation if any(rotation) else [0, 0, 0, 1]
+
+	def __repr__(self):
+		return "<VpdBone %s, loc %s, rot %s>" % (
+			self.bone_name,
+			str(self.location),
+			str(self.rotation),
+		)
+
+class VpdMorph:
+	__slots__ = ('morph_name', 'weight')
+
+	def __init__(self, morph_name, weight):
+		self.morph_name = morph_name
+		self.weight = weight
+
+	def __repr__(self):
+		return "<VpdMorph %s, weight %f>" % (
+			self.morph_name,
+			self.weight,
+		)
+
+
+class VpdFile:
+	__slots__ = ('filepath', 'osm_name', 'bones', 'morphs')
+
+	ENCODING = "shift_jis"
+
+	def __init__(self):
+		self.filepath = ""
+		self.osm_name = None
+		self.bones = []
+		self.morphs = []
+
+	def __repr__(self):
+		return "<File %s, osm %s, bones %d, morphs %d>" % (
+			self.filepath,
+			self.osm_name,
+			len(self.bones),
+			len(self.morphs),
+		)
+
+	def load(self, **args):
+		path = args["filepath"]
+
+		# decode the whole file at once, then walk the lines
+		with open(path, "rb") as fin:
+			text = fin.read().decode(self.ENCODING, errors="replace")
+		self.filepath = path
+		self.loads(text)
+
+	def loads(self, text: str):
+		lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+		count = len(lines)
+
+		def fail(index, message):
+			raise InvalidFileError(f"Line {index + 1}: {message}")
+
+		def values(index, size):
+			# "  x,y,z;\t\t// comment"
+			if index >= count:
+				fail(index, "Unexpected end of file")
+			try:
+				result = [float(x) for x in lines[index].split(";")[0].split(",")]
+			except ValueError:
+				fail(index, "Invalid number")
+			if len(result) != size:
+				fail(index, f"{size} values expected")
+			return result
+
+		def close(index):
+			if index >= count or not lines[index].startswith("}"):
+				fail(index, "'}' expected")
+
+		if not lines[0].startswith("Vocaloid Pose Data file"):
+			fail(0, "Not a VPD file")
+		if count < 5:
+			fail(count - 1, "Unexpected end of file")
+
+		self.osm_name = lines[2].split(";")[0].strip()
+		try:
+			bone_counts = int(lines[3].split(";")[0].strip())
+		except ValueError:
+			fail(3, "Invalid bone count")
+
+		bones = []
+		morphs = []
+		i = 5
+		while i < count:
+			line = lines[i]
+			if line.startswith("Bone"):
+				location = values(i + 1, 3)
+				rotation = values(i + 2, 4)
+				close(i + 3)
+				bones.append(VpdBone(line.split("{")[-1].strip(), location, rotation))
+				i += 4
+
+			elif line.startswith("Morph"):
+				weight = values(i + 1, 1)[0]
+				close(i + 2)
+				morphs.append(VpdMorph(line.split("{")[-1].strip(), weight))
+				i += 3
+
+			else:
+				i += 1
+
+		if len(bones) != bone_counts:
+			fail(3, f"Bone count mismatch ({bone_counts} declared, {len(bones)} found)")
+
+		self.bones = bones
+		self.morphs = morphs
+
+	def save(self, **args):
+		path = args.get("filepath", self.filepath)
+
+		data = self.dumps().encode(self.ENCODING, errors="replace")
+		with open(path, "wb") as fout:
+			fout.write(data)
+		self.filepath = path
+
+	def dumps(self) -> str:
+		out = [
+			"Vocaloid Pose Data file\r\n",
+			"\r\n",
+			"%s;\t\t// 親ファイル名\r\n" % self.osm_name,
+			"%d;\t\t\t\t// 総ポーズボーン数\r\n" % len(self.bones),
+			"\r\n",
+		]
+
+		for i, b in enumerate(self.bones):
+			out.append(
+				"Bone%d{%s\r\n"
+				"  %f,%f,%f;\t\t\t\t// trans x,y,z\r\n"
+				"  %f,%f,%f,%f;\t\t// Quaternion x,y,z,w\r\n"
+				"}\r\n"
+				"\r\n" % (i, b.bone_name, *b.location, *b.rotation)
+			)
+
+		for i, m in enumerate(self.morphs):
+			out.append(
+				"Morph%d{%s\r\n"
+				"  %f;\t\t\t\t// weight\r\n"
+				"}\r\n"
+				"\r\n" % (i, m.morph_name, m.weight)
+			)
+
+		return "".join(out)
+
+
+###################################################
+# PMX Editor CSV (bone morphs)
+#
+# line starts with ';' is comment
+# PmxMorph,"{pose_name}","{eng_name}",category_index,2(BoneMorph)
+# PmxBoneMorph,"{pose_name}",index(within the pose),"{bone_name}",loc_x,loc_y,loc_z,rot_x,rot_y,rot_z
+# loc is in MMD unit, rot is in degrees
+
+class CsvMorph:
+	__slots__ = ('name', 'name_alt', 'category_index', 'bones')
+
+	def __init__(self, name, name_alt='', category_index=-1):
+		self.name = name
+		self.name_alt = name_alt
+		self.category_index = category_index
+		self.bones = [] # [(offset index, bone name, (loc x, y, z), (rot x, y, z))]
+
+	def __repr__(self):
+		return f'<CsvMorph {self.name} ({len(self.bones)} bones)>'
+
+
+def read_csv_morphs(filepath: str, errors: List[EntryError] = None) -> List[CsvMorph]:
+	'''
+		Read bone morphs from a PMX Editor CSV file in a single pass. Rows are grouped by morph and
+		bones of each morph are sorted by offset index.
+		Rows with invalid values are appended to errors (index is the row number) and skipped. Otherwise ValueError is raised
+	'''
+	import csv
+	morphs = {} # {name: CsvMorph}, in order of appearance
+
+	with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+		reader = csv.reader(csvfile, delimiter=',', quotechar='"')
+
+		for row in reader:
+			if len(row) < 1 or row[0].startswith(';'):
+				continue
+
+			try:
+				if row[0].startswith('PmxMorph'):
+					name = row[1].strip('"')
+					morph = morphs.get(name)
+					if morph is None:
+						morph = morphs[name] = CsvMorph(name)
+					morph.name_alt = row[2].strip('"')
+					morph.category_index = int(row[3])
+
+				elif row[0].startswith('PmxBoneMorph'):
+					name = row[1].strip('"')
+					loc = (float(row[4]), float(row[5]), float(row[6]))
+					rot = (float(row[7]), float(row[8]), float(row[9]))
+					morph = morphs.get(name)
+					if morph is None: # bone row without morph header
+						morph = morphs[name] = CsvMorph(name)
+					morph.bones.append((int(row[2]), row[3].strip('"'), loc, rot))
+
+			except (IndexError, ValueError) as e:
+				error = EntryError(reader.line_num, reader.line_num, f'Invalid row: {e}')
+				if errors is None:
+					raise ValueError(str(error))
+				errors.append(error)
+
+	# order bones by オフセットIndex (stable, rows with the same index keep the file order)
+	for morph in morphs.values():
+		morph.bones.sort(key=lambda bone: bone[0])
+
+	return list(morphs.values())
+
+
+_CSV_MORPH_HEADER = ';PmxMorph,モーフ名,モーフ名(英),パネル(0:無効/1:眉(左下)/2:目(左上)/3:口(右上)/4:その他(右下)),モーフ種類(0:グループモーフ/1:頂点モーフ/2:ボーンモーフ/3:UV(Tex)モーフ/4:追加UV1モーフ/5:追加UV2モーフ/6:追加UV3モーフ/7:追加UV4モーフ/8:材質モーフ/9:フリップモーフ/10:インパルスモーフ)\n'
+_CSV_BONE_HEADER = ';PmxBoneMorph,親モーフ名,オフセットIndex,ボーン名,移動量_x,移動量_y,移動量_z,回転量_x[deg],回転量_y[deg],回転量_z[deg]\n'
+
+_CSV_BUFFER_LINES = 4096
+
+def write_csv_morphs(f, morphs: Iterable[CsvMorph]):
+	'''
+		Write bone morphs as a PMX Editor CSV. Values of CsvMorph.bones must be already converted to MMD (MMD unit, degrees).
+		Lines are written in large chunks.
+		Parameters:
+			f: file object opened in text mode with newline=''
+	'''
+	lines = [_CSV_MORPH_HEADER]
+
+	for morph in morphs:
+		name = morph.name
+		lines.append(f'PmxMorph,"{name}","{morph.name_alt}",{morph.category_index},2\n')
+		lines.append(_CSV_BONE_HEADER)
+		for index, bone_name, loc, rot in morph.bones:
+			lines.append(f'PmxBoneMorph,"{name}",{index},"{bone_name}",{loc[0]:.5g},{loc[1]:.5g},{loc[2]:.5g},{rot[0]:.5g},{rot[1]:.5g},{rot[2]:.5g}\n')
+
+		if len(lines) >= _CSV_BUFFER_LINES:
+			f.write(''.join(lines))
+			lines.clear()
+
+	# Comment
+	lines.append("\n;This file is generated by Sakura Poselib addon for Blender.\n")
+	f.write(''.join(lines))
+
+
+###################################################
+# File parsing for batch import
+#
+# parse_file() runs in worker processes, so it must not touch bpy. Results are committed to PoseBooks on the main thread.
+
+JSON_EXTENSIONS = ('.json', '.json.gz', '.json.xz')
+SUPPORTED_EXTENSIONS = JSON_EXTENSIONS + ('.csv', '.vpd')
+
+def file_kind(filepath: str) -> Optional[str]:
+	lower = filepath.lower()
+	if lower.endswith(JSON_EXTENSIONS):
+		return 'JSON'
+	if lower.endswith('.csv'):
+		return 'CSV'
+	if lower.endswith('.vpd'):
+		return 'VPD'
+	return None
+
+
+def parse_file(filepath: str) -> tuple:
+	'''
+		Parse a JSON/CSV/VPD file without bpy.
+		Returns:
+			(kind, data, errors)
+			kind: 'JSON' (data: list of pose dicts), 'CSV' (data: list of CsvMorph) or 'VPD' (data: VpdFile)
+			errors: list of str (malformed entries which were skipped)
+		Raises:
+			exceptions of the file access/parsers, when the file can not be read at all
+	'''
+	kind = file_kind(filepath)
+	errors = []
+	if kind == 'JSON':
+		with open_text(filepath) as f:
+			data = list(read_json_poses(f, errors=errors))
+	elif kind == 'CSV':
+		data = read_csv_morphs(filepath, errors)
+	elif kind == 'VPD':
+		data = VpdFile()
+		data.load(filepath=filepath)
+	else:
+		raise ValueError(f'Unsupported file type: {filepath}')
+	return kind, data, [str(error) for error in errors]
@@ -0,0 +1,206 @@
+# Binary PoseBook format (.splb) for Sakura Poselib
+#
+# Layout (little endian, every section is 8-byte aligned):
+#   Header       : magic "SPLB", version, pose count, bone count (total of all poses), section offsets
+#   String table : count, offsets[count + 1], utf-8 blob. Pose names, categories and bone names are stored once
+#   Pose table   : per pose (name, name_alt, category, space as string indices, first bone, bone count)
+#   Bone names   : per bone, string index (uint32)
+#   Channels     : location (float32 x3), rotation (float32 x4, WXYZ), scale (float32 x3), each contiguous over all bones
+#
+# Bones of a pose are stored contiguously, so channels of a pose are plain slices of the memory-mapped file
+# and can be passed to foreach_set without copying.
+#
+# This module must not depend on bpy/mathutils.
+
+import os
+import struct
+from typing import Iterable, List
+
+import numpy as np
+
+SPLB_MAGIC = b'SPLB'
+SPLB_VERSION = 1
+
+_HEADER = struct.Struct('<4sIII6Q') # magic, version, pose count, bone count, offsets (strings, poses, bone names, locations, rotations, scales)
+
+_POSE_DTYPE = np.dtype([
+	('name', '<u4'),
+	('name_alt', '<u4'),
+	('category', '<u4'),
+	('space', '<u4'),
+	('first', '<u4'),
+	('count', '<u4'),
+])
+
+
+class InvalidSplbError(Exception):
+	pass
+
+
+def _align(offset: int) -> int:
+	return (offset + 7) & ~7
+
+
+class SplbPose:
+	__slots__ = ('name', 'name_alt', 'category', 'space', 'bone_names', 'locations', 'rotations', 'scales')
+
+	def __init__(self, name, name_alt, category, space, bone_names, locations, rotations, scales):
+		self.name = name
+		self.name_alt = name_alt
+		self.category = category
+		self.space = space
+		self.bone_names = bone_names # list of str
+		self.locations = locations # float32 array (bone count * 3)
+		self.rotations = rotations # float32 array (bone count * 4)
+		self.scales = scales # float32 array (bone count * 3)
+
+	def __repr__(self):
+		return f'<SplbPose {self.name} ({len(self.bone_names)} bones)>'
+
+
+class SplbFile:
+	'''
+		Memory-mapped .splb file.
+		Channel arrays of poses are views of the file, keep this object alive while using them.
+	'''
+
+	def __init__(self, filepath: str):
+		self.filepath = filepath
+		size = os.path.getsize(filepath)
+		if size < _HEADER.size:
+			raise InvalidSplbError('File is too small')
+
+		self.data = np.memmap(filepath, dtype=np.uint8, mode='r')
+		magic, version, pose_count, bone_count, *offsets = _HEADER.unpack_from(self.data, 0)
+		if magic != SPLB_MAGIC:
+			raise InvalidSplbError('Not a SPLB file')
+		if version > SPLB_VERSION:
+			raise InvalidSplbError(f'Unsupported version: {version}')
+
+		strings_offset, poses_offset, names_offset, loc_offset, rot_offset, sca_offset = offsets
+		sections = (
+			(poses_offset, pose_count * _POSE_DTYPE.itemsize),
+			(names_offset, bone_count * 4),
+			(loc_offset, bone_count * 12),
+			(rot_offset, bone_count * 16),
+			(sca_offset, bone_count * 12),
+		)
+		if any(offset + length > size for offset, length in sections):
+			raise InvalidSplbError('File is truncated')
+
+		self.strings = self._read_strings(strings_offset, size)
+		self.pose_table = np.frombuffer(self.data, _POSE_DTYPE, pose_count, poses_offset)
+		self.bone_name_ids = np.frombuffer(self.data, '<u4', bone_count, names_offset)
+		self.locations = np.frombuffer(self.data, '<f4', bone_count * 3, loc_offset)
+		self.rotations = np.frombuffer(self.data, '<f4', bone_count * 4, rot_offset)
+		self.scales = np.frombuffer(self.data, '<f4', bone_count * 3, sca_offset)
+
+		# every index is checked once here, so the accessors can't fail
+		string_count = len(self.strings)
+		table = self.pose_table
+		if pose_count and int((table['first'].astype(np.uint64) + table['count']).max()) > bone_count:
+			raise InvalidSplbError('Pose table is corrupted')
+		if pose_count and max(int(table[key].max()) for key in ('name', 'name_alt', 'category', 'space')) >= string_count:
+			raise InvalidSplbError('Pose table is corrupted')
+		if bone_count and int(self.bone_name_ids.max()) >= string_count:
+			raise InvalidSplbError('Bone names are corrupted')
+
+	def _read_strings(self, offset: int, size: int) -> List[str]:
+		if offset + 4 > size:
+			raise InvalidSplbError('File is truncated')
+		count = struct.unpack_from('<I', self.data, offset)[0]
+		blob = offset + 4 + (count + 1) * 4
+		if blob > size:
+			raise InvalidSplbError('File is truncated')
+		ends = np.frombuffer(self.data, '<u4', count + 1, offset + 4).astype(np.int64)
+		if ends[0] != 0 or (ends[1:] < ends[:-1]).any() or blob + int(ends[-1]) > size:
+			raise InvalidSplbError('String table is corrupted')
+		raw = bytes(self.data[blob:blob + int(ends[-1])]) if count else b''
+		try:
+			return [raw[ends[i]:ends[i + 1]].decode('utf-8') for i in range(count)]
+		except UnicodeDecodeError:
+			raise InvalidSplbError('String table is corrupted')
+
+	def __len__(self):
+		return len(self.pose_table)
+
+	def __getitem__(self, index: int) -> SplbPose:
+		entry = self.pose_table[index]
+		strings = self.strings
+		first, count = int(entry['first']), int(entry['count'])
+		return SplbPose(
+			strings[entry['name']],
+			strings[entry['name_alt']],
+			strings[entry['category']],
+			strings[entry['space']],
+			[strings[i] for i in self.bone_name_ids[first:first + count]],
+			self.locations[first * 3:(first + count) * 3],
+			self.rotations[first * 4:(first + count) * 4],
+			self.scales[first * 3:(first + count) * 3],
+		)
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def close(self):
+		# the map is released when the last view is gone
+		self.data = self.pose_table = self.bone_name_ids = self.locations = self.rotations = self.scales = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def write_splb(filepath: str, poses: Iterable[SplbPose]) -> int:
+	'''
+		Write poses to a .splb file. Channel arrays can be any float sequences (flat).
+		Returns:
+			number of poses written
+	'''
+	strings = {}
+	def string_id(s):
+		return strings.setdefault(s, len(strings))
+
+	table = []
+	name_ids, locations, rotations, scales = [], [], [], []
+	bone_count = 0
+	for pose in poses:
+		count = len(pose.bone_names)
+		table.append((string_id(pose.name), string_id(pose.name_alt), string_id(pose.category), string_id(pose.space), bone_count, count))
+		name_ids.extend(string_id(name) for name in pose.bone_names)
+		locations.append(np.asarray(pose.locations, dtype='<f4').reshape(count * 3))
+		rotations.append(np.asarray(pose.rotations, dtype='<f4').reshape(count * 4))
+		scales.append(np.asarray(pose.scales, dtype='<f4').reshape(count * 3))
+		bone_count += count
+
+	encoded = [s.encode('utf-8') for s in strings] # dict keeps insertion order == ids
+	ends = np.zeros(len(encoded) + 1, '<u4')
+	np.cumsum([len(b) for b in encoded], out=ends[1:])
+	string_section = struct.pack('<I', len(encoded)) + ends.tobytes() + b''.join(encoded)
+
+	concat = lambda arrays: np.concatenate(arrays) if arrays else np.zeros(0, '<f4')
+	sections = [
+		string_section,
+		np.array(table, _POSE_DTYPE).tobytes(),
+		np.array(name_ids, '<u4').tobytes(),
+		concat(locations).tobytes(),
+		concat(rotations).tobytes(),
+		concat(scales).tobytes(),
+	]
+
+	offsets = []
+	offset = _align(_HEADER.size)
+	for section in sections:
+		offsets.append(offset)
+		offset = _align(offset + len(section))
+
+	with open(filepath, 'wb') as f:
+		f.write(_HEADER.pack(SPLB_MAGIC, SPLB_VERSION, len(table), bone_count, *offsets))
+		for offset, section in zip(offsets, sections):
+			f.write(b'\0' * (offset - f.tell()))
+			f.write(section)
+
+	return len(table)
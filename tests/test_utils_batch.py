@@ -0,0 +1,113 @@
+# Equivalence of the NumPy batch conversions in utils.py with the scalar (mathutils) versions.
+# Run inside Blender's Python, or with the bpy module installed: python -m pytest tests
+
+import math
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("bpy")
+mathutils = pytest.importorskip("mathutils")
+from mathutils import Matrix, Quaternion, Vector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils
+
+
+# mathutils works in single precision
+ATOL = 1e-5
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def random_quaternions(rng, count=500):
+    q = rng.normal(size=(count, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    # a few special rotations: identity, 180 degrees, gimbal lock
+    q[:4] = [(1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0), (math.sqrt(0.5), math.sqrt(0.5), 0, 0)]
+    return q
+
+
+def assert_angles_close(a, b, period):
+    # angles wrap around, compare the distance on the circle
+    diff = (np.asarray(a) - np.asarray(b) + period / 2) % period - period / 2
+    assert np.abs(diff).max() < ATOL * period
+
+
+def test_quat_to_euler_mmd_batch(rng):
+    q = random_quaternions(rng)
+    for degrees in (False, True):
+        expected = [utils.quat_to_euler_mmd(tuple(row), degrees=degrees) for row in q]
+        np.testing.assert_allclose(utils.quat_to_euler_mmd_batch(q, degrees=degrees), expected, atol=1e-9)
+
+
+def test_euler_to_quat_mmd_batch(rng):
+    eulers = rng.uniform(-math.pi, math.pi, size=(500, 3))
+    expected = [tuple(utils.euler_to_quat_mmd(tuple(row))) for row in eulers]
+    np.testing.assert_allclose(utils.euler_to_quat_mmd_batch(eulers), expected, atol=ATOL)
+
+    expected = [tuple(utils.euler_to_quat_mmd(tuple(row), degrees=True)) for row in np.degrees(eulers)]
+    np.testing.assert_allclose(utils.euler_to_quat_mmd_batch(np.degrees(eulers), degrees=True), expected, atol=ATOL)
+
+
+def test_has_transform_batch(rng):
+    count = 400
+    locations = np.where(rng.random((count, 3)) < 0.2, rng.normal(scale=1e-3, size=(count, 3)), 0.0)
+    rotations = np.tile((1.0, 0.0, 0.0, 0.0), (count, 1))
+    rotated = rng.random(count) < 0.2
+    rotations[rotated] = random_quaternions(rng, rotated.sum())
+    scales = np.where(rng.random((count, 3)) < 0.2, 1.0 + rng.normal(scale=1e-3, size=(count, 3)), 1.0)
+    # non-unit quaternions are normalized by both
+    rotations[::7] *= 3.0
+
+    expected = [utils.has_transform(Vector(l), Quaternion(r), Vector(s)) for l, r, s in zip(locations, rotations, scales)]
+    np.testing.assert_array_equal(utils.has_transform_batch(locations, rotations, scales), expected)
+
+
+@pytest.mark.parametrize("invert", [False, True])
+def test_to_armature_space_batch(rng, invert):
+    count = 200
+    matrices = [Quaternion(q).to_matrix() for q in random_quaternions(rng, count)]
+    if invert:
+        matrices = [m.inverted_safe() for m in matrices]
+    locations = rng.normal(size=(count, 3))
+    rotations = random_quaternions(rng, count)
+    scales = rng.uniform(0.5, 2.0, size=(count, 3))
+
+    expected_loc, expected_rot, expected_sca = [], [], []
+    for mtx, loc, rot, sca in zip(matrices, locations, rotations, scales):
+        # to_armature_space() only reads the bone name and takes the matrix from the rest matrices
+        rest = SimpleNamespace(get=lambda name, invert=False, mtx=mtx: mtx)
+        l, r, s = utils.to_armature_space(Vector(loc), Quaternion(rot), Vector(sca), SimpleNamespace(name='bone'), invert=invert, rest=rest)
+        expected_loc.append(tuple(l))
+        expected_rot.append(tuple(r))
+        expected_sca.append(tuple(s))
+
+    stacked = np.array([[row[:] for row in m] for m in matrices])
+    loc, rot, sca = utils.to_armature_space_batch(locations, rotations, scales, stacked)
+    np.testing.assert_allclose(loc, expected_loc, atol=ATOL)
+    np.testing.assert_allclose(sca, expected_sca, atol=ATOL)
+    # q and -q are the same rotation
+    expected_rot = np.array(expected_rot)
+    signs = np.where((rot * expected_rot).sum(axis=1) < 0.0, -1.0, 1.0)
+    np.testing.assert_allclose(rot * signs[:, None], expected_rot, atol=ATOL)
+
+
+@pytest.mark.parametrize("order", ["XYZ", "XZY", "YXZ", "YZX", "ZXY", "ZYX"])
+def test_quaternion_to_degrees_batch(rng, order):
+    q = random_quaternions(rng)
+    expected = [tuple(utils.quaternion_to_degrees(Quaternion(row), order)) for row in q]
+    assert_angles_close(utils.quaternion_to_degrees_batch(q, order), expected, 360.0)
+
+
+@pytest.mark.parametrize("order", ["XYZ", "ZXY"])
+def test_quaternion_to_euler_batch_normalizes(rng, order):
+    q = random_quaternions(rng) * rng.uniform(0.2, 5.0, size=(500, 1))
+    expected = [tuple(Quaternion(row).to_euler(order)) for row in q]
+    assert_angles_close(utils.quaternion_to_euler_batch(q, order), expected, 2.0 * math.pi)
@@ -67,19 +67,93 @@ def has_transform( loc, rot, scale, threshold=1e-6 ):
     return has_translation(loc, threshold) or has_rotation(rot, threshold) or has_scale(scale, threshold)
 
 
+#############################################
+# Rest matrix cache
+#############################################
+import array
+import numpy as np
+
+class RestMatrices:
+    """
+    Rest-space 3x3 matrices (Bone.matrix_local) of all bones of an armature, their inverses and
+    MMD variants (Y/Z swapped and transposed, as used by mmd.BoneConverter).
+    Matrices are shared, do not modify them.
+    """
+    def __init__(self, armature: bpy.types.Object, fingerprint):
+        self.fingerprint = fingerprint
+        bones = armature.data.bones
+        self.names = bones.keys()
+        self.index = {name: i for i, name in enumerate(self.names)} # {bone name: index in arrays}
+        self.__matrices = {(False, False): [bone.matrix_local.to_3x3() for bone in bones]}
+
+    def __get_list(self, mmd: bool, invert: bool) -> list:
+        key = (mmd, invert)
+        matrices = self.__matrices.get(key)
+        if matrices is None:
+            if invert:
+                matrices = [m.inverted_safe() for m in self.__get_list(mmd, False)]
+            else: # MMD
+                matrices = []
+                for m in self.__get_list(False, False):
+                    m = m.copy()
+                    m[1], m[2] = m[2].copy(), m[1].copy()
+                    matrices.append(m.transposed())
+            self.__matrices[key] = matrices
+        return matrices
+
+    def get(self, name: str, mmd: bool = False, invert: bool = False) -> Matrix:
+        index = self.index.get(name)
+        if index is None:
+            raise KeyError(f'Bone "{name}" not found in the rest matrices (get them again after renaming bones)')
+        return self.__get_list(mmd, invert)[index]
+
+    def as_array(self, mmd: bool = False, invert: bool = False) -> np.ndarray:
+        """Matrices as a (bone count, 3, 3) array, in the order of names"""
+        key = ('array', mmd, invert)
+        stacked = self.__matrices.get(key)
+        if stacked is None:
+            stacked = np.array([[row[:] for row in m] for m in self.__get_list(mmd, invert)], dtype=np.float64).reshape(-1, 3, 3)
+            stacked.flags.writeable = False
+            self.__matrices[key] = stacked
+        return stacked
+
+
+_rest_matrices = {} # {armature data pointer: RestMatrices}
+
+def _rest_fingerprint(armature: bpy.types.Object):
+    # any change of the rest pose (edit mode, bones added/removed/renamed) changes the matrices or names
+    bones = armature.data.bones
+    values = array.array('f', bytes(len(bones) * 64))
+    bones.foreach_get('matrix_local', values)
+    return (tuple(bones.keys()), values)
+
+# Get (or build) the rest matrices of the armature, call once per operation and pass it around
+def get_rest_matrices(armature: bpy.types.Object) -> RestMatrices:
+    key = armature.data.as_pointer()
+    fingerprint = _rest_fingerprint(armature)
+    rest = _rest_matrices.get(key)
+    if rest is None or rest.fingerprint != fingerprint:
+        rest = RestMatrices(armature, fingerprint)
+        _rest_matrices[key] = rest
+    return rest
+
+# Drop all cached rest matrices (on file load, undo, etc.)
+def clear_rest_matrices():
+    _rest_matrices.clear()
+
+
 #############################################
 # Conversion functions
 #############################################
 
 # Convert location, rotation, and scale from bone local space to armature space.
-def to_armature_space(loc: Vector, rot: Quaternion, sca: Vector, pbone: bpy.types.PoseBone, invert:bool = False) -> Tuple[Vector, Quaternion, Vector]:
+def to_armature_space(loc: Vector, rot: Quaternion, sca: Vector, pbone: bpy.types.PoseBone, invert:bool = False, rest: RestMatrices = None) -> Tuple[Vector, Quaternion, Vector]:
     if not pbone:
         return loc, rot, sca
 
-    mtx = pbone.bone.matrix_local.to_3x3()
-
-    if invert:
-        mtx.invert()
+    if rest is None:
+        rest = get_rest_matrices(pbone.id_data)
+    mtx = rest.get(pbone.name, invert=invert)
 
     new_loc = mtx @ loc
     new_rot = Quaternion( (mtx @ rot.axis) *-1, rot.angle).normalized()
@@ -253,3 +327,183 @@ def swap_axis( v:Vector, axis:Tuple[int, int, int] ) -> Vector:
         raise ValueError("Axis values must be unique.")
     
     return Vector( (v[axis[0]], v[axis[1]], v[axis[2]]) )
+
+
+#############################################
+# Batch conversion functions (NumPy)
+#
+# Same conventions as the functions above, for (N, 3) / (N, 4) arrays.
+# Quaternions are (w, x, y, z) rows.
+#############################################
+
+def has_transform_batch(locations, rotations, scales, threshold=1e-6) -> np.ndarray:
+    """Batch version of has_transform(). Returns a bool array (N,)"""
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 4)
+    scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+
+    norms = np.linalg.norm(rotations, axis=1)
+    w = np.abs(rotations[:, 0]) / np.where(norms > 0.0, norms, 1.0)
+    angle_diff = 2.0 * np.arccos(np.minimum(1.0, w))
+
+    return (
+        (np.abs(locations) > threshold).any(axis=1)
+        | (angle_diff > threshold)
+        | (np.abs(scales - 1.0) > threshold).any(axis=1)
+    )
+
+
+def to_armature_space_batch(locations, rotations, scales, matrices) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batch version of to_armature_space().
+
+    Args:
+        locations, rotations, scales: (N, 3), (N, 4), (N, 3) arrays
+        matrices: (N, 3, 3) rest matrices of the bones, e.g. RestMatrices.as_array(invert=...)[indices]
+
+    Returns:
+        (locations, rotations, scales) arrays
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 4)
+    scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 3, 3)
+
+    new_loc = np.einsum('nij,nj->ni', matrices, locations)
+    new_sca = np.einsum('nij,nj->ni', matrices, scales - 1.0) + 1.0
+
+    # Quaternion((mtx @ rot.axis) * -1, rot.angle): the angle is kept, the axis is transformed and flipped
+    norms = np.linalg.norm(rotations, axis=1, keepdims=True)
+    q = rotations / np.where(norms > 0.0, norms, 1.0)
+    axis = -np.einsum('nij,nj->ni', matrices, q[:, 1:])
+    axis_len = np.linalg.norm(axis, axis=1, keepdims=True)
+    sin_half = np.linalg.norm(q[:, 1:], axis=1, keepdims=True)
+    valid = axis_len[:, 0] > 1e-12
+
+    new_rot = np.zeros_like(q)
+    new_rot[:, 0] = 1.0 # a zero axis makes the identity, same as mathutils
+    new_rot[valid, 0] = q[valid, 0]
+    new_rot[valid, 1:] = axis[valid] / axis_len[valid] * sin_half[valid]
+    new_rot /= np.linalg.norm(new_rot, axis=1, keepdims=True)
+
+    return new_loc, new_rot, new_sca
+
+
+def quat_to_euler_mmd_batch(quaternions, degrees: bool = False) -> np.ndarray:
+    """Batch version of quat_to_euler_mmd(). Returns (N, 3) Euler angles (x, y, z)"""
+    w, x, y, z = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4).T
+
+    roll_z = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    pitch_x = np.arcsin(np.clip(2.0 * (w * x - y * z), -1.0, 1.0)) # Clamp for numerical accuracy
+    yaw_y = np.arctan2(2.0 * (w * y + z * x), 1.0 - 2.0 * (x * x + y * y))
+
+    euler = np.stack((pitch_x, yaw_y, roll_z), axis=1)
+    return np.degrees(euler) if degrees else euler
+
+
+def euler_to_quat_mmd_batch(eulers, *, degrees: bool = False) -> np.ndarray:
+    """Batch version of euler_to_quat_mmd(). Returns (N, 4) normalized quaternions"""
+    eulers = np.asarray(eulers, dtype=np.float64).reshape(-1, 3)
+    if degrees:
+        eulers = np.radians(eulers)
+
+    half = eulers * 0.5
+    cx, cy, cz = np.cos(half).T
+    sx, sy, sz = np.sin(half).T
+
+    q = np.stack((
+        cx * cy * cz - sx * sy * sz,
+        sx * cy * cz + cx * sy * sz,
+        cx * sy * cz - sx * cy * sz,
+        cx * cy * sz + sx * sy * cz,
+    ), axis=1)
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    return q / np.where(norms > 0.0, norms, 1.0)
+
+
+# Axis indices and parity per Euler order, same as Blender's rotOrders table
+_EULER_ORDERS = {
+    'XYZ': ((0, 1, 2), False),
+    'XZY': ((0, 2, 1), True),
+    'YXZ': ((1, 0, 2), True),
+    'YZX': ((1, 2, 0), False),
+    'ZXY': ((2, 0, 1), False),
+    'ZYX': ((2, 1, 0), True),
+}
+
+def quaternion_to_euler_batch(quaternions, order: str = "XYZ") -> np.ndarray:
+    """
+    Batch version of Quaternion.to_euler(order), in radians.
+    Follows Blender's quat_to_eulO(): of the two possible solutions, the one with the smaller sum of angles is used.
+    """
+    (i, j, k), parity = _EULER_ORDERS[order]
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    q = q / np.where(norms > 0.0, norms, 1.0) * np.sqrt(2.0) # to_euler() normalizes first, then same scaling as quat_to_mat3()
+    q0, q1, q2, q3 = q.T
+
+    # mat[column][row], same layout as Blender's float[3][3]
+    mat = np.empty((len(q), 3, 3))
+    mat[:, 0, 0] = 1.0 - q2 * q2 - q3 * q3
+    mat[:, 0, 1] = q1 * q2 + q0 * q3
+    mat[:, 0, 2] = q1 * q3 - q0 * q2
+    mat[:, 1, 0] = q1 * q2 - q0 * q3
+    mat[:, 1, 1] = 1.0 - q1 * q1 - q3 * q3
+    mat[:, 1, 2] = q2 * q3 + q0 * q1
+    mat[:, 2, 0] = q1 * q3 + q0 * q2
+    mat[:, 2, 1] = q2 * q3 - q0 * q1
+    mat[:, 2, 2] = 1.0 - q1 * q1 - q2 * q2
+
+    cy = np.hypot(mat[:, i, i], mat[:, i, j])
+    regular = cy > 16.0 * np.finfo(np.float32).eps
+
+    eul1 = np.empty((len(q), 3))
+    eul2 = np.empty((len(q), 3))
+    eul1[:, i] = np.where(regular, np.arctan2(mat[:, j, k], mat[:, k, k]), np.arctan2(-mat[:, k, j], mat[:, j, j]))
+    eul1[:, j] = np.arctan2(-mat[:, i, k], cy)
+    eul1[:, k] = np.where(regular, np.arctan2(mat[:, i, j], mat[:, i, i]), 0.0)
+    eul2[:, i] = np.where(regular, np.arctan2(-mat[:, j, k], -mat[:, k, k]), eul1[:, i])
+    eul2[:, j] = np.where(regular, np.arctan2(-mat[:, i, k], -cy), eul1[:, j])
+    eul2[:, k] = np.where(regular, np.arctan2(-mat[:, i, j], -mat[:, i, i]), eul1[:, k])
+
+    if parity:
+        eul1, eul2 = -eul1, -eul2
+
+    use_second = np.abs(eul1).sum(axis=1) > np.abs(eul2).sum(axis=1)
+    return np.where(use_second[:, None], eul2, eul1)
+
+
+def quaternion_to_degrees_batch(quaternions, order: str = "XYZ") -> np.ndarray:
+    """Batch version of quaternion_to_degrees(). Returns (N, 3) angles in degrees (0~360 range)"""
+    return np.degrees(quaternion_to_euler_batch(quaternions, order)) % 360.0
+
+
+def euler_to_quaternion_batch(eulers, order: str = "XYZ") -> np.ndarray:
+    """Batch version of Euler(angles, order).to_quaternion(), angles in radians. Returns (N, 4) quaternions"""
+    half = np.asarray(eulers, dtype=np.float64).reshape(-1, 3) * 0.5
+    result = None
+    for axis in order: # the first axis is applied first
+        index = 'XYZ'.index(axis)
+        q = np.zeros((len(half), 4))
+        q[:, 0] = np.cos(half[:, index])
+        q[:, index + 1] = np.sin(half[:, index])
+        result = q if result is None else quaternion_multiply_batch(q, result)
+    return result
+
+
+def degrees_to_quaternion_batch(rot_deg, order: str = "XYZ") -> np.ndarray:
+    """Batch version of degrees_to_quaternion(). Returns (N, 4) normalized quaternions"""
+    q = euler_to_quaternion_batch(np.radians(np.asarray(rot_deg, dtype=np.float64)), order)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def quaternion_multiply_batch(a, b) -> np.ndarray:
+    """Row-wise quaternion product a @ b of (N, 4) arrays"""
+    aw, ax, ay, az = np.asarray(a, dtype=np.float64).reshape(-1, 4).T
+    bw, bx, by, bz = np.asarray(b, dtype=np.float64).reshape(-1, 4).T
+    return np.stack((
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ), axis=1)
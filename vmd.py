@@ -0,0 +1,187 @@
+# VMD (Vocaloid Motion Data) for Sakura Poselib
+#
+# Layout (little endian):
+#   Header : "Vocaloid Motion Data 0002" (30 bytes), model name (20 bytes, Shift-JIS)
+#   Bones  : count (uint32), keys (bone name 15 bytes, frame uint32, location float x3, rotation float x4 (XYZW), interpolation 64 bytes)
+#   Morphs : count (uint32), keys (morph name 15 bytes, frame uint32, weight float)
+#   Camera, light, shadow : count (uint32) each, not used here
+#
+# This module must not depend on bpy/mathutils.
+
+import struct
+from typing import List, Tuple
+
+VMD_MAGIC = b'Vocaloid Motion Data 0002'
+ENCODING = 'shift_jis'
+
+_HEADER = struct.Struct('<30s20s')
+_COUNT = struct.Struct('<I')
+_BONE_KEY = struct.Struct('<15sI3f4f64s')
+_MORPH_KEY = struct.Struct('<15sIf')
+
+# Linear interpolation (x1 = y1 = 20, x2 = y2 = 107 for X, Y, Z and rotation), each row is shifted by one byte
+_LINEAR = bytes([20] * 8 + [107] * 8)
+LINEAR_INTERPOLATION = b''.join(_LINEAR[i:] + bytes(i) for i in range(4))
+
+
+class InvalidVmdError(Exception):
+	pass
+
+
+# Encode a name into a fixed size field, without breaking multibyte characters
+def encode_name(name: str, size: int) -> bytes:
+	data = name.encode(ENCODING, errors='replace')
+	while len(data) > size:
+		name = name[:-1]
+		data = name.encode(ENCODING, errors='replace')
+	return data
+
+def decode_name(data: bytes) -> str:
+	return data.split(b'\0', 1)[0].decode(ENCODING, errors='replace')
+
+
+class VmdWriter:
+	'''
+		Write VMD keys as they come. Bone keys are streamed to the file, morph keys are buffered
+		(they follow the bone section) and counts are patched on close().
+		Usage:
+			with open(filepath, 'wb') as f, VmdWriter(f, model_name) as writer:
+				writer.add_bone_key(...)
+	'''
+	_FLUSH_SIZE = 1 << 16
+
+	def __init__(self, f, model_name: str):
+		self.f = f
+		self.bone_count = 0
+		self.morph_count = 0
+		self._names = {} # {name: encoded}
+		self._bones = []
+		self._morphs = []
+
+		f.write(_HEADER.pack(VMD_MAGIC, encode_name(model_name, 20)))
+		self._bone_count_pos = f.tell()
+		f.write(_COUNT.pack(0))
+
+	def _encode(self, name: str) -> bytes:
+		data = self._names.get(name)
+		if data is None:
+			data = self._names[name] = encode_name(name, 15)
+		return data
+
+	def add_bone_key(self, name: str, frame: int, location, rotation, interpolation: bytes = LINEAR_INTERPOLATION):
+		'''
+			location: (x, y, z) in MMD space
+			rotation: (x, y, z, w) in MMD space
+		'''
+		self._bones.append(_BONE_KEY.pack(self._encode(name), frame, *location, *rotation, interpolation))
+		self.bone_count += 1
+		if len(self._bones) >= self._FLUSH_SIZE // _BONE_KEY.size:
+			self.f.write(b''.join(self._bones))
+			self._bones.clear()
+
+	def add_morph_key(self, name: str, frame: int, weight: float):
+		self._morphs.append(_MORPH_KEY.pack(self._encode(name), frame, weight))
+		self.morph_count += 1
+
+	def close(self):
+		f = self.f
+		f.write(b''.join(self._bones))
+		self._bones.clear()
+
+		f.write(_COUNT.pack(self.morph_count))
+		f.write(b''.join(self._morphs))
+		self._morphs.clear()
+		f.write(_COUNT.pack(0) * 3) # camera, light, shadow
+
+		# patch the bone key count
+		end = f.tell()
+		f.seek(self._bone_count_pos)
+		f.write(_COUNT.pack(self.bone_count))
+		f.seek(end)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, *args):
+		if exc_type is None:
+			self.close()
+
+
+# Drop keys which only repeat the previous value. The last key of a constant run is kept
+# when the value changes afterwards, so that interpolation starts at the right frame.
+class KeyReducer:
+	__slots__ = ('tolerance', '_last', '_pending')
+
+	def __init__(self, tolerance: float = 1e-5):
+		self.tolerance = tolerance
+		self._last = {} # {name: values of the last written key}
+		self._pending = {} # {name: (frame, values)} of a skipped key
+
+	def feed(self, name, frame: int, values) -> list:
+		'''
+			Returns:
+				list of (frame, values) to write
+		'''
+		last = self._last.get(name)
+		if last is not None and all(abs(a - b) <= self.tolerance for a, b in zip(last, values)):
+			self._pending[name] = (frame, values)
+			return []
+
+		keys = []
+		pending = self._pending.pop(name, None)
+		if pending is not None:
+			keys.append(pending)
+		keys.append((frame, values))
+		self._last[name] = values
+		return keys
+
+
+class VmdMotion:
+	__slots__ = ('model_name', 'bone_keys', 'morph_keys')
+
+	def __init__(self):
+		self.model_name = ''
+		self.bone_keys = [] # [(bone name, frame, (x, y, z), (x, y, z, w))]
+		self.morph_keys = [] # [(morph name, frame, weight)]
+
+	def __repr__(self):
+		return f'<VmdMotion {self.model_name}, bone keys {len(self.bone_keys)}, morph keys {len(self.morph_keys)}>'
+
+
+def read_vmd(filepath: str) -> VmdMotion:
+	with open(filepath, 'rb') as f:
+		data = f.read()
+
+	if len(data) < _HEADER.size + _COUNT.size:
+		raise InvalidVmdError('File is too small')
+	magic, model_name = _HEADER.unpack_from(data, 0)
+	if not magic.startswith(b'Vocaloid Motion Data'):
+		raise InvalidVmdError('Not a VMD file')
+
+	motion = VmdMotion()
+	motion.model_name = decode_name(model_name)
+	names = {} # {encoded: decoded}, names repeat over keys
+
+	def read_section(offset, record: struct.Struct) -> Tuple[list, int]:
+		if offset + _COUNT.size > len(data):
+			return [], offset # older files may end without sections
+		count = _COUNT.unpack_from(data, offset)[0]
+		offset += _COUNT.size
+		end = offset + count * record.size
+		if end > len(data):
+			raise InvalidVmdError('File is truncated')
+		return list(record.iter_unpack(data[offset:end])), end
+
+	bones, offset = read_section(_HEADER.size, _BONE_KEY)
+	for name, frame, lx, ly, lz, rx, ry, rz, rw, _ in bones:
+		if name not in names:
+			names[name] = decode_name(name)
+		motion.bone_keys.append((names[name], frame, (lx, ly, lz), (rx, ry, rz, rw)))
+
+	morphs, offset = read_section(offset, _MORPH_KEY)
+	for name, frame, weight in morphs:
+		if name not in names:
+			names[name] = decode_name(name)
+		motion.morph_keys.append((names[name], frame, weight))
+
+	return motion